@@ -0,0 +1,43 @@
+"""Time document classification one document at a time and in process-pool batches.
+
+Documents are generated legal text under varied titles. classify_batch results
+are checked against one classify call per document.
+
+Run from the repository root: python -m benchmarks.bench_classifier --documents 2000 20000 --processes 1 4
+"""
+import argparse
+import random
+import time
+
+from benchmarks.synthetic import synthetic_lines
+from classifier import classify, classify_batch
+
+TITLES = [
+    "STOCK PURCHASE AGREEMENT", "NOTICE OF STOCK OPTION GRANT", "WARRANT TO PURCHASE SHARES",
+    "CONVERTIBLE PROMISSORY NOTE", "SIMPLE AGREEMENT FOR FUTURE EQUITY", "ACTION BY WRITTEN CONSENT OF THE BOARD OF DIRECTORS",
+    "CERTIFICATE OF AMENDMENT", "409A VALUATION REPORT", "MEMORANDUM",
+]
+
+def synthetic_documents(count, lines=60, seed=0):
+    rng = random.Random(seed)
+    return [f"{rng.choice(TITLES)}\n" + "\n".join(synthetic_lines(lines, rng)) for _ in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, nargs="+", default=[2000, 20000])
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--chunksize", type=int, default=256)
+    args = parser.parse_args()
+
+    print(f"{'documents':>9} {'processes':>9} {'seconds':>8} {'docs/s':>9} {'same':>5}")
+    for count in args.documents:
+        texts = synthetic_documents(count)
+        expected = [classify(text) for text in texts]
+        for processes in args.processes:
+            started = time.perf_counter()
+            results = classify_batch(texts, processes=processes, chunksize=args.chunksize)
+            elapsed = time.perf_counter() - started
+            print(f"{count:>9} {processes:>9} {elapsed:>8.2f} {count / elapsed:>9.0f} {str(results == expected):>5}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Compare the streaming DOCX extractor with the original python-docx paragraph loop.
+
+Each document has the given number of paragraphs plus a schedule of purchasers table
+with one row per ten paragraphs. The python-docx path drops the table; the streaming
+path returns it as rows. Peak memory is reported for reading the block stream
+alone, which stays flat as documents grow; python-docx's lxml tree is allocated
+outside Python's allocator, so tracemalloc cannot compare it.
+
+Run from the repository root: python -m benchmarks.bench_docx_extract --paragraphs 1000 10000 50000
+"""
+import argparse
+import io
+import random
+import time
+import tracemalloc
+
+import docx
+
+from benchmarks.synthetic import HOLDERS, synthetic_lines
+from docx_extract import extract_docx, iter_docx_blocks
+
+# The original extract_text DOCX path
+def legacy_extract(data):
+    doc = docx.Document(io.BytesIO(data))
+    text = ""
+    for para in doc.paragraphs:
+        text += para.text + "\n"
+    return text
+
+# A .docx with `paragraphs` paragraphs and a purchasers table in the middle
+def synthetic_docx(paragraphs, seed=0):
+    rng = random.Random(seed)
+    lines = synthetic_lines(paragraphs, rng)
+    document = docx.Document()
+    for line in lines[:paragraphs // 2]:
+        document.add_paragraph(line)
+
+    rows = max(1, paragraphs // 10)
+    table = document.add_table(rows=rows + 1, cols=4)
+    # Filling cells through the low-level XML is much faster than cell.text for big tables
+    for row, values in zip(table.rows, [["Purchaser", "Share Class", "Shares", "Price Per Share"]] + [
+        [f"{rng.choice(HOLDERS)} {index}", "Series A Preferred", f"{rng.randrange(1000, 500000):,}", f"${rng.uniform(0.5, 4):.4f}"]
+        for index in range(rows)
+    ]):
+        for cell, value in zip(row.cells, values):
+            cell.paragraphs[0].add_run(value)
+
+    for line in lines[paragraphs // 2:]:
+        document.add_paragraph(line)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+# Peak traced memory while reading every block of a document without keeping them
+def stream_peak(data):
+    tracemalloc.start()
+    for _ in iter_docx_blocks(io.BytesIO(data)):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--paragraphs", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'paragraphs':>10} {'size MB':>8} {'python-docx s':>14} {'streaming s':>12} {'speedup':>8} {'stream peak MB':>15} {'table rows':>11}")
+    for paragraph_count in args.paragraphs:
+        data = synthetic_docx(paragraph_count)
+        best = {"legacy": float("inf"), "streaming": float("inf")}
+        for _ in range(args.repeat):
+            legacy_text, elapsed = timed(legacy_extract, data)
+            best["legacy"] = min(best["legacy"], elapsed)
+            (text, tables), elapsed = timed(extract_docx, io.BytesIO(data))
+            best["streaming"] = min(best["streaming"], elapsed)
+
+        # Every paragraph python-docx finds is in the streamed text, in the same order
+        streamed_lines = iter(text.splitlines())
+        assert all(line in streamed_lines for line in legacy_text.splitlines() if line)
+        table_rows = sum(len(table) for table in tables)
+        print(f"{paragraph_count:>10} {len(data) / 1e6:>8.2f} {best['legacy']:>14.3f} {best['streaming']:>12.3f} "
+              f"{best['legacy'] / best['streaming']:>7.1f}x {stream_peak(data) / 1e6:>15.2f} {table_rows:>11}")
+
+if __name__ == "__main__":
+    main()
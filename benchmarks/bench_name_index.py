@@ -0,0 +1,86 @@
+"""Compare indexed stakeholder name lookups with scoring every name on the ledger.
+
+The ledger holds the given number of generated person and fund names. Queries are
+ledger names spelled another way (a dropped legal suffix, an added "Fund", a typo),
+as they appear in purchase agreements and grants. Both paths use the same trigram
+similarity, so recall is the share of all-pairs matches the index also finds.
+
+Run from the repository root: python -m benchmarks.bench_name_index --names 5000 50000 --queries 200
+"""
+import argparse
+import random
+import time
+
+from name_index import NAME_MATCH_THRESHOLD, NameIndex, _grams, match_key
+
+SYLLABLES = ["ka", "lo", "mi", "ra", "ten", "so", "vi", "na", "der", "ber", "ton", "ley", "ford", "ams", "ing", "chen", "pa", "tel", "ro", "si"]
+FUND_WORDS = ["Ventures", "Capital", "Partners", "Growth", "Holdings"]
+NUMERALS = ["I", "II", "III", "IV", "V"]
+
+def _word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randrange(2, 4))).title()
+
+def ledger_names(count, seed=0):
+    rng = random.Random(seed)
+    first_names = [_word(rng) for _ in range(300)]
+    last_names = [_word(rng) for _ in range(3000)]
+    names = []
+    for _ in range(count):
+        if rng.random() < 0.1:
+            names.append(f"{_word(rng)} {rng.choice(FUND_WORDS)} {rng.choice(NUMERALS)}, L.P.")
+        else:
+            names.append(f"{rng.choice(first_names)} {rng.choice(last_names)}")
+    return names
+
+# A ledger name as another document might spell it
+def variant(name, rng):
+    change = rng.randrange(3)
+    if change == 0:
+        return name.replace(", L.P.", " LP").replace(" Ventures", " Ventures Fund")
+    if change == 1:
+        return name.upper()
+    position = rng.randrange(1, len(name) - 1)
+    return name[:position] + rng.choice("aeiou") + name[position + 1:]
+
+# Every ledger name at or above the threshold, scoring each one
+def all_pairs(query, ledger_grams, threshold):
+    grams = _grams(match_key(query))
+    return {
+        index for index, name_grams in enumerate(ledger_grams)
+        if name_grams and 2 * len(grams & name_grams) / (len(grams) + len(name_grams)) >= threshold
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--names", type=int, nargs="+", default=[5000, 50000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--threshold", type=float, default=NAME_MATCH_THRESHOLD)
+    args = parser.parse_args()
+
+    print(f"{'names':>7} {'build s':>8} {'index ms/q':>11} {'all-pairs ms/q':>15} {'speedup':>8} {'recall':>7}")
+    for count in args.names:
+        rng = random.Random(1)
+        names = ledger_names(count)
+        queries = [variant(rng.choice(names), rng) for _ in range(args.queries)]
+
+        started = time.perf_counter()
+        index = NameIndex(names, threshold=args.threshold)
+        build = time.perf_counter() - started
+
+        started = time.perf_counter()
+        indexed = [{index.names[name_id] for name_id, _ in index.query(query, limit=None)} for query in queries]
+        index_time = (time.perf_counter() - started) / len(queries)
+
+        # The index keeps one entry per match key, so compare by name
+        ledger_grams = [_grams(match_key(name)) for name in index.names]
+        started = time.perf_counter()
+        expected = [{index.names[i] for i in all_pairs(query, ledger_grams, args.threshold)} for query in queries]
+        scan_time = (time.perf_counter() - started) / len(queries)
+
+        found = sum(len(got & want) for got, want in zip(indexed, expected))
+        total = sum(len(want) for want in expected)
+        print(f"{count:>7} {build:>8.2f} {index_time * 1000:>11.2f} {scan_time * 1000:>15.2f} "
+              f"{scan_time / index_time:>7.1f}x {found / total if total else 1.0:>7.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Time near-duplicate detection over many documents and check it against exact comparison.
+
+A third of the generated documents get a second copy: a draft marked DRAFT, an
+executed copy with conformed signatures, or the same text reflowed. Detection
+(MinHash signatures plus LSH lookups, as process_documents runs it) is timed per
+document count. For counts up to --exact-limit, pairs found are also compared with
+the pairs whose exact shingle Jaccard similarity reaches the threshold.
+
+Run from the repository root: python -m benchmarks.bench_near_duplicates --documents 500 2000 8000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.synthetic import HOLDERS, synthetic_lines
+from near_duplicates import NEAR_DUPLICATE_THRESHOLD, SHINGLE_WORDS, _WORD, NearDuplicateIndex, minhash
+
+def _copy(text, rng):
+    change = rng.randrange(3)
+    if change == 0:
+        return "DRAFT\n" + text
+    if change == 1:
+        return text + f"\nBy: /s/ {rng.choice(HOLDERS)}"
+    return text.replace("\n", "\n\n")
+
+def synthetic_documents(count, lines=90, seed=0):
+    rng = random.Random(seed)
+    documents = []
+    while len(documents) < count:
+        text = "\n".join(synthetic_lines(lines, rng))
+        documents.append(text)
+        if rng.random() < 1 / 3 and len(documents) < count:
+            documents.append(_copy(text, rng))
+    return documents
+
+def _shingles(text):
+    words = [word.lower().rstrip(".,") for word in _WORD.findall(text)]
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+# Pairs (i, j) with i < j found by MinHash and LSH
+def lsh_pairs(documents):
+    index = NearDuplicateIndex()
+    pairs = set()
+    for i, text in enumerate(documents):
+        signature = minhash(text)
+        pairs.update((j, i) for j, _ in index.query(signature))
+        index.add(i, signature)
+    return pairs
+
+# Pairs whose exact Jaccard similarity reaches the threshold, comparing every pair
+def exact_pairs(documents, threshold):
+    shingles = [_shingles(text) for text in documents]
+    return {
+        (i, j) for i in range(len(documents)) for j in range(i + 1, len(documents))
+        if len(shingles[i] & shingles[j]) >= threshold * len(shingles[i] | shingles[j])
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, nargs="+", default=[500, 2000, 8000])
+    parser.add_argument("--exact-limit", type=int, default=1000, help="Largest count also compared pair by pair")
+    args = parser.parse_args()
+
+    print(f"{'docs':>6} {'lsh s':>7} {'ms/doc':>7} {'pairs':>6} {'exact s':>8} {'recall':>7} {'precision':>10}")
+    for count in args.documents:
+        documents = synthetic_documents(count)
+        started = time.perf_counter()
+        found = lsh_pairs(documents)
+        elapsed = time.perf_counter() - started
+
+        exact = "-"
+        recall = precision = "-"
+        if count <= args.exact_limit:
+            started = time.perf_counter()
+            expected = exact_pairs(documents, NEAR_DUPLICATE_THRESHOLD)
+            exact = f"{time.perf_counter() - started:.2f}"
+            recall = f"{len(found & expected) / len(expected):.1%}" if expected else "-"
+            precision = f"{len(found & expected) / len(found):.1%}" if found else "-"
+        print(f"{count:>6} {elapsed:>7.2f} {elapsed / count * 1000:>7.2f} {len(found):>6} {exact:>8} {recall:>7} {precision:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Compare streaming/page-parallel PDF extraction with the original concatenating loop.
+
+Run from the repository root: python -m benchmarks.bench_pdf_extract
+"""
+import argparse
+import io
+import time
+import tracemalloc
+
+from PyPDF2 import PdfReader
+
+from benchmarks.synthetic import synthetic_pdf
+from pdf_extract import extract_pdf_pages
+
+# The original extract_text PDF path
+def legacy_extract(data):
+    pdf_reader = PdfReader(io.BytesIO(data))
+    text = ""
+    for page in pdf_reader.pages:
+        text += page.extract_text() + "\n"
+    return text
+
+def measure(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 300, 600])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'pages':>6} {'size MB':>8} {'legacy s':>9} {'serial s':>9} {'parallel s':>11} {'legacy peak MB':>15} {'serial peak MB':>15}")
+    for page_count in args.pages:
+        data = synthetic_pdf(page_count)
+        best = {"legacy": float("inf"), "serial": float("inf"), "parallel": float("inf")}
+        peaks = {}
+        for _ in range(args.repeat):
+            legacy_text, elapsed, peaks["legacy"] = measure(legacy_extract, data)
+            best["legacy"] = min(best["legacy"], elapsed)
+            (serial_text, _), elapsed, peaks["serial"] = measure(extract_pdf_pages, io.BytesIO(data), False)
+            best["serial"] = min(best["serial"], elapsed)
+            # Peak memory of the parallel path lives in the worker processes, so only time it
+            (parallel_text, _), elapsed, _ = measure(extract_pdf_pages, io.BytesIO(data), True)
+            best["parallel"] = min(best["parallel"], elapsed)
+        assert legacy_text == serial_text == parallel_text
+        print(f"{page_count:>6} {len(data) / 1e6:>8.2f} {best['legacy']:>9.2f} {best['serial']:>9.2f} {best['parallel']:>11.2f} "
+              f"{peaks['legacy'] / 1e6:>15.1f} {peaks['serial'] / 1e6:>15.1f}")
+
+if __name__ == "__main__":
+    main()
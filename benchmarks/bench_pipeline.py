@@ -0,0 +1,99 @@
+"""Time each pipeline stage and the full run on synthetic data rooms against a mock LLM.
+
+Every scenario generates a data room, starts with an empty document cache and runs
+the cap table parse, document ingestion, verification and remediation against a
+local mock of the Messages API, followed by a warm end-to-end run served from cache.
+
+Run from the repository root: python -m benchmarks.bench_pipeline --documents 10 100 1000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+# Keep benchmark caches and stored documents out of the user's cache directory
+os.environ.setdefault("DILIGIZE_CACHE_DIR", tempfile.mkdtemp(prefix="diligize-bench-cache-"))
+os.environ.setdefault("DILIGIZE_STORE_DIR", tempfile.mkdtemp(prefix="diligize-bench-store-"))
+
+import engine
+import instrumentation
+import llm
+from benchmarks.data_room import generate_data_room
+from benchmarks.mock_llm import MockMessagesServer
+from document_store import DocumentStore
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+# Run one scenario and return wall times per stage
+def run_scenario(deal_dir, api_key, remediation=True):
+    cap_table_path, document_paths = engine.find_deal_files(deal_dir)
+    files = [engine.load_file(path) for path in document_paths]
+    timings = {}
+
+    cap_table, timings["parse_cap_table"] = timed(engine.parse_cap_table, engine.load_file(cap_table_path), api_key)
+    results, timings["process_documents"] = timed(engine.process_documents, files, api_key)
+    documents = engine.add_processed_documents({}, files, results, DocumentStore())
+    verification, timings["verify_cap_table"] = timed(engine.verify_cap_table, cap_table, documents, api_key)
+    if remediation and verification:
+        _, timings["generate_remediation"] = timed(engine.generate_remediation, verification, api_key)
+    timings["stages_total"] = sum(timings.values())
+    timings["failed_documents"] = sum(1 for result in results if result["error"])
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--rows", type=int, default=5000, help="Cap table rows per data room")
+    parser.add_argument("--pages", type=int, default=2, help="Pages per supporting document")
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock LLM delay before each response (s)")
+    parser.add_argument("--chunk-delay", type=float, default=0.005, help="Mock LLM delay between streamed chunks (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of mock requests rejected with 429")
+    parser.add_argument("--rpm", type=int, default=100000, help="Client rate limit, requests per minute")
+    parser.add_argument("--tpm", type=int, default=100000000, help="Client rate limit, tokens per minute")
+    parser.add_argument("--no-remediation", action="store_true")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    # The benchmark measures the pipeline, not the account's rate limits
+    llm.limiter = llm.RateLimiter(args.rpm, args.tpm)
+    api_key = "mock-key"
+    rows = []
+    with MockMessagesServer(latency=args.latency, chunk_delay=args.chunk_delay, error_rate=args.error_rate) as server:
+        llm.BASE_URL = server.url
+        for document_count in args.documents:
+            with tempfile.TemporaryDirectory(prefix="diligize-bench-room-") as deal_dir:
+                generate_data_room(deal_dir, document_count, args.rows, args.pages)
+                engine.get_document_cache().clear()
+                instrumentation.reset()
+                requests_before = server.requests
+
+                cold = run_scenario(deal_dir, api_key, not args.no_remediation)
+                stage_totals = instrumentation.stage_summary()
+                llm_requests = server.requests - requests_before
+                _, warm_total = timed(run_scenario, deal_dir, api_key, not args.no_remediation)
+
+                rows.append({
+                    "documents": document_count,
+                    **cold,
+                    "warm_total": warm_total,
+                    "documents_per_second": document_count / cold["process_documents"],
+                    "llm_requests": llm_requests,
+                    "stages": stage_totals
+                })
+
+    print(f"{'docs':>6} {'cap table s':>12} {'ingest s':>9} {'docs/s':>7} {'verify s':>9} {'remediate s':>12} {'total s':>8} {'warm s':>7} {'LLM reqs':>9} {'failed':>7}")
+    for row in rows:
+        print(f"{row['documents']:>6} {row['parse_cap_table']:>12.2f} {row['process_documents']:>9.2f} {row['documents_per_second']:>7.1f} "
+              f"{row['verify_cap_table']:>9.2f} {row.get('generate_remediation', 0.0):>12.2f} {row['stages_total']:>8.2f} "
+              f"{row['warm_total']:>7.2f} {row['llm_requests']:>9} {row['failed_documents']:>7}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Time the Streamlit app's cold start and rerun latency with many documents loaded.
+
+Cold start is the first run of main.py in a fresh interpreter, so nothing is imported
+yet. Rerun latency is the median time of a script rerun with a session already
+holding the given number of processed documents, as after an upload.
+
+Run from the repository root: python -m benchmarks.bench_ui --documents 0 100 1000
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Keep benchmark caches, stored documents, jobs and workspaces out of the user's cache directory
+os.environ.setdefault("DILIGIZE_CACHE_DIR", tempfile.mkdtemp(prefix="diligize-bench-cache-"))
+os.environ.setdefault("DILIGIZE_STORE_DIR", tempfile.mkdtemp(prefix="diligize-bench-store-"))
+os.environ.setdefault("DILIGIZE_JOBS_DIR", tempfile.mkdtemp(prefix="diligize-bench-jobs-"))
+os.environ.setdefault("DILIGIZE_WORKSPACE_DB", os.path.join(tempfile.mkdtemp(prefix="diligize-bench-workspaces-"), "workspaces.db"))
+
+from streamlit.testing.v1 import AppTest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+DOCUMENT_TYPES = ["charter", "board_consent", "stock_purchase_agreement", "option_grant", "stockholder_consent", "other"]
+
+COLD_START = f"""
+import time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({APP!r}, default_timeout=120)
+app.run()
+assert not app.exception, app.exception
+print(time.perf_counter() - started)
+"""
+
+# Processed document entries as add_processed_documents leaves them
+def synthetic_documents(count):
+    return {
+        f"doc_{index}": {
+            "filename": f"{index:05d}_{DOCUMENT_TYPES[index % len(DOCUMENT_TYPES)]}.pdf",
+            "type": DOCUMENT_TYPES[index % len(DOCUMENT_TYPES)],
+            "category_confidence": 0.2 if index % 10 == 0 else 0.9,
+            "content_kind": "text",
+            "info": {"document_date": "2021-06-30", "stakeholders": [], "approval": "Approved by the Board of Directors"},
+            "file_hash": f"{index:064x}",
+            "page_offsets": [0]
+        }
+        for index in range(count)
+    }
+
+# Seconds for the first run of the app in a new interpreter
+def cold_start():
+    output = subprocess.run([sys.executable, "-c", COLD_START], capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+# First and median later run times of the app with `documents` documents in session
+def rerun_latency(documents, runs):
+    app = AppTest.from_file(APP, default_timeout=120)
+    # Without a key the app stops before rendering the tabs
+    app.session_state["api_key"] = "bench-key"
+    app.session_state["documents"] = synthetic_documents(documents)
+    started = time.perf_counter()
+    app.run()
+    first = time.perf_counter() - started
+    if app.exception:
+        raise RuntimeError(app.exception)
+
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        app.run()
+        times.append(time.perf_counter() - started)
+    return first, statistics.median(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, nargs="+", default=[0, 100, 1000])
+    parser.add_argument("--runs", type=int, default=10, help="Reruns per document count")
+    parser.add_argument("--cold-starts", type=int, default=3, help="Fresh interpreters started for the cold start time")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    cold = statistics.median(cold_start() for _ in range(args.cold_starts))
+    print(f"cold start: {cold:.2f} s (median of {args.cold_starts})")
+
+    rows = []
+    for document_count in args.documents:
+        first, median = rerun_latency(document_count, args.runs)
+        rows.append({"documents": document_count, "first_run": first, "rerun_median": median})
+
+    print(f"{'docs':>6} {'first run s':>12} {'rerun ms':>9}")
+    for row in rows:
+        print(f"{row['documents']:>6} {row['first_run']:>12.3f} {row['rerun_median'] * 1000:>9.1f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"cold_start": cold, "reruns": rows}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Generate synthetic data rooms: a cap table plus PDF, DOCX and TXT supporting documents.
+
+Run from the repository root: python -m benchmarks.data_room OUT_DIR --documents 100 --rows 5000
+"""
+import argparse
+import os
+import random
+
+import docx
+import pandas as pd
+
+from benchmarks.synthetic import make_pdf, synthetic_lines
+
+FIRST_NAMES = ["Jane", "John", "Alex", "Priya", "Maria", "Wei", "Omar", "Sofia", "David", "Aisha", "Lucas", "Emma"]
+LAST_NAMES = ["Smith", "Doe", "Chen", "Patel", "Garcia", "Kim", "Haddad", "Rossi", "Cohen", "Okafor", "Silva", "Novak"]
+FUNDS = ["Acme Ventures", "Blue Harbor Capital", "Northwind Partners", "Summit Growth", "Granite Peak"]
+
+CAP_TABLE_COLUMNS = ["Stakeholder", "Share Class", "Shares", "Issue Date", "Price Per Share"]
+# Share classes with their relative frequency and price range
+SHARE_CLASSES = [
+    ("Common", 0.45, (0.0001, 0.01)),
+    ("Series Seed Preferred", 0.1, (0.5, 1.5)),
+    ("Series A Preferred", 0.1, (1.5, 4.0)),
+    ("Option", 0.3, (0.05, 1.0)),
+    ("Warrant", 0.05, (0.5, 2.0))
+]
+# Document kinds generated in rotation, and the file formats they cycle through
+DOCUMENT_KINDS = ["charter", "board_consent", "stock_purchase_agreement", "option_grant", "stockholder_consent"]
+FORMATS = ["pdf", "docx", "txt"]
+LINES_PER_PAGE = 45
+
+def _holder(rng, index):
+    if rng.random() < 0.1:
+        return f"{rng.choice(FUNDS)} {index // 10 + 1}, L.P."
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {index}"
+
+# Cap table DataFrame with the given number of rows
+def synthetic_cap_table(rows, seed=0):
+    rng = random.Random(seed)
+    classes = [share_class for share_class, _, _ in SHARE_CLASSES]
+    weights = [weight for _, weight, _ in SHARE_CLASSES]
+    prices = {share_class: price_range for share_class, _, price_range in SHARE_CLASSES}
+    records = []
+    for index in range(rows):
+        share_class = rng.choices(classes, weights)[0]
+        records.append({
+            "Stakeholder": _holder(rng, index),
+            "Share Class": share_class,
+            "Shares": rng.randrange(1000, 500000),
+            "Issue Date": f"20{rng.randrange(18, 25)}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}",
+            "Price Per Share": round(rng.uniform(*prices[share_class]), 4)
+        })
+    return pd.DataFrame.from_records(records, columns=CAP_TABLE_COLUMNS)
+
+def _issuance_lines(rows, verb):
+    return [
+        f"{row['Stakeholder']} {verb} {row['Shares']:,} shares of {row['Share Class']} Stock at ${row['Price Per Share']:.4f} per share on {row['Issue Date']}."
+        for _, row in rows.iterrows()
+    ]
+
+# Title and body lines for one document. rows are the cap table rows it supports.
+def document_lines(kind, rows, cap_table, rng):
+    if kind == "charter":
+        authorized = int(cap_table["Shares"].sum() * 1.5)
+        return ["CERTIFICATE OF INCORPORATION OF EXAMPLE CO., INC.",
+                f"The Company is authorized to issue {authorized:,} shares of Common Stock, par value $0.0001 per share."]
+    if kind == "board_consent":
+        return (["ACTION BY UNANIMOUS WRITTEN CONSENT OF THE BOARD OF DIRECTORS",
+                 "RESOLVED, that the issuances set forth below are hereby approved:"] + _issuance_lines(rows, "is issued"))
+    if kind == "stock_purchase_agreement":
+        return (["SERIES A PREFERRED STOCK PURCHASE AGREEMENT", "SCHEDULE OF PURCHASERS"] + _issuance_lines(rows, "purchases"))
+    if kind == "option_grant":
+        return (["NOTICE OF STOCK OPTION GRANT", "Each Optionee below is granted an option under the 2020 Equity Incentive Plan."]
+                + _issuance_lines(rows, "is granted"))
+    return ["WRITTEN CONSENT OF THE STOCKHOLDERS",
+            "The undersigned stockholders, holding a majority of the outstanding shares, approve the amendment of the charter."]
+
+def _write_document(path, pages, file_format):
+    if file_format == "pdf":
+        with open(path, "wb") as f:
+            f.write(make_pdf(pages))
+    elif file_format == "docx":
+        document = docx.Document()
+        for lines in pages:
+            for line in lines:
+                document.add_paragraph(line)
+        document.save(path)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n\n".join("\n".join(lines) for lines in pages))
+
+# Write a data room to out_dir: cap_table.csv (or .xlsx) and `documents` supporting
+# documents of pages_per_document pages each. Every issuance document covers a
+# slice of cap table rows, so tie-out finds matches. Returns the written paths.
+def generate_data_room(out_dir, documents=10, cap_table_rows=500, pages_per_document=2, seed=0, cap_table_format="csv"):
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    cap_table = synthetic_cap_table(cap_table_rows, seed)
+    cap_table_path = os.path.join(out_dir, f"cap_table.{cap_table_format}")
+    if cap_table_format == "xlsx":
+        cap_table.to_excel(cap_table_path, index=False)
+    else:
+        cap_table.to_csv(cap_table_path, index=False)
+
+    by_kind = {
+        "board_consent": cap_table,
+        "stock_purchase_agreement": cap_table[cap_table["Share Class"].str.contains("Preferred")],
+        "option_grant": cap_table[cap_table["Share Class"] == "Option"]
+    }
+    paths = [cap_table_path]
+    for index in range(documents):
+        kind = DOCUMENT_KINDS[index % len(DOCUMENT_KINDS)]
+        file_format = FORMATS[index % len(FORMATS)]
+        candidates = by_kind.get(kind)
+        rows = candidates.sample(n=min(len(candidates), rng.randrange(3, 15)), random_state=rng.randrange(2 ** 31)) if candidates is not None and len(candidates) else cap_table.head(0)
+
+        lines = document_lines(kind, rows, cap_table, rng)
+        filler = synthetic_lines(max(0, pages_per_document * LINES_PER_PAGE - len(lines)), rng)
+        body = lines + filler
+        pages = [body[start:start + LINES_PER_PAGE] for start in range(0, len(body), LINES_PER_PAGE)] or [[]]
+
+        path = os.path.join(out_dir, f"{index:05d}_{kind}.{file_format}")
+        _write_document(path, pages, file_format)
+        paths.append(path)
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("out_dir")
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--pages", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cap-table-format", choices=["csv", "xlsx"], default="csv")
+    args = parser.parse_args()
+
+    paths = generate_data_room(args.out_dir, args.documents, args.rows, args.pages, args.seed, args.cap_table_format)
+    print(f"Wrote {len(paths)} files to {args.out_dir}")
+
+if __name__ == "__main__":
+    main()
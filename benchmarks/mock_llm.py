@@ -0,0 +1,241 @@
+"""Local stand-in for the Anthropic Messages API with configurable latency.
+
+Answers extraction, column mapping, verification and remediation requests with canned
+responses shaped like the real ones, streamed or not. Prompt prefixes marked with
+cache_control are remembered and reported as cache reads when they are sent again,
+as the API does: only for models that support prompt caching and prefixes of at least
+their minimum length. Point the app at it with DILIGIZE_LLM_BASE_URL=http://127.0.0.1:PORT.
+
+Run from the repository root: python -m benchmarks.mock_llm --port 8089 --latency 0.5
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.data_room import CAP_TABLE_COLUMNS
+
+ISSUANCE = re.compile(r"([A-Z][\w.,' ]+?) (?:purchases|is granted|is issued) ([\d,]+) shares of ([A-Za-z ]+?) Stock at \$([\d.]+) per share on ([\d-]+)")
+REMEDIATION_PLAN = """## Remediation Plan
+
+### High Priority
+1. Reconcile share counts that differ from the executed agreements.
+2. Obtain missing board approvals for unsupported issuances.
+
+### Medium Priority
+1. Confirm exercise prices against the most recent 409A valuation.
+
+### Timeline
+Complete high priority items within two weeks and the rest within thirty days.
+"""
+
+def _prompt_text(body):
+    system = body.get("system") or ""
+    parts = [block.get("text", "") for block in system] if isinstance(system, list) else [system]
+    for message in body.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        elif isinstance(content, list):
+            parts.extend(block.get("text", "") or str(block.get("content", "")) for block in content if isinstance(block, dict))
+    return "\n".join(parts)
+
+def _extraction(prompt):
+    issuances = [
+        {"name": name.strip(), "shares": int(shares.replace(",", "")), "share_class": share_class, "price_per_share": float(price), "date": date}
+        for name, shares, share_class, price, date in ISSUANCE.findall(prompt)
+    ]
+    return {"document_date": "2021-06-30", "stakeholders": issuances, "approval": "Approved by the Board of Directors"}
+
+def _column_mapping():
+    stakeholder, share_class, shares, date, price = CAP_TABLE_COLUMNS
+    return {"stakeholder": stakeholder, "share_class": share_class, "shares": shares, "percentage": None, "date": date, "price": price}
+
+def _verification(tool):
+    categories = tool["input_schema"]["properties"]["verification_results"]["required"]
+    return {
+        "verification_results": {
+            category: {"verified": True, "notes": "Consistent with the supporting documents.", "recommendations": []}
+            for category in categories
+        },
+        "discrepancies": []
+    }
+
+# Response content blocks for a request, chosen from its system prompt and tools
+def respond(body):
+    tools = body.get("tools") or []
+    if tools:
+        return [{"type": "tool_use", "id": f"toolu_{random.randrange(10 ** 12)}", "name": tools[0]["name"], "input": _verification(tools[0])}]
+    system = body.get("system") or ""
+    if "extracts structured information" in system:
+        text = json.dumps(_extraction(_prompt_text(body)))
+    elif "cap table structures" in system:
+        text = json.dumps(_column_mapping())
+    else:
+        text = REMEDIATION_PLAN
+    return [{"type": "text", "text": text}]
+
+# Serialized request prefixes ending at each cache_control breakpoint, in prompt order
+# (tools, then system, then messages)
+def _cache_prefixes(body):
+    blocks = list(body.get("tools") or [])
+    system = body.get("system")
+    blocks += system if isinstance(system, list) else [system or ""]
+    for message in body.get("messages", []):
+        content = message.get("content")
+        blocks += content if isinstance(content, list) else [content]
+    return [json.dumps(blocks[:index + 1]) for index, block in enumerate(blocks) if isinstance(block, dict) and block.get("cache_control")]
+
+# Models that support prompt caching and the minimum tokens of a cacheable prefix
+CACHE_MIN_TOKENS = {
+    "claude-3-5-sonnet-20240620": 1024,
+    "claude-3-5-sonnet-20241022": 1024,
+    "claude-3-opus-20240229": 1024,
+    "claude-3-haiku-20240307": 2048,
+    "claude-3-5-haiku-20241022": 2048,
+}
+
+# (uncached input, cache write, cache read) tokens for a request. The longest prefix
+# seen before is read from the cache; the rest up to the last breakpoint is written.
+# Breakpoints are ignored for other models and on prefixes shorter than the minimum.
+def _cache_usage(server, body):
+    total = len(json.dumps(body)) // 4
+    minimum = CACHE_MIN_TOKENS.get(body.get("model"))
+    prefixes = [prefix for prefix in _cache_prefixes(body) if minimum and len(prefix) // 4 >= minimum]
+    if not prefixes:
+        return total, 0, 0
+    with server.lock:
+        read = max((len(prefix) // 4 for prefix in prefixes if prefix in server.cached_prefixes), default=0)
+        server.cached_prefixes.update(prefixes)
+    written = len(prefixes[-1]) // 4 - read
+    return max(total - read - written, 0), written, read
+
+def _pieces(text, size):
+    return [text[start:start + size] for start in range(0, len(text), size)] or [""]
+
+class MockMessagesHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_event(self, event, payload):
+        data = f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))) or b"{}")
+        with server.lock:
+            server.requests += 1
+
+        if random.random() < server.error_rate:
+            with server.lock:
+                server.errors += 1
+            self._send_json(429, {"type": "error", "error": {"type": "rate_limit_error", "message": "Mock rate limit"}}, {"retry-after": "0"})
+            return
+
+        time.sleep(server.latency)
+        content = respond(body)
+        input_tokens, cache_write_tokens, cache_read_tokens = _cache_usage(server, body)
+        output_tokens = sum(len(json.dumps(block)) for block in content) // 4
+        usage = {"input_tokens": input_tokens, "output_tokens": output_tokens, "cache_creation_input_tokens": cache_write_tokens, "cache_read_input_tokens": cache_read_tokens}
+        message = {
+            "id": f"msg_{random.randrange(10 ** 12)}", "type": "message", "role": "assistant", "model": body.get("model", "mock"),
+            "stop_sequence": None, "usage": usage
+        }
+
+        if not body.get("stream"):
+            stop_reason = "tool_use" if content[0]["type"] == "tool_use" else "end_turn"
+            self._send_json(200, {**message, "content": content, "stop_reason": stop_reason})
+            return
+
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("transfer-encoding", "chunked")
+        self.end_headers()
+        self._send_event("message_start", {"type": "message_start", "message": {**message, "content": [], "stop_reason": None, "usage": {**usage, "output_tokens": 0}}})
+        block = content[0]
+        if block["type"] == "tool_use":
+            self._send_event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {**block, "input": {}}})
+            deltas = [{"type": "input_json_delta", "partial_json": piece} for piece in _pieces(json.dumps(block["input"]), server.chunk_chars)]
+        else:
+            self._send_event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+            deltas = [{"type": "text_delta", "text": piece} for piece in _pieces(block["text"], server.chunk_chars)]
+        for delta in deltas:
+            time.sleep(server.chunk_delay)
+            self._send_event("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": delta})
+        self._send_event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        stop_reason = "tool_use" if block["type"] == "tool_use" else "end_turn"
+        self._send_event("message_delta", {"type": "message_delta", "delta": {"stop_reason": stop_reason, "stop_sequence": None}, "usage": {"output_tokens": output_tokens}})
+        self._send_event("message_stop", {"type": "message_stop"})
+        self.wfile.write(b"0\r\n\r\n")
+
+# Threaded mock server. latency is the delay before each response, chunk_delay the
+# delay between streamed chunks of chunk_chars characters, and error_rate the share
+# of requests rejected with 429. Use as a context manager or call start()/stop().
+class MockMessagesServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.2, chunk_delay=0.01, chunk_chars=40, error_rate=0.0):
+        super().__init__((host, port), MockMessagesHandler)
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.chunk_chars = chunk_chars
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.cached_prefixes = set()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--chunk-delay", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = MockMessagesServer(port=args.port, latency=args.latency, chunk_delay=args.chunk_delay, error_rate=args.error_rate)
+    print(f"Mock Messages API listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import io
+import random
+
+# Boilerplate clauses used to fill synthetic legal documents
+CLAUSES = [
+    "The Company is authorized to issue {shares:,} shares of Common Stock, par value $0.0001 per share.",
+    "Each Purchaser agrees to purchase {shares:,} shares of Series A Preferred Stock at a price of ${price:.4f} per share.",
+    "The Board of Directors hereby approves the grant of an option to purchase {shares:,} shares to {holder}.",
+    "The Warrant may be exercised for up to {shares:,} shares at an exercise price of ${price:.2f} per share.",
+    "This Agreement shall be governed by the laws of the State of Delaware without regard to conflicts of law.",
+    "Section {section}. Representations and Warranties of the Company.",
+    "The undersigned stockholders, constituting the holders of a majority of the outstanding shares, hereby consent.",
+]
+
+HOLDERS = ["Acme Ventures II, L.P.", "Jane Smith", "John Doe", "Blue Harbor Capital LLC", "Alex Chen", "Priya Patel"]
+
+def _escape_pdf_text(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+# Random lines of legal-sounding text
+def synthetic_lines(count, rng=None):
+    rng = rng or random.Random(0)
+    lines = []
+    for i in range(count):
+        clause = rng.choice(CLAUSES)
+        lines.append(clause.format(
+            shares=rng.randrange(1000, 5000000),
+            price=rng.uniform(0.01, 20),
+            holder=rng.choice(HOLDERS),
+            section=i + 1
+        ))
+    return lines
+
+# Build a minimal text-only PDF. pages is a list of pages, each a list of lines.
+def make_pdf(pages):
+    objects = []
+    page_ids = []
+    # Object numbers: 1 catalog, 2 page tree, 3 font, then a page and content stream per page
+    for index, lines in enumerate(pages):
+        page_id = 4 + index * 2
+        page_ids.append(page_id)
+        commands = ["BT", "/F1 10 Tf", "12 TL", "50 760 Td"]
+        for line in lines:
+            commands.append(f"({_escape_pdf_text(line)}) Tj T*")
+        commands.append("ET")
+        stream = "\n".join(commands).encode("latin-1", "replace")
+        objects.append((page_id, f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>".encode()))
+        objects.append((page_id + 1, b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream"))
+
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects = [
+        (1, b"<< /Type /Catalog /Pages 2 0 R >>"),
+        (2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()),
+        (3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"),
+    ] + objects
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = {}
+    for number, body in objects:
+        offsets[number] = out.tell()
+        out.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref_offset = out.tell()
+    size = max(offsets) + 1
+    out.write(f"xref\n0 {size}\n0000000000 65535 f \n".encode())
+    for number in range(1, size):
+        out.write(f"{offsets[number]:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+    return out.getvalue()
+
+# Synthetic multi-page legal document as PDF bytes
+def synthetic_pdf(page_count, lines_per_page=45, seed=0):
+    rng = random.Random(seed)
+    return make_pdf([synthetic_lines(lines_per_page, rng) for _ in range(page_count)])
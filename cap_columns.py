@@ -0,0 +1,122 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from doc_cache import make_key
+
+# Fields identified in a cap table, in the keys used by column_mapping
+FIELDS = ["stakeholder", "share_class", "shares", "percentage", "date", "price"]
+
+# Header patterns per field with the score a matching header earns
+HEADER_PATTERNS = {
+    "stakeholder": [(r"^(stakeholder|shareholder|holder|security ?holder|investor|name|owner|grantee|optionee)( name)?$", 1.0),
+                    (r"(stakeholder|shareholder|holder|investor|owner|grantee|optionee)", 0.8), (r"name", 0.6)],
+    "share_class": [(r"^(share ?class|class|security ?class|stock ?class|series|security|share ?type|equity ?type)$", 1.0),
+                    (r"(class|series|security type|stock type)", 0.8)],
+    "shares": [(r"^(shares|number of shares|no\.? of shares|share count|# ?shares|quantity|shares (held|outstanding|issued)|outstanding)$", 1.0),
+               (r"(shares|quantity|units)", 0.7)],
+    "percentage": [(r"^(%|percent(age)?|ownership( %)?|% ownership|fully diluted %|% fd|% of total)$", 1.0),
+                   (r"(%|percent|ownership)", 0.8)],
+    "date": [(r"^(date|issue date|grant date|issuance date|purchase date|acquisition date)$", 1.0), (r"date", 0.8)],
+    "price": [(r"^(price|price per share|issue price|exercise price|strike price|purchase price|pps|cost per share)$", 1.0),
+              (r"(price|per share|pps|strike)", 0.8)]
+}
+_COMPILED_PATTERNS = {field: [(re.compile(pattern), score) for pattern, score in patterns] for field, patterns in HEADER_PATTERNS.items()}
+
+HEADER_WEIGHT = 0.6
+PROFILE_WEIGHT = 0.4
+# Least score of a header that exactly names a field, unless the values rule the field
+# out. Values alone can't confirm some fields (holders repeat across grants), so an
+# exact header is enough to skip the LLM.
+EXACT_HEADER_SCORE = 0.8
+# Heuristic mappings at or above this confidence skip the LLM
+CONFIDENCE_THRESHOLD = 0.7
+# Minimum score for a column to be assigned to a field at all
+MIN_FIELD_SCORE = 0.35
+# Rows sampled for value profiling
+PROFILE_ROWS = 500
+
+CLASS_WORDS = re.compile(r"\b(?:common|preferred|series|option|warrant|rsu|safe|note|class)\b", re.IGNORECASE)
+
+def normalize_header(header):
+    return re.sub(r"[\s_]+", " ", str(header).strip().lower())
+
+# Cache key for a header row, independent of case, spacing and underscores
+def header_signature(columns):
+    return make_key("cap_table_columns", [normalize_header(column) for column in columns])
+
+def _header_score(field, header):
+    for pattern, score in _COMPILED_PATTERNS[field]:
+        if pattern.search(header):
+            return score
+    return 0.0
+
+# Score how well a column's values fit each field
+def _profile_scores(values):
+    scores = dict.fromkeys(FIELDS, 0.0)
+    values = values.dropna()
+    if values.empty:
+        return scores
+
+    text = values.astype(str).str.strip()
+    cleaned = text.str.replace(r"[,$\s]", "", regex=True)
+    numbers = pd.to_numeric(cleaned.str.rstrip("%"), errors="coerce")
+    numeric_share = numbers.notna().mean()
+    percent_signs = text.str.endswith("%").mean()
+    uniqueness = text.nunique() / len(text)
+
+    if numeric_share < 0.2:
+        dates = pd.to_datetime(text, errors="coerce", format="mixed")
+        date_share = dates.notna().mean()
+        scores["date"] = date_share
+        class_share = text.str.contains(CLASS_WORDS).mean()
+        scores["share_class"] = max(class_share, 0.5 if uniqueness < 0.05 else 0.0) * (1 - date_share)
+        scores["stakeholder"] = min(1.0, uniqueness * 1.5) * (1 - date_share) * (1 - class_share)
+        return scores
+
+    valid = numbers.dropna()
+    integral = (valid == np.floor(valid)).mean()
+    scores["percentage"] = max(percent_signs, numeric_share * 0.6 if valid.between(0, 100).all() and valid.sum() <= 101 else 0.0)
+    scores["shares"] = numeric_share * integral * (1.0 if valid.median() >= 100 else 0.4) * (1 - percent_signs)
+    scores["price"] = numeric_share * (1 - integral * 0.7) * (1.0 if valid.median() < 1000 else 0.2) * (1 - percent_signs)
+    return scores
+
+# Infer column_mapping from header names and value profiles. Returns the mapping
+# and a confidence between 0 and 1 (the weakest of the stakeholder and shares scores).
+def infer_column_mapping(df):
+    sample = df.head(PROFILE_ROWS)
+    candidates = []
+    for column in df.columns:
+        header = normalize_header(column)
+        profile = _profile_scores(sample[column])
+        for field in FIELDS:
+            header_score = _header_score(field, header)
+            score = HEADER_WEIGHT * header_score + PROFILE_WEIGHT * profile[field]
+            if header_score == 1.0 and profile[field] > 0:
+                score = max(score, EXACT_HEADER_SCORE)
+            if score >= MIN_FIELD_SCORE:
+                candidates.append((score, field, column))
+
+    # Assign the strongest field/column pairs first, each column at most once
+    mapping = {}
+    scores = {}
+    used_columns = set()
+    for score, field, column in sorted(candidates, key=lambda candidate: -candidate[0]):
+        if field not in mapping and column not in used_columns:
+            mapping[field] = column
+            scores[field] = score
+            used_columns.add(column)
+
+    confidence = min(scores.get("stakeholder", 0.0), scores.get("shares", 0.0))
+    return mapping, float(confidence)
+
+# A mapping is only used (and cached) when it is a dict of known fields to column
+# names present in df, or None for fields the cap table lacks
+def mapping_fits(column_mapping, df):
+    if not isinstance(column_mapping, dict) or not column_mapping:
+        return False
+    return all(
+        field in FIELDS and (column is None or (isinstance(column, str) and column in df.columns))
+        for field, column in column_mapping.items()
+    )
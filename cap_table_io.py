@@ -0,0 +1,136 @@
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from doc_cache import make_key
+from tieout import to_number
+
+# Bump when the reader's output changes so cached tables are re-read
+CAP_TABLE_READER_VERSION = "1"
+# Rows per CSV chunk
+CSV_CHUNK_ROWS = 50000
+
+# Smallest integer or float dtype that holds every value of a numeric column exactly
+def downcast_numeric(series):
+    if pd.api.types.is_bool_dtype(series) or not pd.api.types.is_numeric_dtype(series):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast="integer")
+    values = series.to_numpy()
+    finite = values[~np.isnan(values)]
+    if finite.size and np.all(finite == np.floor(finite)) and np.abs(finite).max() < 2 ** 53:
+        # Whole numbers with gaps (e.g. share counts with blanks) stay float64 so they
+        # remain exact; float32 only holds integers up to 2**24
+        return series.astype("float64")
+    downcast = series.astype("float32")
+    if np.array_equal(downcast.to_numpy(dtype="float64"), values, equal_nan=True):
+        return downcast
+    return series
+
+# Shrink a freshly read table: numeric columns are downcast and text columns (holders,
+# share classes, dates) become categoricals
+def optimize_dtypes(df):
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_numeric_dtype(series):
+            df[column] = downcast_numeric(series)
+        elif series.dtype == object or pd.api.types.is_string_dtype(series):
+            if pd.api.types.infer_dtype(series, skipna=True) not in ("string", "empty"):
+                # Mixed cells (e.g. numbers typed into a name column) are kept as text
+                series = series.map(lambda value: value if value is None or isinstance(value, str) or value != value else str(value))
+            df[column] = series.astype("category")
+    return df
+
+def _column_names(header):
+    names = []
+    seen = {}
+    for index, name in enumerate(header):
+        name = f"Unnamed: {index}" if name is None or str(name).strip() == "" else str(name)
+        # Repeated headers get a suffix, as pandas does
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+# Stream the first worksheet of an .xlsx file in openpyxl's read-only mode, building
+# each column as it goes instead of loading the whole workbook
+def read_xlsx(data):
+    import openpyxl
+    workbook = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+        columns = [[] for _ in header]
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            for index, column in enumerate(columns):
+                column.append(row[index] if index < len(row) else None)
+    finally:
+        workbook.close()
+
+    names = _column_names(header)
+    df = pd.DataFrame({name: pd.Series(values, dtype=object) for name, values in zip(names, columns)})
+    # Let pandas pick numeric and datetime dtypes as read_excel would
+    return df.infer_objects()
+
+# Read a CSV in chunks. Each chunk is shrunk before the next is read, and categorical
+# columns are combined across chunks.
+def read_csv(data, chunk_rows=CSV_CHUNK_ROWS):
+    chunks = [optimize_dtypes(chunk) for chunk in pd.read_csv(io.BytesIO(data), chunksize=chunk_rows)]
+    if not chunks:
+        return pd.DataFrame()
+    if len(chunks) == 1:
+        return chunks[0]
+
+    combined = {}
+    for column in chunks[0].columns:
+        parts = [chunk[column] for chunk in chunks]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            combined[column] = pd.Series(pd.api.types.union_categoricals(parts, ignore_order=True))
+        else:
+            # A column that is numeric in one chunk and text in another is re-shrunk below
+            combined[column] = pd.concat([part.astype(object) if isinstance(part.dtype, pd.CategoricalDtype) else part for part in parts], ignore_index=True)
+    return optimize_dtypes(pd.DataFrame(combined))
+
+# Read a cap table file into a DataFrame with compact dtypes
+def read_cap_table_file(file):
+    file_extension = os.path.splitext(file.name)[1].lower()
+    data = file.getvalue()
+    if file_extension == ".xlsx":
+        df = read_xlsx(data)
+    elif file_extension == ".xls":
+        # openpyxl cannot read the legacy format
+        df = pd.read_excel(io.BytesIO(data))
+    elif file_extension == ".csv":
+        return read_csv(data)
+    else:
+        raise ValueError(f"Unsupported cap table format: {file_extension}")
+    df.columns = [str(column) for column in df.columns]
+    return optimize_dtypes(df)
+
+# Read a cap table, reusing the cached Parquet copy for identical file contents
+def read_cap_table(file, file_hash, cache):
+    key = make_key(file_hash, CAP_TABLE_READER_VERSION)
+    data = cache.get_bytes("cap_table", key, ".parquet")
+    if data is not None:
+        return pd.read_parquet(io.BytesIO(data))
+
+    df = read_cap_table_file(file)
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    cache.put_bytes("cap_table", key, buffer.getvalue(), ".parquet")
+    return df
+
+# Numeric version of a column: numbers are kept, text such as "1,000" is parsed
+def numeric_column(series):
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+    return downcast_numeric(to_number(series))
@@ -0,0 +1,178 @@
+import contextvars
+import copy
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pdf_extract import page_for_offset
+
+# Rough characters-per-token ratio used for budgeting
+CHARS_PER_TOKEN = 4
+# Target size of one chunk. Well inside the context window, and small enough that
+# the chunks of a long agreement can be extracted in parallel.
+CHUNK_TOKENS = 6000
+# Estimated input tokens allowed in flight across all chunk calls in the process
+TOKEN_BUDGET = 60000
+# Chunk calls per document
+MAX_CHUNK_WORKERS = 8
+
+# Lines that start a new section: articles, sections, schedules, exhibits and numbered headings
+SECTION_BOUNDARY = re.compile(
+    r"^[ \t]*(?:ARTICLE|Article|SECTION|Section|SCHEDULE|Schedule|EXHIBIT|Exhibit|ANNEX|Annex|APPENDIX|Appendix)\b"
+    r"|^[ \t]*\d+(?:\.\d+)*\.?[ \t]+[A-Z]",
+    re.MULTILINE
+)
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+# Limits the estimated tokens in flight across threads
+class TokenBudget:
+    def __init__(self, max_tokens):
+        self.max_tokens = max_tokens
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, tokens):
+        # A single request larger than the budget is allowed once nothing else is running
+        tokens = min(tokens, self.max_tokens)
+        with self._condition:
+            while self.in_flight + tokens > self.max_tokens:
+                self._condition.wait()
+            self.in_flight += tokens
+        return tokens
+
+    def release(self, tokens):
+        with self._condition:
+            self.in_flight -= tokens
+            self._condition.notify_all()
+
+token_budget = TokenBudget(TOKEN_BUDGET)
+
+# Split text into (start, end) spans at section boundaries
+def split_sections(text):
+    starts = sorted({0} | {match.start() for match in SECTION_BOUNDARY.finditer(text)})
+    return [(start, end) for start, end in zip(starts, starts[1:] + [len(text)]) if end > start]
+
+# Split an oversized span at paragraph breaks, falling back to line breaks and hard cuts
+def _split_span(text, start, end, max_chars):
+    spans = []
+    while end - start > max_chars:
+        cut = -1
+        for separator in ("\n\n", "\n", " "):
+            cut = text.rfind(separator, start + max_chars // 2, start + max_chars)
+            if cut != -1:
+                cut += len(separator)
+                break
+        if cut == -1:
+            cut = start + max_chars
+        spans.append((start, cut))
+        start = cut
+    spans.append((start, end))
+    return spans
+
+# Pack sections greedily into chunks of at most chunk_tokens, returned as (start, end) spans
+def chunk_text(text, chunk_tokens=CHUNK_TOKENS):
+    max_chars = chunk_tokens * CHARS_PER_TOKEN
+    chunks = []
+    current_start = current_end = 0
+    for start, end in split_sections(text):
+        for span_start, span_end in _split_span(text, start, end, max_chars):
+            if span_end - current_start > max_chars and current_end > current_start:
+                chunks.append((current_start, current_end))
+                current_start = span_start
+            current_end = span_end
+    if current_end > current_start:
+        chunks.append((current_start, current_end))
+    return chunks
+
+def _canonical(value):
+    return json.dumps(value, sort_keys=True, default=str)
+
+def _merge_into(target, partial, source, provenance, conflicts, path):
+    for key, value in partial.items():
+        key_path = f"{path}.{key}" if path else key
+        if key not in target:
+            target[key] = copy.deepcopy(value)
+            provenance.setdefault(key_path, []).append(source)
+        elif isinstance(target[key], dict) and isinstance(value, dict):
+            _merge_into(target[key], value, source, provenance, conflicts, key_path)
+        elif isinstance(target[key], list) or isinstance(value, list):
+            if not isinstance(target[key], list):
+                target[key] = [target[key]]
+            existing = {_canonical(item) for item in target[key]}
+            for item in value if isinstance(value, list) else [value]:
+                if _canonical(item) not in existing:
+                    existing.add(_canonical(item))
+                    target[key].append(copy.deepcopy(item))
+                    provenance.setdefault(f"{key_path}[{len(target[key]) - 1}]", []).append(source)
+        elif _canonical(target[key]) == _canonical(value):
+            provenance.setdefault(key_path, []).append(source)
+        elif target[key] in (None, "", [], {}):
+            target[key] = copy.deepcopy(value)
+            provenance[key_path] = [source]
+        elif value not in (None, "", [], {}):
+            # The earliest chunk wins; later disagreeing values are kept for review,
+            # each once, with the first chunk it appeared in
+            canonical = _canonical(value)
+            if not any(conflict["field"] == key_path and _canonical(conflict["value"]) == canonical for conflict in conflicts):
+                conflicts.append({"field": key_path, "value": value, "source": source})
+
+# Merge per-chunk results deterministically, in chunk order. Scalars keep the first
+# non-empty value, lists are unioned, nested objects are merged key by key.
+# "_provenance" maps each field path to the chunks and pages it came from.
+def merge_partials(partials):
+    merged = {}
+    provenance = {}
+    conflicts = []
+    for source, partial in partials:
+        if isinstance(partial, dict):
+            _merge_into(merged, partial, source, provenance, conflicts, "")
+    merged["_provenance"] = provenance
+    if conflicts:
+        merged["_conflicts"] = conflicts
+    return merged
+
+# Provenance record for a chunk: chunk index and 1-based page range
+def chunk_source(index, start, end, page_offsets):
+    source = {"chunk": index}
+    if page_offsets:
+        first_page = page_for_offset(page_offsets, start) + 1
+        last_page = page_for_offset(page_offsets, max(start, end - 1)) + 1
+        source["pages"] = [first_page, last_page]
+    return source
+
+# Map-reduce extraction. extract_chunk(chunk_text, index, count, source) returns a dict
+# for one chunk; chunks run in parallel within the shared token budget and are merged
+# into one record. Failed chunks are listed under "_failed_chunks".
+def extract_chunked(text, extract_chunk, page_offsets=None, chunk_tokens=CHUNK_TOKENS, max_workers=MAX_CHUNK_WORKERS):
+    chunks = chunk_text(text, chunk_tokens)
+    sources = [chunk_source(index, start, end, page_offsets) for index, (start, end) in enumerate(chunks)]
+
+    def run(index):
+        start, end = chunks[index]
+        reserved = token_budget.acquire(estimate_tokens(text[start:end]))
+        try:
+            return extract_chunk(text[start:end], index, len(chunks), sources[index])
+        finally:
+            token_budget.release(reserved)
+
+    results = [None] * len(chunks)
+    errors = []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as pool:
+        # Each chunk runs in a copy of the caller's context so per-call instrumentation follows it
+        futures = [pool.submit(contextvars.copy_context().run, run, index) for index in range(len(chunks))]
+        for index, future in enumerate(futures):
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                errors.append({"chunk": index, "error": str(e)})
+
+    if chunks and len(errors) == len(chunks):
+        return {"error": errors[0]["error"]}
+
+    merged = merge_partials([(sources[index], result) for index, result in enumerate(results) if result is not None])
+    if errors:
+        merged["_failed_chunks"] = errors
+    return merged
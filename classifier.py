@@ -0,0 +1,110 @@
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+# Characters from the start of a document that are scored
+CLASSIFY_CHARS = 8000
+# Matches within the opening characters (the title block) count extra
+TITLE_CHARS = 600
+TITLE_BOOST = 2.0
+# Occurrences of one feature counted at most this many times
+MAX_FEATURE_COUNT = 3
+# Below this score a document is "Other"
+MIN_SCORE = 2.5
+
+# Weighted features per category, matched against lowercased text at word starts.
+# Each pattern must begin with a literal character. Within a category, more
+# specific phrases come first so they win over shorter phrases at the same position.
+FEATURES = [
+    ("Charter Amendment", r"certificate\s+of\s+amendment", 5.0),
+    ("Charter Amendment", r"amendment\s+to\s+(?:the\s+)?(?:amended\s+and\s+restated\s+)?certificate\s+of\s+incorporation", 5.0),
+    ("Charter Amendment", r"charter\s+amendment", 4.0),
+    ("Certificate of Incorporation", r"certificate\s+of\s+incorporation", 3.0),
+    ("Certificate of Incorporation", r"articles\s+of\s+incorporation", 3.0),
+    ("Certificate of Incorporation", r"authorized\s+to\s+issue", 1.0),
+    ("Board Consent", r"written\s+consent\s+of\s+the\s+board\s+of\s+directors", 6.0),
+    ("Board Consent", r"resolutions?\s+of\s+the\s+board", 4.0),
+    ("Board Consent", r"board\s+of\s+directors", 1.0),
+    ("Board Consent", r"resolved\b", 1.0),
+    ("Stockholder Consent", r"written\s+consent\s+of\s+the\s+(?:stockholders|shareholders)", 6.0),
+    ("Stockholder Consent", r"consent\s+of\s+the\s+(?:stockholders|shareholders)", 5.0),
+    ("Stockholder Consent", r"majority\s+of\s+the\s+outstanding", 1.0),
+    ("Stock Purchase Agreement", r"stock\s+purchase\s+agreement", 6.0),
+    ("Stock Purchase Agreement", r"schedule\s+of\s+purchasers", 3.0),
+    ("Stock Purchase Agreement", r"purchase\s+agreement", 2.0),
+    ("Stock Purchase Agreement", r"purchasers?\b", 0.5),
+    ("Option Grant", r"notice\s+of\s+stock\s+option\s+grant", 6.0),
+    ("Option Grant", r"stock\s+option\s+agreement", 5.0),
+    ("Option Grant", r"option\s+grant", 3.0),
+    ("Option Grant", r"optionee\b", 2.0),
+    ("Option Grant", r"vesting\s+commencement\s+date", 2.0),
+    ("Equity Incentive Plan", r"equity\s+incentive\s+plan", 2.0),
+    ("Equity Incentive Plan", r"stock\s+(?:option|incentive)\s+plan", 2.0),
+    ("Equity Incentive Plan", r"plan\s+administrator", 2.0),
+    ("Equity Incentive Plan", r"share\s+reserve", 2.0),
+    ("Warrant Agreement", r"warrant\s+to\s+purchase", 6.0),
+    ("Warrant Agreement", r"warrantholder\b", 3.0),
+    ("Warrant Agreement", r"holder\s+of\s+this\s+warrant\b", 3.0),
+    ("Warrant Agreement", r"warrants?\b", 1.0),
+    ("Convertible Note", r"convertible\s+promissory\s+note", 6.0),
+    ("Convertible Note", r"convertible\s+notes?\b", 4.0),
+    ("Convertible Note", r"maturity\s+date", 1.0),
+    ("Convertible Note", r"principal\s+amount", 1.0),
+    ("SAFE Agreement", r"simple\s+agreement\s+for\s+future\s+equity", 7.0),
+    ("SAFE Agreement", r"post-money\s+valuation\s+cap", 2.0),
+    ("SAFE Agreement", r"safes?\b", 1.0),
+    ("409A Valuation", r"409a\b", 5.0),
+    ("409A Valuation", r"fair\s+market\s+value\s+of\s+(?:the\s+)?common\s+stock", 3.0),
+    ("409A Valuation", r"valuation\s+report", 2.0),
+    ("409A Valuation", r"valuation\b", 0.5),
+    ("Transfer Agreement", r"stock\s+transfer\s+agreement", 6.0),
+    ("Transfer Agreement", r"assignment\s+separate\s+from\s+certificate", 4.0),
+    ("Transfer Agreement", r"stock\s+power", 3.0),
+    ("Transfer Agreement", r"transfer(?:or|ee)s?\b", 1.5),
+]
+
+CATEGORIES = list(dict.fromkeys(category for category, _, _ in FEATURES))
+
+# All features in one alternation; the name of the matching group identifies the
+# feature. The lookahead skips words that cannot start any feature ("the", "of", ...)
+# before any alternative is tried.
+_LEADING_CHARS = "".join(sorted({pattern[0] for _, pattern, _ in FEATURES}))
+MATCHER = re.compile(
+    rf"\b(?=[{_LEADING_CHARS}])(?:" + "|".join(f"(?P<f{i}>{pattern})" for i, (_, pattern, _) in enumerate(FEATURES)) + ")"
+)
+_FEATURE_INDEX = {f"f{i}": i for i in range(len(FEATURES))}
+
+# Score every category in one pass over the leading text
+def score_document(text):
+    counts = {}
+    title_hits = set()
+    for match in MATCHER.finditer(text[:CLASSIFY_CHARS].lower()):
+        feature = _FEATURE_INDEX[match.lastgroup]
+        counts[feature] = counts.get(feature, 0) + 1
+        if match.start() < TITLE_CHARS:
+            title_hits.add(feature)
+
+    scores = dict.fromkeys(CATEGORIES, 0.0)
+    for feature, count in counts.items():
+        category, _, weight = FEATURES[feature]
+        boost = TITLE_BOOST if feature in title_hits else 1.0
+        scores[category] += weight * boost * min(count, MAX_FEATURE_COUNT)
+    return scores
+
+# Classify a document. Returns (category, confidence) where confidence is
+# between 0 and 1 and reflects the winning margin over the runner-up.
+def classify(text):
+    scores = score_document(text)
+    ranked = sorted(scores.items(), key=lambda item: -item[1])
+    (top_category, top), (_, second) = ranked[0], ranked[1]
+    if top < MIN_SCORE:
+        return "Other", round(1.0 - top / MIN_SCORE, 3)
+    return top_category, round((top - second) / top, 3)
+
+# Classify many documents; returns a list of (category, confidence). With
+# processes > 1, large batches are spread over a process pool.
+def classify_batch(texts, processes=1, chunksize=256):
+    if processes <= 1 or len(texts) <= chunksize:
+        return [classify(text) for text in texts]
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(classify, texts, chunksize=chunksize))
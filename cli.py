@@ -0,0 +1,61 @@
+import argparse
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import engine
+import instrumentation
+import llm
+
+# Run one deal and write its reports and a JSON trace; executed in a worker process
+def run_deal_to_reports(deal_dir, out_dir, api_key, remediation):
+    # Worker processes are reused across deals, so each trace starts empty
+    instrumentation.reset()
+    report = engine.run_deal(deal_dir, api_key, remediation=remediation)
+    json_path, markdown_path = engine.write_reports(report, out_dir)
+    with open(os.path.join(out_dir, f"{engine.report_name(report)}.trace.json"), "w", encoding="utf-8") as f:
+        f.write(instrumentation.export_trace(cache=engine.get_document_cache().stats(), llm=llm.stats()))
+    return report["deal"], len(report["errors"]), json_path, markdown_path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run cap table tie-outs headlessly over one or more deal directories.")
+    parser.add_argument("deals", nargs="+", help="Deal directories, each holding a cap table and supporting documents")
+    parser.add_argument("--out", default="reports", help="Directory for the JSON and markdown reports (default: reports)")
+    parser.add_argument("--workers", type=int, default=4, help="Deals processed in parallel, one process each")
+    parser.add_argument("--api-key", default=os.environ.get("ANTHROPIC_API_KEY"), help="Anthropic API key (default: $ANTHROPIC_API_KEY)")
+    parser.add_argument("--no-remediation", action="store_true", help="Skip generating remediation plans")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(processName)s %(message)s")
+    if not args.api_key:
+        parser.error("an Anthropic API key is required (--api-key or ANTHROPIC_API_KEY)")
+    
+    deals = [deal for deal in args.deals if os.path.isdir(deal)]
+    for deal in sorted(set(args.deals) - set(deals)):
+        logging.error(f"Not a directory: {deal}")
+    
+    failed = len(args.deals) - len(deals)
+    # A directory given twice (e.g. with and without a trailing slash) is run once
+    unique = {}
+    for deal in deals:
+        unique.setdefault(os.path.realpath(deal), deal)
+    deals = list(unique.values())
+    # Each worker process has its own rate limiter, so each gets a share of the account limits
+    workers = max(1, min(args.workers, len(deals) or 1))
+    with ProcessPoolExecutor(max_workers=workers, initializer=llm.share_limits, initargs=(workers,)) as pool:
+        futures = {pool.submit(run_deal_to_reports, deal, args.out, args.api_key, not args.no_remediation): deal for deal in deals}
+        for future in as_completed(futures):
+            try:
+                _, errors, json_path, markdown_path = future.result()
+                logging.info(f"{futures[future]}: {errors} errors, reports written to {json_path} and {markdown_path}")
+                if errors:
+                    failed += 1
+            except Exception as e:
+                logging.error(f"{futures[future]}: {str(e)}")
+                failed += 1
+    
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
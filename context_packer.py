@@ -0,0 +1,79 @@
+import json
+import os
+
+from chunked_extract import estimate_tokens
+
+# Estimated tokens of document facts allowed in one verification prompt. The rest of
+# the prompt (checklist, cap table summary, tie-out results) is small and bounded.
+CONTEXT_TOKENS = int(os.environ.get("DILIGIZE_CONTEXT_TOKENS", 100000))
+
+# Extracted values that carry no information for verification
+PLACEHOLDERS = {"n/a", "unknown", "not specified", "not provided", "not applicable"}
+
+# Marks a content block as the end of a prefix the API may cache and reuse
+CACHE_CONTROL = {"type": "ephemeral"}
+# The API only caches prefixes of at least this many tokens (Sonnet and Opus models;
+# Haiku needs 2048); a breakpoint on a shorter prefix does nothing
+CACHE_MIN_TOKENS = 1024
+
+def _is_empty(value):
+    if isinstance(value, str):
+        return not value.strip() or value.strip().lower() in PLACEHOLDERS
+    return value is None or (isinstance(value, (list, dict)) and not value)
+
+# Copy of extracted document info without private keys (such as provenance), empty
+# values and placeholders like "N/A", recursively
+def compact_info(value):
+    if isinstance(value, dict):
+        compacted = {}
+        for key, item in value.items():
+            if str(key).startswith("_"):
+                continue
+            item = compact_info(item)
+            if not _is_empty(item):
+                compacted[key] = item
+        return compacted
+    if isinstance(value, list):
+        return [item for item in (compact_info(item) for item in value) if not _is_empty(item)]
+    return value
+
+# One document as a single line of JSON without indentation. A document_type key
+# that repeats the document's type is dropped.
+def document_line(doc_id, doc):
+    info = compact_info(doc.get("info"))
+    if isinstance(info, dict) and str(info.get("document_type", "")).lower() == str(doc["type"]).lower():
+        info = {key: value for key, value in info.items() if key != "document_type"}
+    return json.dumps({"id": doc_id, "type": doc["type"], "info": info}, separators=(",", ":"), ensure_ascii=False, default=str)
+
+# Pack the facts of documents of the given types into at most `budget` estimated
+# tokens. Documents named in `priority` (e.g. by tie-out discrepancies) come first,
+# then documents whose type serves more of `type_weights`' categories, smaller ones
+# first within a tier. Documents that don't fit are dropped, and near-duplicates are
+# left out since their info is their canonical copy's. Returns the packed lines
+# and packing statistics.
+def pack_documents(documents, type_weights, budget=CONTEXT_TOKENS, priority=()):
+    priority = set(priority)
+    candidates = []
+    for doc_id, doc in documents.items():
+        if doc.get("info") and doc["type"] in type_weights and not doc.get("duplicate_of"):
+            line = document_line(doc_id, doc)
+            candidates.append((doc_id not in priority, -type_weights[doc["type"]], estimate_tokens(line), doc_id, line))
+    candidates.sort()
+
+    lines = []
+    stats = {"documents": len(candidates), "packed_documents": 0, "dropped_documents": 0, "packed_tokens": 0, "dropped_tokens": 0, "budget": budget}
+    for _, _, tokens, _, line in candidates:
+        if stats["packed_tokens"] + tokens <= budget:
+            lines.append(line)
+            stats["packed_documents"] += 1
+            stats["packed_tokens"] += tokens
+        else:
+            stats["dropped_documents"] += 1
+            stats["dropped_tokens"] += tokens
+    return "\n".join(lines), stats
+
+# A text content block, marked as a cache breakpoint when it is long enough to be cached
+def cached_text(text):
+    if estimate_tokens(text) < CACHE_MIN_TOKENS:
+        return {"type": "text", "text": text}
+    return {"type": "text", "text": text, "cache_control": CACHE_CONTROL}
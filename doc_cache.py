@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+# Default on-disk location and size limit for the document cache
+DEFAULT_CACHE_DIR = os.environ.get(
+    "DILIGIZE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "diligize")
+)
+DEFAULT_MAX_BYTES = int(os.environ.get("DILIGIZE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+# Hash file contents for content-addressed lookups
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+# Build a cache key from any JSON-serializable parts (file hash, model, prompt version, ...)
+def make_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+# json.dump default for values JSON can't encode: NumPy scalars and timestamps from
+# pandas become plain values, anything else its string
+def json_default(value):
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+# Write data to path through a temporary file in the same directory, so readers
+# never see a partial file
+def atomic_write(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+# Files under directory (skipping partial writes) as (path, size, mtime)
+def directory_entries(directory):
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not name.endswith(".tmp"):
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+# Remove the least recently modified files under directory until they total at most
+# target bytes, and return the remaining size
+def evict_oldest(directory, target):
+    entries = sorted(directory_entries(directory), key=lambda entry: entry[2])
+    size = sum(entry[1] for entry in entries)
+    for path, entry_size, _ in entries:
+        if size <= target:
+            break
+        try:
+            os.remove(path)
+            size -= entry_size
+        except OSError:
+            pass
+    return size
+
+# Content-addressed JSON (and binary) cache on disk with size-bounded LRU eviction.
+# Entries are grouped by kind ("text", "category", "info", ...) and hit/miss
+# counters are kept per kind. Safe to share between threads.
+class DocumentCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = {}
+        self.misses = {}
+        self._lock = threading.Lock()
+        self._size = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, kind, key, suffix=".json"):
+        return os.path.join(self.cache_dir, kind, key[:2], f"{key}{suffix}")
+
+    def _current_size(self):
+        if self._size is None:
+            self._size = sum(size for _, size, _ in directory_entries(self.cache_dir))
+        return self._size
+
+    def _read(self, kind, key, suffix):
+        path = self._path(kind, key, suffix)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # Touch the entry so eviction treats it as recently used
+            os.utime(path, None)
+        except OSError:
+            data = None
+
+        with self._lock:
+            counts = self.misses if data is None else self.hits
+            counts[kind] = counts.get(kind, 0) + 1
+        return data
+
+    def _write(self, kind, key, suffix, data):
+        path = self._path(kind, key, suffix)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            atomic_write(path, data)
+        except OSError:
+            return
+        with self._lock:
+            self._size = self._current_size() - old_size + len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def get(self, kind, key, default=None):
+        data = self._read(kind, key, ".json")
+        if data is None:
+            return default
+        try:
+            return json.loads(data.decode("utf-8"))
+        except ValueError:
+            return default
+
+    def put(self, kind, key, value):
+        self._write(kind, key, ".json", json.dumps(value, default=str).encode("utf-8"))
+
+    # Binary entries (e.g. Parquet files) share the size limit and LRU eviction
+    def get_bytes(self, kind, key, suffix=".bin"):
+        return self._read(kind, key, suffix)
+
+    def put_bytes(self, kind, key, data, suffix=".bin"):
+        self._write(kind, key, suffix, data)
+
+    # Remove least recently used entries until the cache is below 90% of its limit
+    def _evict(self):
+        self._size = evict_oldest(self.cache_dir, int(self.max_bytes * 0.9))
+
+    def clear(self):
+        with self._lock:
+            for path, _, _ in list(directory_entries(self.cache_dir)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            hits = sum(self.hits.values())
+            misses = sum(self.misses.values())
+            return {
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "size_bytes": self._current_size(),
+                "max_bytes": self.max_bytes
+            }
+
+_document_cache = None
+_document_cache_lock = threading.Lock()
+
+# Shared on-disk cache for extracted text, categories and document info
+def get_document_cache():
+    global _document_cache
+    with _document_cache_lock:
+        if _document_cache is None:
+            _document_cache = DocumentCache()
+        return _document_cache
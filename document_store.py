@@ -0,0 +1,153 @@
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+from doc_cache import atomic_write, directory_entries, evict_oldest
+
+# On-disk location and size limit for document contents, and the in-memory limit per store
+DEFAULT_STORE_DIR = os.environ.get(
+    "DILIGIZE_STORE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "diligize-documents")
+)
+DEFAULT_STORE_MAX_BYTES = int(os.environ.get("DILIGIZE_STORE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+DEFAULT_MEMORY_LIMIT = int(os.environ.get("DILIGIZE_SESSION_MEMORY_BYTES", 64 * 1024 * 1024))
+COMPRESSION_LEVEL = 6
+
+# Full document contents (extracted text or raw spreadsheet bytes), kept on disk
+# zlib-compressed and keyed by file hash, so sessions uploading the same file share
+# one copy. Contents are loaded lazily and the most recently used ones are held in
+# memory up to memory_limit bytes. On disk, the least recently used contents are
+# removed once the store passes max_bytes. Create one store per session.
+class DocumentStore:
+    def __init__(self, store_dir=DEFAULT_STORE_DIR, memory_limit=DEFAULT_MEMORY_LIMIT, max_bytes=DEFAULT_STORE_MAX_BYTES):
+        self.store_dir = store_dir
+        self.memory_limit = memory_limit
+        self.max_bytes = max_bytes
+        self._size = None
+        self._resident = OrderedDict()
+        self._resident_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        os.makedirs(store_dir, exist_ok=True)
+
+    def _path(self, kind, key):
+        return os.path.join(self.store_dir, key[:2], f"{key}.{kind}.z")
+
+    def _remember(self, kind, key, value):
+        size = len(value)
+        with self._lock:
+            if (kind, key) in self._resident:
+                self._resident.move_to_end((kind, key))
+                return
+            # Contents larger than the limit are served from disk every time
+            if size > self.memory_limit:
+                return
+            self._resident[(kind, key)] = value
+            self._resident_bytes += size
+            while self._resident_bytes > self.memory_limit:
+                _, evicted = self._resident.popitem(last=False)
+                self._resident_bytes -= len(evicted)
+
+    def _put(self, kind, key, data):
+        path = self._path(kind, key)
+        if os.path.exists(path):
+            # Touch the entry so eviction treats it as recently used
+            os.utime(path, None)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = zlib.compress(data, COMPRESSION_LEVEL)
+        atomic_write(path, compressed)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in directory_entries(self.store_dir))
+            else:
+                self._size += len(compressed)
+            # Remove least recently used contents until the store is below 90% of its limit
+            if self._size > self.max_bytes:
+                self._size = evict_oldest(self.store_dir, int(self.max_bytes * 0.9))
+
+    def _lookup(self, kind, key):
+        with self._lock:
+            value = self._resident.get((kind, key))
+            if value is not None:
+                self._resident.move_to_end((kind, key))
+                self.hits += 1
+            return value
+
+    def _load(self, kind, key):
+        path = self._path(kind, key)
+        try:
+            with open(path, "rb") as f:
+                data = zlib.decompress(f.read())
+            os.utime(path, None)
+        except (OSError, zlib.error):
+            return None
+        with self._lock:
+            self.loads += 1
+        return data
+
+    def __contains__(self, key):
+        return any(os.path.exists(self._path(kind, key)) for kind in ("text", "bytes"))
+
+    def put_text(self, key, text):
+        self._put("text", key, text.encode("utf-8"))
+
+    # Extracted text for a file hash, or None if it was never stored
+    def get_text(self, key):
+        text = self._lookup("text", key)
+        if text is None:
+            data = self._load("text", key)
+            if data is None:
+                return None
+            text = data.decode("utf-8")
+            self._remember("text", key, text)
+        return text
+
+    def put_bytes(self, key, data):
+        self._put("bytes", key, data)
+
+    # Raw file contents for a file hash, or None if they were never stored
+    def get_bytes(self, key):
+        data = self._lookup("bytes", key)
+        if data is None:
+            data = self._load("bytes", key)
+            if data is not None:
+                self._remember("bytes", key, data)
+        return data
+
+    def stats(self):
+        with self._lock:
+            return {
+                "resident_documents": len(self._resident),
+                "resident_bytes": self._resident_bytes,
+                "memory_limit": self.memory_limit,
+                "hits": self.hits,
+                "loads": self.loads
+            }
+
+# Lookups over a session's documents, kept up to date as documents are added so
+# reruns don't rescan them: filenames and file hashes for de-duplication, and
+# document IDs grouped by type. version changes whenever a document is added.
+class DocumentIndex:
+    def __init__(self, documents=None):
+        self.filenames = set()
+        self.file_hashes = set()
+        self.by_type = {}
+        self.version = 0
+        for doc_id, doc in (documents or {}).items():
+            self.add(doc_id, doc)
+
+    def add(self, doc_id, doc):
+        self.filenames.add(doc.get("filename", ""))
+        self.file_hashes.add(doc.get("file_hash"))
+        self.by_type.setdefault(doc["type"], []).append(doc_id)
+        self.version += 1
+
+    # Whether a file was already processed, by name or by identical contents
+    def contains(self, filename, file_hash):
+        return filename in self.filenames or file_hash in self.file_hashes
+
+    def type_counts(self):
+        return {doc_type: len(doc_ids) for doc_type, doc_ids in self.by_type.items()}
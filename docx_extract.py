@@ -0,0 +1,115 @@
+import os
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+# WordprocessingML namespaces: transitional (what Word writes) and strict
+WORD_NAMESPACES = {
+    "http://schemas.openxmlformats.org/wordprocessingml/2006/main",
+    "http://purl.oclc.org/ooxml/wordprocessingml/main"
+}
+MARKUP_COMPATIBILITY = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+# Content skipped entirely: text boxes (python-docx leaves them out of paragraph
+# text too) and the fallback copies of alternate content
+SKIPPED = {"txbxContent", MARKUP_COMPATIBILITY + "Fallback"}
+# Run children and the text they stand for
+RUN_TEXT = {"tab": "\t", "br": "\n", "cr": "\n", "noBreakHyphen": "-"}
+# Separator between cells when a table row is rendered as a line of text
+CELL_SEPARATOR = " | "
+
+def _name(tag):
+    namespace, _, local = tag[1:].partition("}")
+    return local if namespace in WORD_NAMESPACES else tag
+
+# Page and column breaks end a line in Word but carry no text
+def _is_line_break(elem):
+    return all(value == "textWrapping" for key, value in elem.attrib.items() if _name(key) == "type")
+
+# Yield the body of a .docx in document order, streaming word/document.xml out of
+# the zip: ("paragraph", text) for paragraphs outside tables and ("row", table, cells)
+# for each row of a top-level table, where table counts tables from 0 and cells are
+# the row's cell texts (paragraphs joined by newlines). Nested tables are flattened
+# into their enclosing cell. Elements are discarded as soon as they are read, so
+# memory stays bounded by the largest single row or paragraph.
+def iter_docx_blocks(source):
+    with zipfile.ZipFile(source) as archive, archive.open("word/document.xml") as xml:
+        stack = []
+        paragraphs = []
+        row = None
+        table = -1
+        table_depth = 0
+        skipped = 0
+        # Few distinct tags occur, so their local names are looked up once
+        names = {}
+        for event, elem in iterparse(xml, events=("start", "end")):
+            name = names.get(elem.tag)
+            if name is None:
+                name = names[elem.tag] = _name(elem.tag)
+            if event == "start":
+                stack.append(elem)
+                if name in SKIPPED:
+                    skipped += 1
+                elif skipped:
+                    continue
+                elif name == "p":
+                    paragraphs.append([])
+                elif name == "tbl":
+                    table_depth += 1
+                    if table_depth == 1:
+                        table += 1
+                elif name == "tr" and table_depth == 1:
+                    row = []
+                elif name == "tc" and table_depth == 1:
+                    row.append([])
+                continue
+
+            stack.pop()
+            parent = stack[-1] if stack else None
+            if name in SKIPPED:
+                skipped -= 1
+            elif skipped:
+                pass
+            elif name == "t" and paragraphs:
+                paragraphs[-1].append(elem.text or "")
+            elif name in RUN_TEXT and paragraphs and parent is not None and _name(parent.tag) == "r":
+                if name != "br" or _is_line_break(elem):
+                    paragraphs[-1].append(RUN_TEXT[name])
+            elif name == "p":
+                text = "".join(paragraphs.pop())
+                if paragraphs:
+                    # A paragraph inside another (e.g. in a content control) joins it
+                    paragraphs[-1].append(text)
+                elif table_depth:
+                    row[-1].append(text)
+                else:
+                    yield "paragraph", text
+            elif name == "tr" and table_depth == 1:
+                yield "row", table, ["\n".join(cell).strip() for cell in row]
+                row = None
+            elif name == "tbl":
+                table_depth -= 1
+
+            # Drop the element from the tree once read
+            elem.clear()
+            if parent is not None:
+                parent.remove(elem)
+
+# Extract a .docx from a path or binary stream. Returns (text, tables): text has one
+# line per paragraph and per table row (cells joined by CELL_SEPARATOR), in
+# document order; tables is a list of tables, each a list of rows of cell texts.
+def extract_docx(source):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return extract_docx(f)
+
+    lines = []
+    tables = []
+    for block in iter_docx_blocks(source):
+        if block[0] == "paragraph":
+            lines.append(block[1])
+        else:
+            _, table, cells = block
+            if table == len(tables):
+                tables.append([])
+            tables[table].append(cells)
+            lines.append(CELL_SEPARATOR.join(cell.replace("\n", " ") for cell in cells))
+    return "".join(f"{line}\n" for line in lines), tables
@@ -0,0 +1,1034 @@
+import contextvars
+import io
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from datetime import datetime
+
+import pandas as pd
+
+from doc_cache import get_document_cache, hash_bytes, json_default, make_key
+from document_store import DocumentStore
+from pdf_extract import extract_pdf_pages
+from docx_extract import extract_docx
+from chunked_extract import extract_chunked
+from context_packer import CONTEXT_TOKENS, cached_text, pack_documents
+from near_duplicates import NearDuplicateIndex, copy_features, facts_agree
+from tieout import normalize_classes, resolve_columns, tie_out
+from verification import CATEGORY_CLASS_PATTERNS, CATEGORY_DOCUMENT_TYPES, CHECKLIST, VERIFICATION_CATEGORIES, VERIFICATION_TOOL_NAME, class_category, completed_categories, validate_verification, verification_tool
+from classifier import classify
+from cap_table_io import numeric_column, read_cap_table
+from cap_columns import CONFIDENCE_THRESHOLD as COLUMN_MAPPING_CONFIDENCE, header_signature, infer_column_mapping, mapping_fits
+from llm import get_client
+from instrumentation import record_llm_timing, stage
+
+# Errors and warnings are logged; the Streamlit UI shows them in the page and the CLI on stderr
+logger = logging.getLogger(__name__)
+
+# Model used for all Claude calls
+MODEL = "claude-3-5-sonnet-20240620"
+
+# Versions of the text extractor, categorizer and extraction prompt. Bump these
+# when their output changes so stale cache entries are no longer used.
+TEXT_EXTRACTOR_VERSION = "3"
+CATEGORIZER_VERSION = "2"
+EXTRACTION_PROMPT_VERSION = "2"
+VERIFICATION_PROMPT_VERSION = "7"
+
+# "Other" documents classified with at least this confidence have nothing relevant
+# to the cap table, so no extraction call is made for them
+SKIP_EXTRACTION_CONFIDENCE = 0.9
+
+# Ingestion concurrency limits
+PARSE_WORKERS = min(8, os.cpu_count() or 1)
+MAX_CONCURRENT_EXTRACTIONS = 4
+
+# Extract text from document files
+@stage("extract_text", profile=True)
+def extract_text(file):
+    file_extension = os.path.splitext(file.name)[1].lower()
+    
+    if file_extension == '.pdf':
+        try:
+            text, _ = extract_pdf_pages(file)
+            return text
+        except Exception as e:
+            logger.error(f"Error extracting text from {file.name}: {str(e)}")
+            return ""
+    
+    elif file_extension == '.docx':
+        try:
+            text, _ = extract_docx(io.BytesIO(file.getvalue()))
+            return text
+        except Exception as e:
+            logger.error(f"Error extracting text from {file.name}: {str(e)}")
+            return ""
+    
+    elif file_extension == '.txt':
+        try:
+            return file.getvalue().decode('utf-8')
+        except Exception as e:
+            logger.error(f"Error extracting text from {file.name}: {str(e)}")
+            return ""
+    
+    elif file_extension in ['.xlsx', '.xls', '.csv']:
+        # For spreadsheets, return the file itself
+        return file
+    
+    else:
+        logger.warning(f"Unsupported file type: {file_extension}")
+        return ""
+
+# Extract text along with the starting character offset of each page (PDFs) and the
+# rows of each table (Word documents). Returns (text, page_offsets, tables).
+@stage("extract_text", profile=True)
+def extract_text_with_structure(file):
+    file_extension = os.path.splitext(file.name)[1].lower()
+    if file_extension == '.pdf':
+        try:
+            text, page_offsets = extract_pdf_pages(file)
+            return text, page_offsets, None
+        except Exception as e:
+            logger.error(f"Error extracting text from {file.name}: {str(e)}")
+            return "", None, None
+    if file_extension == '.docx':
+        try:
+            text, tables = extract_docx(io.BytesIO(file.getvalue()))
+            return text, None, tables or None
+        except Exception as e:
+            logger.error(f"Error extracting text from {file.name}: {str(e)}")
+            return "", None, None
+    return extract_text(file), None, None
+
+# Categorize a document and return (category, confidence)
+@stage("categorize_document", profile=True)
+def categorize_document_with_confidence(text, filename):
+    if not isinstance(text, str):
+        # This is likely a spreadsheet file
+        if "cap" in filename.lower() or "table" in filename.lower():
+            return "Cap Table", 1.0
+        else:
+            return "Spreadsheet", 1.0
+    
+    # Weighted keyword scoring over the leading pages
+    return classify(text)
+
+# Categorize documents
+def categorize_document(text, filename):
+    return categorize_document_with_confidence(text, filename)[0]
+
+# Send one extraction request for a piece of a document and parse the JSON reply
+def request_document_info(client, text, document_type, description):
+    prompt = f"""
+        Extract key information from this {document_type} document related to cap table verification.
+        {description}
+        
+        {text}
+        
+        Extract information like:
+        - Document date
+        - Share quantities 
+        - Share classes
+        - Prices/valuations
+        - Stakeholder names
+        - Approval information
+        - Any other relevant data for cap table verification
+        
+        Only include information stated in the text above.
+        Format your response as JSON with appropriate keys based on the document type.
+        """
+    
+    response = client.create(
+        model=MODEL,
+        max_tokens=800,
+        temperature=0,
+        system="You are an AI assistant that extracts structured information from legal documents related to cap tables. Always respond in valid JSON format.",
+        messages=[{"role": "user", "content": prompt}]
+    )
+    
+    # Extract JSON from the response
+    json_text = response.content[0].text
+    # Clean up any markdown formatting
+    json_text = re.sub(r'```json', '', json_text)
+    json_text = re.sub(r'```', '', json_text)
+    
+    return json.loads(json_text.strip())
+
+# Extract key info from documents using Claude. In chunked mode the whole document
+# is split along section boundaries, chunks are extracted in parallel and merged
+# into one record with "_provenance" back to chunk and page. Otherwise only the
+# first 3000 characters are sent.
+@stage("extract_document_info")
+def extract_document_info(text, document_type, api_key, page_offsets=None, chunked=True):
+    if document_type == "Cap Table" or not isinstance(text, str):
+        return {"message": "Cap Table will be processed separately"}
+    
+    try:
+        client = get_client(api_key)
+        
+        if not chunked:
+            return request_document_info(client, text[:3000], document_type, "Here are the first 3000 characters of the document:")
+        
+        def extract_chunk(chunk, index, count, source):
+            if count == 1:
+                description = "Here is the full document:"
+            else:
+                pages = f" (pages {source['pages'][0]}-{source['pages'][1]})" if "pages" in source else ""
+                description = f"Here is part {index + 1} of {count} of the document{pages}:"
+            return request_document_info(client, chunk, document_type, description)
+        
+        result = extract_chunked(text, extract_chunk, page_offsets)
+        if "error" in result:
+            logger.error(f"Error extracting information: {result['error']}")
+        return result
+    
+    except Exception as e:
+        logger.error(f"Error extracting information: {str(e)}")
+        return {"error": str(e)}
+
+# Extract text, page offsets and tables, reusing the cached result for identical file contents
+def extract_text_cached(file, file_hash, cache):
+    file_extension = os.path.splitext(file.name)[1].lower()
+    if file_extension in ['.xlsx', '.xls', '.csv']:
+        return extract_text(file), None, None
+    
+    key = make_key(file_hash, file_extension, TEXT_EXTRACTOR_VERSION)
+    cached = cache.get("text", key)
+    if cached is not None:
+        return cached["text"], cached["page_offsets"], cached["tables"]
+    
+    text, page_offsets, tables = extract_text_with_structure(file)
+    # Empty text usually means extraction failed, so don't pin it in the cache
+    if text:
+        cache.put("text", key, {"text": text, "page_offsets": page_offsets, "tables": tables})
+    return text, page_offsets, tables
+
+# Categorize a document, reusing the cached category for identical file contents.
+# Returns (category, confidence).
+def categorize_document_cached(content, filename, file_hash, cache):
+    if not isinstance(content, str):
+        return categorize_document_with_confidence(content, filename)
+    
+    key = make_key(file_hash, CATEGORIZER_VERSION)
+    cached = cache.get("category", key)
+    if cached is not None:
+        return cached["category"], cached["confidence"]
+    
+    category, confidence = categorize_document_with_confidence(content, filename)
+    cache.put("category", key, {"category": category, "confidence": confidence})
+    return category, confidence
+
+# Extract document info, keyed by file contents, model, prompt version and document type
+def extract_document_info_cached(text, document_type, api_key, file_hash, cache, page_offsets=None):
+    key = make_key(file_hash, MODEL, EXTRACTION_PROMPT_VERSION, document_type)
+    info = cache.get("info", key)
+    if info is None:
+        info = extract_document_info(text, document_type, api_key, page_offsets)
+        # Failed calls are retried next time rather than cached
+        if isinstance(info, dict) and "error" not in info and "_failed_chunks" not in info:
+            cache.put("info", key, info)
+    return info
+
+# Whether a parsed document should go through extract_document_info
+def needs_extraction(content, category, confidence):
+    if category == "Cap Table" or not isinstance(content, str):
+        return False
+    return not (category == "Other" and confidence >= SKIP_EXTRACTION_CONFIDENCE)
+
+# Parse and categorize a single uploaded file. Text documents also get the MinHash
+# signature and fact tokens used to find near-duplicates. A PDF, Word or text file
+# with no extractable text is an error rather than an empty document.
+def parse_document(file, cache):
+    file_hash = hash_bytes(file.getvalue())
+    extracted_content, page_offsets, tables = extract_text_cached(file, file_hash, cache)
+    if extracted_content is None:
+        return None, None, None, file_hash, None, None, None
+    if extracted_content == "" and os.path.splitext(file.name)[1].lower() in TEXT_EXTENSIONS:
+        raise ValueError("No text could be extracted")
+    category, confidence = categorize_document_cached(extracted_content, file.name, file_hash, cache)
+    features = copy_features(file.name, extracted_content) if isinstance(extracted_content, str) else None
+    return extracted_content, category, confidence, file_hash, page_offsets, tables, features
+
+# Process uploaded files concurrently: files are parsed in a worker pool and
+# extraction calls run in a separate pool capped at max_extractions in flight.
+# Near-duplicates in the batch (drafts, re-exports and executed copies of one
+# document, with the same category and no conflicting facts) are extracted once: the
+# copy that looks most like the executed version is extracted and the others reuse
+# its info, with duplicate_of set to its file hash. Uploads are also matched against
+# earlier canonical copies (see earlier_copies); an upload that replaces one lists
+# its file hash under replaces. on_replaced(file, result) is called for a completed
+# result whose duplicate_of changed because its canonical copy was replaced.
+# Results come back in upload order as dicts with content, category,
+# category_confidence, info, file_hash, page_offsets, tables, features, duplicate_of,
+# replaces and error.
+# Workers run in a copy of the caller's context, so context variables (open stages,
+# the running job) carry over to them.
+def process_documents(files, api_key, on_progress=None, parse_workers=PARSE_WORKERS, max_extractions=MAX_CONCURRENT_EXTRACTIONS, earlier=(), on_replaced=None):
+    results = [{"content": None, "category": None, "category_confidence": None, "info": None, "file_hash": None, "page_offsets": None, "tables": None, "features": None, "duplicate_of": None, "replaces": [], "error": None} for _ in files]
+    if not files:
+        return results
+    cache = get_document_cache()
+    
+    # Canonical copies are indexed, earlier ones numbered after the uploads. Followers
+    # wait for their canonical copy's info; members are all copies reusing it.
+    copies = results + [dict(copy, duplicate_of=None) for copy in earlier]
+    near_duplicates = NearDuplicateIndex()
+    features = {}
+    for i in range(len(files), len(copies)):
+        features[i] = copies[i]["features"]
+        near_duplicates.add(i, features[i]["signature"])
+    replaced_by = {}
+    followers = {}
+    members = {}
+    done_indexes = set(range(len(files), len(copies)))
+    completed = 0
+    
+    with ThreadPoolExecutor(max_workers=parse_workers) as parse_pool, \
+         ThreadPoolExecutor(max_workers=max_extractions) as extract_pool:
+        pending = {parse_pool.submit(contextvars.copy_context().run, parse_document, file, cache): ("parse", i) for i, file in enumerate(files)}
+        
+        def extract(i):
+            result = results[i]
+            pending[extract_pool.submit(contextvars.copy_context().run, extract_document_info_cached, result["content"], result["category"], api_key, result["file_hash"], cache, result["page_offsets"])] = ("extract", i)
+        
+        def complete(i):
+            nonlocal completed
+            done_indexes.add(i)
+            completed += 1
+            if on_progress:
+                on_progress(completed, len(files), files[i], results[i])
+            if results[i]["error"]:
+                members.pop(i, None)
+            for follower in followers.pop(i, []):
+                if results[i]["error"]:
+                    # The canonical copy failed, so its near-duplicates are extracted themselves
+                    results[follower]["duplicate_of"] = None
+                    extract(follower)
+                else:
+                    results[follower]["info"] = results[i]["info"]
+                    complete(follower)
+        
+        # The canonical copy of i's cluster, or None. A copy that looks more like the
+        # executed version than the current canonical one replaces it and is extracted.
+        def canonical_for(i):
+            result = results[i]
+            tokens = Counter(features[i]["facts"])
+            for match, _ in near_duplicates.query(features[i]["signature"]):
+                while match in replaced_by:
+                    match = replaced_by[match]
+                if copies[match]["category"] != result["category"] or not facts_agree(tokens, Counter(features[match]["facts"])):
+                    continue
+                if features[i]["execution_score"] > features[match]["execution_score"]:
+                    replaced_by[match] = i
+                    if match >= len(files):
+                        result["replaces"].append(copies[match]["file_hash"])
+                    followers[i] = followers.pop(match, [])
+                    members[i] = members.pop(match, []) + [match]
+                    for member in members[i]:
+                        copies[member]["duplicate_of"] = result["file_hash"]
+                        # Completed copies were already reported with the old canonical copy
+                        if member < len(files) and member in done_indexes and on_replaced:
+                            on_replaced(files[member], results[member])
+                    return None
+                return match
+            return None
+        
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, i = pending.pop(future)
+                result = results[i]
+                finished = True
+                try:
+                    if stage == "parse":
+                        result["content"], result["category"], result["category_confidence"], result["file_hash"], result["page_offsets"], result["tables"], result["features"] = future.result()
+                        if needs_extraction(result["content"], result["category"], result["category_confidence"]):
+                            canonical = None
+                            if result["features"] is not None:
+                                features[i] = result["features"]
+                                canonical = canonical_for(i)
+                            if canonical is None:
+                                if i in features:
+                                    near_duplicates.add(i, features[i]["signature"])
+                                extract(i)
+                            else:
+                                result["duplicate_of"] = copies[canonical]["file_hash"]
+                                members.setdefault(canonical, []).append(i)
+                                if canonical in done_indexes:
+                                    result["info"] = copies[canonical]["info"]
+                                else:
+                                    followers.setdefault(canonical, []).append(i)
+                            finished = canonical is not None and canonical in done_indexes
+                    else:
+                        result["info"] = future.result()
+                except Exception as e:
+                    result["error"] = str(e)
+                
+                if finished or result["error"]:
+                    complete(i)
+    
+    return results
+
+# Canonical documents with near-duplicate features, shaped like process_documents
+# results, so new uploads can be matched against documents added before
+def earlier_copies(documents):
+    return [
+        {"category": doc["type"], "info": doc["info"], "file_hash": doc["file_hash"], "features": doc["features"]}
+        for doc in documents.values() if doc.get("features") and doc.get("info") and not doc.get("duplicate_of")
+    ]
+
+# Add processed files to a documents dict, in upload order. Files that failed are skipped.
+# Contents are written to the document store; entries keep metadata, info and the
+# rows of any tables (which the tie-out reads alongside info). Near-duplicates get
+# duplicate_of, the ID of the document whose info they reuse; earlier documents an
+# upload replaced as canonical copy, and their near-duplicates, get it too.
+# New entries are also added to index (a DocumentIndex) when one is given.
+def add_processed_documents(documents, files, results, store, index=None):
+    # Canonical copies may come later in the upload or be documents added earlier
+    doc_ids_by_hash = {doc["file_hash"]: doc_id for doc_id, doc in documents.items() if doc.get("file_hash")}
+    added = []
+    for file, result in zip(files, results):
+        if result["error"] or result["content"] is None:
+            continue
+        
+        # Generate unique ID
+        doc_id = f"{result['category']}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{len(documents)}"
+        
+        # Full contents go to the document store; the entry keeps metadata and info
+        if isinstance(result["content"], str):
+            store.put_text(result["file_hash"], result["content"])
+            content_kind = "text"
+        else:
+            store.put_bytes(result["file_hash"], file.getvalue())
+            content_kind = "file"
+        
+        # Store document
+        documents[doc_id] = {
+            "filename": file.name,
+            "type": result["category"],
+            "category_confidence": result["category_confidence"],
+            "content_kind": content_kind,
+            "info": result["info"],
+            "file_hash": result["file_hash"],
+            "page_offsets": result["page_offsets"],
+            "tables": result["tables"],
+            "features": result.get("features"),
+            "duplicate_of": None
+        }
+        doc_ids_by_hash.setdefault(result["file_hash"], doc_id)
+        added.append((doc_id, result["duplicate_of"], result.get("replaces") or []))
+    
+    for doc_id, duplicate_of, _ in added:
+        documents[doc_id]["duplicate_of"] = doc_ids_by_hash.get(duplicate_of)
+    for doc_id, _, replaces in added:
+        for file_hash in replaces:
+            replaced = doc_ids_by_hash.get(file_hash)
+            if replaced not in (None, doc_id):
+                documents[replaced]["duplicate_of"] = doc_id
+    # Copies that followed a canonical copy which was later replaced point at the
+    # final canonical copy, so no near-duplicate is listed only under another one
+    replaced_any = any(replaces for _, _, replaces in added)
+    for doc_id in list(documents) if replaced_any else [doc_id for doc_id, _, _ in added]:
+        canonical = documents[doc_id]["duplicate_of"]
+        seen = {doc_id}
+        while canonical is not None and documents[canonical].get("duplicate_of") and canonical not in seen:
+            seen.add(canonical)
+            canonical = documents[canonical]["duplicate_of"]
+        documents[doc_id]["duplicate_of"] = canonical
+    if index is not None:
+        for doc_id, _, _ in added:
+            index.add(doc_id, documents[doc_id])
+    return documents
+
+# Load a document's full contents from the store: extracted text, or the original
+# file for spreadsheets. Returns None if the contents are no longer on disk.
+def load_document_content(doc, store):
+    if doc.get("content_kind") == "file":
+        data = store.get_bytes(doc["file_hash"])
+        return None if data is None else NamedBytesIO(data, doc["filename"])
+    return store.get_text(doc["file_hash"])
+
+# Ask Claude which columns hold each cap table field
+def request_column_mapping(df, api_key):
+    client = get_client(api_key)
+    
+    # Convert the first few rows to string for analysis
+    table_preview = df.head(10).to_string()
+    
+    prompt = f"""
+        Analyze this cap table and identify the key columns:
+        
+        {table_preview}
+        
+        Identify which columns represent:
+        1. Stakeholder/shareholder names
+        2. Share class (common, preferred, etc.)
+        3. Number of shares
+        4. Percentage ownership
+        5. Issue date or grant date
+        6. Price per share
+        
+        Respond in JSON format with the keys "stakeholder", "share_class", "shares", "percentage", "date" and "price",
+        and column names as values (null if the cap table has no such column).
+        """
+    
+    response = client.create(
+        model=MODEL,
+        max_tokens=500,
+        temperature=0,
+        system="You are an AI assistant that analyzes cap table structures. Respond in valid JSON format.",
+        messages=[{"role": "user", "content": prompt}]
+    )
+    
+    # Extract column mapping from response
+    json_text = response.content[0].text
+    json_text = re.sub(r'```json', '', json_text)
+    json_text = re.sub(r'```', '', json_text)
+    
+    return json.loads(json_text.strip())
+
+# Parse cap table file
+@stage("parse_cap_table")
+def parse_cap_table(file, api_key):
+    try:
+        # Read the file based on extension. Large workbooks are streamed, CSVs are read
+        # in chunks, and the compact table is cached as Parquet by file contents.
+        file_extension = os.path.splitext(file.name)[1].lower()
+        if file_extension not in ['.xlsx', '.xls', '.csv']:
+            logger.error("Unsupported cap table format. Please upload an Excel or CSV file.")
+            return None
+        
+        cache = get_document_cache()
+        file_hash = hash_bytes(file.getvalue())
+        df = read_cap_table(file, file_hash, cache)
+        
+        # Map columns from the cached mapping for this header row, then local
+        # inference, and only ask Claude when the inference is not confident
+        signature = header_signature(df.columns)
+        column_mapping = cache.get("column_mapping", signature)
+        if not mapping_fits(column_mapping, df):
+            column_mapping, confidence = infer_column_mapping(df)
+            mapped = confidence >= COLUMN_MAPPING_CONFIDENCE
+            if not mapped:
+                requested = request_column_mapping(df, api_key)
+                mapped = mapping_fits(requested, df)
+                # A malformed reply falls back to the local inference and isn't cached
+                if mapped:
+                    column_mapping = requested
+                else:
+                    logger.warning(f"Ignoring invalid column mapping from Claude: {requested}")
+            if mapped:
+                cache.put("column_mapping", signature, column_mapping)
+        
+        # Create summary statistics
+        total_rows = len(df)
+        share_classes = []
+        total_shares = 0
+        
+        # Get share classes if available
+        if "share_class" in column_mapping and column_mapping["share_class"] in df.columns:
+            share_classes = df[column_mapping["share_class"]].dropna().unique().tolist()
+        
+        # Get total shares if available
+        if "shares" in column_mapping and column_mapping["shares"] in df.columns:
+            # Convert to numeric; text such as "1,000" is parsed, anything else is NaN
+            df[column_mapping["shares"]] = numeric_column(df[column_mapping["shares"]])
+            total_shares = df[column_mapping["shares"]].sum()
+        
+        # Create structured cap table data
+        cap_table_data = {
+            "raw_data": df,
+            "file_hash": file_hash,
+            "column_mapping": column_mapping,
+            "summary": {
+                "total_rows": total_rows,
+                "total_shares": total_shares,
+                "share_classes": share_classes
+            }
+        }
+        
+        return cap_table_data
+    
+    except Exception as e:
+        logger.error(f"Error parsing cap table: {str(e)}")
+        return None
+
+# Follow-up requests allowed when the verification result does not match the schema
+MAX_VERIFICATION_REPAIRS = 2
+
+# System prompt for verifying the given categories: their due diligence checklist
+# items. It is too short to cache on its own and is cached as part of the prefix
+# ending at the supporting documents.
+def verification_system(categories=VERIFICATION_CATEGORIES):
+    return (
+        "You are an AI assistant that verifies cap tables against supporting documentation.\n\n"
+        "DUE DILIGENCE CHECKLIST FOR CAP TABLE TIE-OUT:\n\n"
+        + "\n\n".join(f"{category}: {CHECKLIST[category]}" for category in categories)
+    )
+
+# Request verification results as one streamed, structured tool call. Invalid
+# results are sent back with the validation errors so Claude can correct them.
+# on_category(category, result) is called as each checklist category arrives.
+# prompt is a string or a list of content blocks. Token usage of every attempt,
+# including prompt cache writes and reads, is added to the usage dict if given.
+def request_verification(client, prompt, on_category=None, categories=VERIFICATION_CATEGORIES, usage=None):
+    messages = [{"role": "user", "content": prompt}]
+    reported = set()
+    for attempt in range(MAX_VERIFICATION_REPAIRS + 1):
+        started = time.perf_counter()
+        first_token_at = None
+        with client.stream(
+            model=MODEL,
+            max_tokens=2500,
+            temperature=0,
+            system=verification_system(categories),
+            tools=[verification_tool(categories)],
+            tool_choice={"type": "tool", "name": VERIFICATION_TOOL_NAME},
+            messages=messages
+        ) as stream:
+            for event in stream:
+                if event.type in ("text", "input_json") and first_token_at is None:
+                    first_token_at = time.perf_counter()
+                # Hand each checklist category to the caller as soon as it is complete
+                if event.type == "input_json" and on_category:
+                    for category, result in completed_categories(event.snapshot):
+                        if category not in reported:
+                            reported.add(category)
+                            on_category(category, result)
+            response = stream.get_final_message()
+        record_llm_timing("verify_cap_table", started, first_token_at, time.perf_counter())
+        if usage is not None:
+            for key in ["input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens"]:
+                usage[key] = usage.get(key, 0) + (getattr(response.usage, key, 0) or 0)
+        
+        tool_use = next((block for block in response.content if block.type == "tool_use"), None)
+        if tool_use is None:
+            errors = [f"No {VERIFICATION_TOOL_NAME} tool call in the response"]
+            repair = {"role": "user", "content": f"Record the verification results with the {VERIFICATION_TOOL_NAME} tool."}
+        else:
+            errors = validate_verification(tool_use.input, categories)
+            if not errors:
+                if on_category:
+                    for category, result in tool_use.input["verification_results"].items():
+                        if category not in reported:
+                            on_category(category, result)
+                return tool_use.input
+            repair = {"role": "user", "content": [{
+                "type": "tool_result",
+                "tool_use_id": tool_use.id,
+                "is_error": True,
+                "content": "The verification result does not match the schema:\n" + "\n".join(f"- {error}" for error in errors) + "\nCall the tool again with a corrected result."
+            }]}
+        
+        messages = messages + [{"role": "assistant", "content": response.content}, repair]
+    
+    raise ValueError(f"Verification result did not match the schema: {'; '.join(errors)}")
+
+# Tie-out discrepancies passed to the LLM as context, per category
+PROMPT_TIE_OUT_DISCREPANCIES = 25
+# Cap table rows shown to the LLM as a sample, per category
+PROMPT_SAMPLE_ROWS = 10
+# Checklist categories verified at the same time
+MAX_CONCURRENT_VERIFICATIONS = len(VERIFICATION_CATEGORIES)
+
+# Cap table rows each checklist category covers, as boolean masks selected by share
+# class. None means the category depends on every row.
+def category_rows(cap_table):
+    df = cap_table["raw_data"]
+    columns = resolve_columns(cap_table["column_mapping"], df)
+    rows_by_category = dict.fromkeys(VERIFICATION_CATEGORIES)
+    if "share_class" in columns:
+        classes = normalize_classes(df[columns["share_class"]]).fillna("")
+        for category, pattern in CATEGORY_CLASS_PATTERNS.items():
+            rows_by_category[category] = classes.str.contains(pattern, regex=True).to_numpy(dtype=bool)
+        rows_by_category["share_issuances"] = ~classes.str.contains("|".join(CATEGORY_CLASS_PATTERNS.values()), regex=True).to_numpy(dtype=bool)
+    return rows_by_category
+
+# Fingerprint of the inputs each checklist category depends on: its cap table rows
+# and the documents of the types in CATEGORY_DOCUMENT_TYPES
+def verification_fingerprints(cap_table, documents):
+    df = cap_table["raw_data"]
+    columns = resolve_columns(cap_table["column_mapping"], df)
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    rows_by_category = category_rows(cap_table)
+    
+    fingerprints = {}
+    for category in VERIFICATION_CATEGORIES:
+        rows = rows_by_category[category]
+        rows_key = hash_bytes((row_hashes if rows is None else row_hashes[rows]).tobytes())
+        document_keys = sorted(
+            (doc.get("file_hash") or doc_id, doc["type"], make_key(doc.get("info"), doc.get("tables")))
+            for doc_id, doc in documents.items() if doc["type"] in CATEGORY_DOCUMENT_TYPES[category]
+        )
+        fingerprints[category] = make_key(category, MODEL, VERIFICATION_PROMPT_VERSION, columns, rows_key, document_keys)
+    return fingerprints
+
+# Categories whose inputs changed since the previous verification results
+def stale_verification_categories(cap_table, documents, previous):
+    fingerprints = verification_fingerprints(cap_table, documents)
+    cached = (previous or {}).get("categories", {})
+    return [category for category in VERIFICATION_CATEGORIES if cached.get(category, {}).get("fingerprint") != fingerprints[category]]
+
+# Prompt for one checklist category: facts from the document types it depends on,
+# a sample of its cap table rows and the tie-out cases in its share classes. Returns
+# the prompt's content blocks and the packing statistics.
+def verification_prompt(category, cap_table, documents, tie_out_results, rows=None):
+    # Tie-out cases are routed by share class; authorized shares only needs the totals
+    discrepancies = [case for case in tie_out_results["discrepancies"] if category != "authorized_shares" and class_category(case.get("share_class")) == category]
+    ambiguous = [case for case in tie_out_results["ambiguous"] if category != "authorized_shares" and class_category(case.get("share_class")) == category]
+    
+    # Pack facts from the documents the category depends on into the token budget,
+    # starting with documents the tie-out needs judged
+    flagged = [doc_id for case in discrepancies + ambiguous for doc_id in (case.get("documents") if isinstance(case.get("documents"), list) else [])]
+    packed_documents, context = pack_documents(documents, dict.fromkeys(CATEGORY_DOCUMENT_TYPES[category], 1), CONTEXT_TOKENS, flagged)
+    if context["dropped_documents"]:
+        logger.warning(f"Verification context for {category}: {context['dropped_documents']} of {context['documents']} documents did not fit the {CONTEXT_TOKENS:,} token budget")
+    omitted = f" {context['dropped_documents']} lower-priority documents were omitted to fit the context." if context["dropped_documents"] else ""
+    
+    df = cap_table["raw_data"]
+    cap_sample = (df if rows is None else df[rows]).head(PROMPT_SAMPLE_ROWS).to_string()
+    
+    # The documents come first and end the cacheable prefix (tools, system prompt and
+    # documents), so schema repairs and re-runs over the same documents reuse it
+    prompt = [cached_text(f"Supporting documents, one JSON object per line:{omitted}\n{packed_documents}"), {"type": "text", "text": f"""
+        Verify this cap table against the supporting documents above for the {category} checklist category.
+        
+        Cap table summary:
+        {json.dumps(cap_table["summary"], separators=(",", ":"), default=str)}
+        
+        Column mapping:
+        {json.dumps(cap_table["column_mapping"], separators=(",", ":"))}
+        
+        Sample cap table data for this category:
+        {cap_sample}
+        
+        Deterministic tie-out of all cap table rows against facts extracted from the documents:
+        {json.dumps(tie_out_results["summary"], default=str)}
+        
+        Discrepancies already found by the tie-out (do not repeat these):
+        {json.dumps(discrepancies[:PROMPT_TIE_OUT_DISCREPANCIES], default=str)}
+        
+        Ambiguous cases the tie-out could not resolve (likely the same stakeholder under different names),
+        each with the closest names on the other side as candidates and their similarity scores.
+        Decide whether each is a match or a real discrepancy:
+        {json.dumps(ambiguous, default=str)}
+        
+        Record the verification result and recommendations for {category}, and any discrepancies found,
+        with the record_verification tool.
+        """}]
+    return prompt, context
+
+# Perform cap table tie-out verification. Every row is reconciled against document
+# facts locally; Claude reviews the results and resolves the ambiguous residue.
+# Results are kept per checklist category under "categories" with the fingerprint
+# of their inputs. Given previous results, only categories whose cap table rows or
+# documents changed are sent to Claude, one concurrent request per category; the rest
+# are reused. A category whose request fails is listed under "failed" and is verified
+# again next time without redoing the others. "context" reports the document facts
+# packed into the prompts, those dropped to fit CONTEXT_TOKENS, and the prompt tokens
+# written to and read from the API's prompt cache.
+@stage("verify_cap_table")
+def verify_cap_table(cap_table, documents, api_key, on_category=None, previous=None):
+    try:
+        fingerprints = verification_fingerprints(cap_table, documents)
+        cached = (previous or {}).get("categories", {})
+        categories = {
+            category: cached[category]
+            for category in VERIFICATION_CATEGORIES
+            if cached.get(category, {}).get("fingerprint") == fingerprints[category]
+        }
+        stale = [category for category in VERIFICATION_CATEGORIES if category not in categories]
+        if on_category:
+            for category, entry in categories.items():
+                on_category(category, entry["result"])
+        
+        # Reconcile the full cap table against document facts
+        tie_out_results = tie_out(cap_table, documents)
+        
+        context = None
+        failed = {}
+        if stale:
+            client = get_client(api_key)
+            rows_by_category = category_rows(cap_table)
+            
+            # Each stale category is an independent request with its own documents.
+            # Results are reported as they finish, in this thread.
+            contexts = {}
+            usage = {category: {} for category in stale}
+            with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_VERIFICATIONS, len(stale))) as executor:
+                futures = {}
+                for category in stale:
+                    prompt, contexts[category] = verification_prompt(category, cap_table, documents, tie_out_results, rows_by_category[category])
+                    future = executor.submit(contextvars.copy_context().run, request_verification, client, prompt, None, [category], usage[category])
+                    futures[future] = category
+                
+                for future in as_completed(futures):
+                    category = futures[future]
+                    try:
+                        response = future.result()
+                    except Exception as e:
+                        logger.error(f"Error verifying {category}: {str(e)}")
+                        failed[category] = str(e)
+                        # No fingerprint, so the category is verified again next time
+                        categories[category] = {
+                            "fingerprint": None,
+                            "result": {"verified": False, "notes": f"Verification failed: {str(e)}", "recommendations": []},
+                            "discrepancies": []
+                        }
+                    else:
+                        categories[category] = {
+                            "fingerprint": fingerprints[category],
+                            "result": response["verification_results"][category],
+                            "discrepancies": [discrepancy for discrepancy in response["discrepancies"] if discrepancy["category"] == category]
+                        }
+                    if on_category:
+                        on_category(category, categories[category]["result"])
+            
+            if len(failed) == len(VERIFICATION_CATEGORIES):
+                raise ValueError("every checklist category failed")
+            
+            # Totals over the category requests; a document several categories depend
+            # on is counted once per category
+            for category in stale:
+                contexts[category].update(
+                    input_tokens=usage[category].get("input_tokens", 0),
+                    cache_write_tokens=usage[category].get("cache_creation_input_tokens", 0),
+                    cache_read_tokens=usage[category].get("cache_read_input_tokens", 0)
+                )
+            context = {
+                key: sum(contexts[category][key] for category in stale)
+                for key in ["documents", "packed_documents", "dropped_documents", "packed_tokens", "dropped_tokens", "input_tokens", "cache_write_tokens", "cache_read_tokens"]
+            }
+            context["budget"] = CONTEXT_TOKENS
+            context["categories"] = contexts
+        
+        # Tie-out findings come first, followed by anything the LLM added
+        return {
+            "verification_results": {category: categories[category]["result"] for category in VERIFICATION_CATEGORIES},
+            "discrepancies": tie_out_results["discrepancies"] + [discrepancy for category in VERIFICATION_CATEGORIES for discrepancy in categories[category]["discrepancies"]],
+            "recommendations": list(dict.fromkeys(
+                recommendation for category in VERIFICATION_CATEGORIES for recommendation in categories[category]["result"].get("recommendations", [])
+            )),
+            "tie_out": tie_out_results["summary"],
+            "categories": categories,
+            "recomputed": stale,
+            "failed": list(failed),
+            "context": context
+        }
+    
+    except Exception as e:
+        logger.error(f"Error verifying cap table: {str(e)}")
+        return None
+
+# Generate remediation plan, streaming it. on_text receives the plan so far after each chunk.
+@stage("generate_remediation")
+def generate_remediation(verification_results, api_key, on_text=None):
+    try:
+        client = get_client(api_key)
+        
+        prompt = f"""
+        Create a remediation plan for the following cap table verification results:
+        
+        {json.dumps({key: value for key, value in verification_results.items() if key not in ("categories", "recomputed", "failed", "context")}, indent=2, default=str)}
+        
+        The remediation plan should:
+        1. Prioritize issues by severity
+        2. Provide specific action steps for each discrepancy
+        3. Include recommendations for documentation fixes
+        4. Suggest timeline for implementation
+        
+        Be specific and practical with your recommendations.
+        """
+        
+        started = time.perf_counter()
+        first_token_at = None
+        remediation_plan = ""
+        with client.stream(
+            model=MODEL,
+            max_tokens=1500,
+            temperature=0,
+            system="You are an AI assistant that creates remediation plans for cap table discrepancies.",
+            messages=[{"role": "user", "content": prompt}]
+        ) as stream:
+            for text in stream.text_stream:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                remediation_plan += text
+                if on_text:
+                    on_text(remediation_plan)
+        record_llm_timing("generate_remediation", started, first_token_at, time.perf_counter())
+        
+        return remediation_plan
+    
+    except Exception as e:
+        logger.error(f"Error generating remediation plan: {str(e)}")
+        return None
+
+# File types picked up from a deal directory
+SPREADSHEET_EXTENSIONS = ['.xlsx', '.xls', '.csv']
+TEXT_EXTENSIONS = ['.pdf', '.docx', '.txt']
+SUPPORTED_EXTENSIONS = TEXT_EXTENSIONS + SPREADSHEET_EXTENSIONS
+
+# In-memory file with a name, standing in for Streamlit's UploadedFile
+class NamedBytesIO(io.BytesIO):
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+def load_file(path):
+    with open(path, "rb") as f:
+        return NamedBytesIO(f.read(), os.path.basename(path))
+
+# Find the cap table and supporting documents in a deal directory. The cap table is
+# the first spreadsheet (by path) whose name mentions "cap" or "table".
+def find_deal_files(deal_dir):
+    paths = []
+    for root, _, filenames in os.walk(deal_dir):
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() in SUPPORTED_EXTENSIONS and not filename.startswith("."):
+                paths.append(os.path.join(root, filename))
+    paths.sort()
+    
+    cap_table_path = None
+    for path in paths:
+        name = os.path.basename(path).lower()
+        if os.path.splitext(name)[1] in SPREADSHEET_EXTENSIONS and ("cap" in name or "table" in name):
+            cap_table_path = path
+            break
+    return cap_table_path, [path for path in paths if path != cap_table_path]
+
+# Run the full pipeline over one deal directory and return a JSON-serializable report
+def run_deal(deal_dir, api_key, remediation=True, on_progress=None):
+    deal_dir = os.path.abspath(deal_dir)
+    report = {
+        "deal": os.path.basename(deal_dir.rstrip(os.sep)),
+        "directory": deal_dir,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "cap_table": None,
+        "documents": [],
+        "verification": None,
+        "remediation": None,
+        "errors": []
+    }
+    
+    cap_table_path, document_paths = find_deal_files(deal_dir)
+    cap_table = None
+    if cap_table_path is None:
+        report["errors"].append("No cap table found (expected a spreadsheet with 'cap' or 'table' in its name)")
+    else:
+        cap_table = parse_cap_table(load_file(cap_table_path), api_key)
+        if cap_table is None:
+            report["errors"].append(f"Could not parse cap table {os.path.basename(cap_table_path)}")
+        else:
+            report["cap_table"] = {
+                "filename": os.path.basename(cap_table_path),
+                "column_mapping": cap_table["column_mapping"],
+                "summary": cap_table["summary"]
+            }
+    
+    files = [load_file(path) for path in document_paths]
+    results = process_documents(files, api_key, on_progress=on_progress)
+    documents = add_processed_documents({}, files, results, DocumentStore())
+    for file, result in zip(files, results):
+        if result["error"]:
+            report["errors"].append(f"{file.name}: {result['error']}")
+    report["documents"] = [
+        {
+            "id": doc_id,
+            "filename": doc["filename"],
+            "type": doc["type"],
+            "category_confidence": doc["category_confidence"],
+            "duplicate_of": documents[doc["duplicate_of"]]["filename"] if doc["duplicate_of"] else None,
+            "info": doc["info"]
+        }
+        for doc_id, doc in documents.items()
+    ]
+    
+    if cap_table and documents:
+        verification = verify_cap_table(cap_table, documents, api_key)
+        report["verification"] = verification
+        if verification is None:
+            report["errors"].append("Verification failed")
+        elif remediation:
+            report["remediation"] = generate_remediation(verification, api_key)
+    
+    report["finished_at"] = datetime.now().isoformat(timespec="seconds")
+    return report
+
+# Render a deal report as markdown
+def render_markdown(report):
+    lines = [f"# Cap Table Tie-Out: {report['deal']}", "", f"Run: {report['started_at']} to {report.get('finished_at', '')}", ""]
+    
+    if report["cap_table"]:
+        summary = report["cap_table"]["summary"]
+        lines += ["## Cap Table", "", f"- File: {report['cap_table']['filename']}", f"- Total Rows: {summary['total_rows']}", f"- Total Shares: {summary['total_shares']}"]
+        if summary["share_classes"]:
+            lines.append(f"- Share Classes: {', '.join(str(share_class) for share_class in summary['share_classes'])}")
+        lines.append("")
+    
+    if report["documents"]:
+        lines += ["## Documents", "", "| File | Type | Near-duplicate of |", "| --- | --- | --- |"]
+        lines += [f"| {doc['filename']} | {doc['type']} | {doc.get('duplicate_of') or ''} |" for doc in report["documents"]]
+        lines.append("")
+    
+    verification = report["verification"]
+    if verification:
+        lines += ["## Verification Results", ""]
+        context = verification.get("context")
+        if context:
+            lines += [
+                f"Context: {context['packed_documents']} of {context['documents']} documents packed ({context['packed_tokens']:,} tokens), "
+                f"{context['dropped_documents']} dropped ({context['dropped_tokens']:,} tokens); "
+                f"{context.get('cache_read_tokens', 0):,} prompt tokens read from cache",
+                ""
+            ]
+        for category, result in verification.get("verification_results", {}).items():
+            status = "Verified" if result.get("verified", False) else "Issues Found"
+            lines += [f"### {category.replace('_', ' ').title()} - {status}", "", str(result.get("notes", "No notes available")), ""]
+        
+        discrepancies = verification.get("discrepancies", [])
+        if discrepancies:
+            lines += ["## Discrepancies", ""]
+            for i, discrepancy in enumerate(discrepancies):
+                lines += [
+                    f"{i+1}. **{discrepancy.get('type', 'Issue')}** ({discrepancy.get('severity', 'medium').upper()}): {discrepancy.get('description', 'No description available')}",
+                    f"   *Recommendation: {discrepancy.get('recommendation', 'None provided')}*"
+                ]
+            lines.append("")
+        
+        recommendations = verification.get("recommendations", [])
+        if recommendations:
+            lines += ["## Recommendations", ""]
+            lines += [f"{i+1}. {recommendation}" for i, recommendation in enumerate(recommendations)]
+            lines.append("")
+    
+    if report["remediation"]:
+        lines += ["## Remediation Plan", "", report["remediation"], ""]
+    
+    if report["errors"]:
+        lines += ["## Errors", ""]
+        lines += [f"- {error}" for error in report["errors"]]
+        lines.append("")
+    
+    return "\n".join(lines)
+
+# File name for a deal's reports: the deal directory's name and a short hash of its
+# resolved path, so deals with the same name in different places don't overwrite
+# each other's reports
+def report_name(report):
+    return f"{report['deal']}-{hash_bytes(os.path.realpath(report['directory']).encode('utf-8'))[:8]}"
+
+# Write <report name>.json and <report name>.md into out_dir and return their paths
+def write_reports(report, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    json_path = os.path.join(out_dir, f"{report_name(report)}.json")
+    markdown_path = os.path.join(out_dir, f"{report_name(report)}.md")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=json_default)
+    with open(markdown_path, "w", encoding="utf-8") as f:
+        f.write(render_markdown(report))
+    return json_path, markdown_path
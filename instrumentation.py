@@ -0,0 +1,197 @@
+import contextvars
+import cProfile
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+# USD per million input and output tokens
+MODEL_PRICES = {
+    "claude-3-sonnet-20240229": (3.00, 15.00),
+    "claude-3-5-sonnet-20240620": (3.00, 15.00),
+    "claude-3-haiku-20240307": (0.25, 1.25),
+    "claude-3-opus-20240229": (15.00, 75.00)
+}
+
+# Prompt cache pricing relative to the input price: writes cost more, reads much less
+CACHE_WRITE_PRICE = 1.25
+CACHE_READ_PRICE = 0.1
+
+# Stage calls kept for the sidebar and trace export
+MAX_SPANS = 5000
+
+# Optional profiler for stages marked profile=True: "cprofile" or "pyinstrument".
+# Profiles are written to PROFILE_DIR, one file per call.
+PROFILER = os.environ.get("DILIGIZE_PROFILE", "").lower()
+PROFILE_DIR = os.environ.get("DILIGIZE_PROFILE_DIR", "profiles")
+
+# Streamed calls whose latency is kept for display
+MAX_LLM_TIMINGS = 20
+
+# Stage calls and streamed-call latencies of one Streamlit session, including the jobs
+# it starts, or of the whole process for the CLI and benchmarks
+class Recorder:
+    def __init__(self):
+        self.spans = deque(maxlen=MAX_SPANS)
+        self.llm_timings = deque(maxlen=MAX_LLM_TIMINGS)
+
+_default_recorder = Recorder()
+# The recorder for the current context; contexts copied from it (engine workers, jobs)
+# record to it too
+_recorder = contextvars.ContextVar("recorder", default=None)
+_spans_lock = threading.Lock()
+# Only one call is profiled at a time; concurrent calls run unprofiled
+_profile_lock = threading.Lock()
+
+# Stages open in the current context. LLM usage is added to every open stage.
+_open_stages = contextvars.ContextVar("open_stages", default=())
+
+# Record to recorder in the current context from now on
+def use_recorder(recorder):
+    _recorder.set(recorder)
+
+def current_recorder():
+    return _recorder.get() or _default_recorder
+
+# input_tokens excludes prompt tokens written to or read from the cache
+def estimate_cost(model, input_tokens, output_tokens, cache_write_tokens=0, cache_read_tokens=0):
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    input_cost = (input_tokens + cache_write_tokens * CACHE_WRITE_PRICE + cache_read_tokens * CACHE_READ_PRICE) * input_price
+    return (input_cost + output_tokens * output_price) / 1_000_000
+
+# Record time-to-first-token and total latency of a streamed Claude call
+def record_llm_timing(call, started, first_token_at, finished):
+    current_recorder().llm_timings.append({
+        "call": call,
+        "time_to_first_token": (first_token_at - started) if first_token_at else None,
+        "total": finished - started
+    })
+
+# Called by the LLM client after each request
+def record_llm_call(model, usage, retries):
+    input_tokens = getattr(usage, "input_tokens", 0) or 0
+    output_tokens = getattr(usage, "output_tokens", 0) or 0
+    cache_write_tokens = getattr(usage, "cache_creation_input_tokens", 0) or 0
+    cache_read_tokens = getattr(usage, "cache_read_input_tokens", 0) or 0
+    cost = estimate_cost(model, input_tokens, output_tokens, cache_write_tokens, cache_read_tokens)
+    with _spans_lock:
+        for span in _open_stages.get():
+            span["llm_calls"] += 1
+            span["input_tokens"] += input_tokens
+            span["output_tokens"] += output_tokens
+            span["cache_write_tokens"] += cache_write_tokens
+            span["cache_read_tokens"] += cache_read_tokens
+            span["cost"] += cost
+            span["retries"] += retries
+
+def _profiled(stage, fn, args, kwargs):
+    if PROFILER not in ("cprofile", "pyinstrument") or not _profile_lock.acquire(blocking=False):
+        return fn(*args, **kwargs)
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{stage}-{datetime.now().strftime('%Y%m%d%H%M%S%f')}")
+        if PROFILER == "pyinstrument" and pyinstrument is not None:
+            profiler = pyinstrument.Profiler()
+            profiler.start()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profiler.stop()
+                with open(f"{path}.html", "w", encoding="utf-8") as f:
+                    f.write(profiler.output_html())
+        if PROFILER == "pyinstrument":
+            logger.warning("pyinstrument is not installed; profiling with cProfile instead")
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(fn, *args, **kwargs)
+        finally:
+            profiler.dump_stats(f"{path}.prof")
+    finally:
+        _profile_lock.release()
+
+# Decorator recording wall time, token usage, cost and retries of each call to a
+# pipeline stage. A stage called from inside itself is only recorded once.
+def stage(name, profile=False):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            open_stages = _open_stages.get()
+            if any(span["stage"] == name for span in open_stages):
+                return fn(*args, **kwargs)
+
+            span = {
+                "stage": name,
+                "started_at": time.time(),
+                "duration": None,
+                "llm_calls": 0,
+                "input_tokens": 0,
+                "output_tokens": 0,
+                "cache_write_tokens": 0,
+                "cache_read_tokens": 0,
+                "cost": 0.0,
+                "retries": 0,
+                "error": None,
+                "thread": threading.current_thread().name
+            }
+            recorder = current_recorder()
+            token = _open_stages.set(open_stages + (span,))
+            started = time.perf_counter()
+            try:
+                return _profiled(name, fn, args, kwargs) if profile else fn(*args, **kwargs)
+            except Exception as e:
+                span["error"] = str(e)
+                raise
+            finally:
+                span["duration"] = time.perf_counter() - started
+                _open_stages.reset(token)
+                with _spans_lock:
+                    recorder.spans.append(span)
+        return wrapper
+    return decorator
+
+# Totals per stage of the current recorder: calls, wall time, tokens (including prompt
+# cache writes and reads), cost, retries and errors
+def stage_summary():
+    with _spans_lock:
+        recorded = list(current_recorder().spans)
+    summary = {}
+    for span in recorded:
+        totals = summary.setdefault(span["stage"], {
+            "calls": 0, "total_time": 0.0, "max_time": 0.0, "llm_calls": 0,
+            "input_tokens": 0, "output_tokens": 0, "cache_write_tokens": 0, "cache_read_tokens": 0,
+            "cost": 0.0, "retries": 0, "errors": 0
+        })
+        totals["calls"] += 1
+        totals["total_time"] += span["duration"]
+        totals["max_time"] = max(totals["max_time"], span["duration"])
+        for key in ["llm_calls", "input_tokens", "output_tokens", "cache_write_tokens", "cache_read_tokens", "cost", "retries"]:
+            totals[key] += span[key]
+        totals["errors"] += span["error"] is not None
+    return summary
+
+# JSON trace of every recorded call plus per-stage totals; extra is merged in
+# (e.g. cache statistics)
+def export_trace(**extra):
+    with _spans_lock:
+        recorded = list(current_recorder().spans)
+    return json.dumps({
+        "exported_at": datetime.now().isoformat(timespec="seconds"),
+        "stages": stage_summary(),
+        "spans": recorded,
+        **extra
+    }, indent=2, default=str)
+
+def reset():
+    with _spans_lock:
+        current_recorder().spans.clear()
@@ -0,0 +1,294 @@
+import contextvars
+import json
+import logging
+import os
+import pickle
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from doc_cache import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# On-disk job queue. Kept outside the document cache directory so cache eviction
+# never removes a job's inputs or checkpoints.
+DEFAULT_JOBS_DIR = os.environ.get(
+    "DILIGIZE_JOBS_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "diligize-jobs")
+)
+# Jobs run at the same time. Each job parallelizes its own work (e.g. documents).
+JOB_WORKERS = int(os.environ.get("DILIGIZE_JOB_WORKERS", 2))
+# Finished, failed and interrupted jobs are removed after this long
+JOB_RETENTION_SECONDS = 24 * 60 * 60
+# Progress-only updates are written to disk at most this often
+PROGRESS_WRITE_INTERVAL = 1.0
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# The job whose handler is running in the current context. Engine workers run in
+# copies of their caller's context, so their log records reach the job too.
+_current_job = contextvars.ContextVar("current_job", default=None)
+
+# Adds engine errors and warnings logged while a job runs to the job's record, since
+# job threads have no Streamlit script run to show them on
+class JobLogHandler(logging.Handler):
+    def emit(self, record):
+        job = _current_job.get()
+        if job is None:
+            return
+        job.queue._log(job.id, "error" if record.levelno >= logging.ERROR else "warning", self.format(record))
+
+# A running job as its handler sees it: its payload and API key, progress
+# reporting, and per-item checkpoints that survive a restart
+class Job:
+    def __init__(self, queue, job_id, payload, api_key):
+        self.queue = queue
+        self.id = job_id
+        self.payload = payload
+        self.api_key = api_key
+
+    # Report progress. partial is shown to the UI while the job runs (e.g. categories
+    # verified so far or a plan being streamed) and is not persisted.
+    def progress(self, done, total, message=None, partial=None):
+        self.queue._update(self.id, persist=False, progress={"done": done, "total": total}, message=message, partial=partial)
+
+    # Persist the result of one unit of work (e.g. one document) under key
+    def checkpoint(self, key, value):
+        directory = os.path.join(self.queue._job_dir(self.id), "checkpoints")
+        os.makedirs(directory, exist_ok=True)
+        atomic_write(os.path.join(directory, f"{key}.pkl"), pickle.dumps(value))
+
+    # Checkpoints saved by earlier runs of this job, by key
+    def checkpoints(self):
+        directory = os.path.join(self.queue._job_dir(self.id), "checkpoints")
+        saved = {}
+        for name in os.listdir(directory) if os.path.isdir(directory) else []:
+            if name.endswith(".pkl"):
+                with open(os.path.join(directory, name), "rb") as f:
+                    saved[name[:-len(".pkl")]] = pickle.load(f)
+        return saved
+
+# Background jobs run by a local thread pool, so long work outlives the Streamlit
+# script run that started it. Each job's record (status, progress, error), payload,
+# checkpoints and result are kept on disk; jobs still queued or running when the
+# process stopped are marked "interrupted" on start-up and can be resumed, picking
+# up from their checkpoints. API keys are held in memory only, so resuming needs one.
+# A job runs in a copy of the context that submitted or resumed it, so context
+# variables (such as the session's instrumentation recorder) carry over.
+# handlers maps a job kind to a function that takes a Job and returns its result.
+class JobQueue:
+    def __init__(self, handlers, jobs_dir=DEFAULT_JOBS_DIR, workers=JOB_WORKERS):
+        self.handlers = handlers
+        self.jobs_dir = jobs_dir
+        self._records = {}
+        self._written = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        os.makedirs(jobs_dir, exist_ok=True)
+        self._load()
+
+    def _job_dir(self, job_id):
+        return os.path.join(self.jobs_dir, job_id)
+
+    def _write_record(self, record):
+        atomic_write(os.path.join(self._job_dir(record["id"]), "job.json"), json.dumps(record, default=str).encode("utf-8"))
+        self._written[record["id"]] = time.monotonic()
+
+    # Read job records left by earlier processes. Unfinished jobs were interrupted;
+    # old ones are removed.
+    def _load(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in os.listdir(self.jobs_dir):
+            path = os.path.join(self._job_dir(job_id), "job.json")
+            try:
+                with open(path, "rb") as f:
+                    record = json.loads(f.read().decode("utf-8"))
+            except (OSError, ValueError):
+                continue
+            if record["updated_at"] < cutoff:
+                shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+                continue
+            record["partial"] = None
+            if record["status"] in ACTIVE_STATUSES:
+                record["status"] = "interrupted"
+                self._write_record(record)
+            self._records[job_id] = record
+
+    def _update(self, job_id, persist=True, **changes):
+        with self._lock:
+            record = self._records[job_id]
+            record.update(changes, updated_at=time.time())
+            # Progress is written occasionally; status changes always
+            if persist or time.monotonic() - self._written.get(job_id, 0) >= PROGRESS_WRITE_INTERVAL:
+                self._write_record({**record, "partial": None})
+            return dict(record)
+
+    # Queue a job and return its ID
+    def submit(self, kind, payload, api_key):
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = f"{kind}-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(self._job_dir(job_id))
+        atomic_write(os.path.join(self._job_dir(job_id), "payload.pkl"), pickle.dumps(payload))
+        record = {
+            "id": job_id, "kind": kind, "status": "queued", "created_at": time.time(), "updated_at": time.time(),
+            "progress": {"done": 0, "total": 0}, "message": None, "error": None, "log": [], "partial": None
+        }
+        with self._lock:
+            self._records[job_id] = record
+            self._write_record(record)
+        self._executor.submit(contextvars.copy_context().run, self._run, job_id, payload, api_key)
+        return job_id
+
+    # Queue an interrupted or failed job again; completed checkpoints are kept
+    def resume(self, job_id, api_key):
+        status = self.status(job_id)
+        if status is None or status["status"] in ACTIVE_STATUSES:
+            return
+        with open(os.path.join(self._job_dir(job_id), "payload.pkl"), "rb") as f:
+            payload = pickle.load(f)
+        self._update(job_id, status="queued", error=None, log=[], message="Resuming")
+        self._executor.submit(contextvars.copy_context().run, self._run, job_id, payload, api_key)
+
+    # Append an error or warning to a job's log
+    def _log(self, job_id, level, message):
+        with self._lock:
+            record = self._records[job_id]
+            record["log"] = record.get("log", []) + [{"level": level, "message": message}]
+            self._write_record({**record, "partial": None})
+
+    def _run(self, job_id, payload, api_key):
+        kind = self._update(job_id, status="running")["kind"]
+        job = Job(self, job_id, payload, api_key)
+        token = _current_job.set(job)
+        try:
+            result = self.handlers[kind](job)
+            atomic_write(os.path.join(self._job_dir(job_id), "result.pkl"), pickle.dumps(result))
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            self._update(job_id, status="failed", error=str(e), partial=None)
+            return
+        finally:
+            _current_job.reset(token)
+        self._update(job_id, status="done", partial=None)
+
+    # The job's record: id, kind, status (queued, running, done, failed or
+    # interrupted), progress, message, error, log (errors and warnings logged by the
+    # engine while it ran, as level and message) and partial results. None if unknown.
+    def status(self, job_id):
+        with self._lock:
+            record = self._records.get(job_id)
+            return dict(record) if record else None
+
+    def result(self, job_id):
+        with open(os.path.join(self._job_dir(job_id), "result.pkl"), "rb") as f:
+            return pickle.load(f)
+
+    # Remove a job and its files once its result has been used
+    def discard(self, job_id):
+        with self._lock:
+            record = self._records.get(job_id)
+            if record is None or record["status"] in ACTIVE_STATUSES:
+                return
+            del self._records[job_id]
+        shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+
+    def jobs(self, statuses=None):
+        with self._lock:
+            return [dict(record) for record in self._records.values() if statuses is None or record["status"] in statuses]
+
+_log_handler = JobLogHandler(level=logging.WARNING)
+logging.getLogger("engine").addHandler(_log_handler)
+
+# Job handlers. The engine is imported when the first job runs.
+
+def _parse_cap_table_job(job):
+    from engine import NamedBytesIO, parse_cap_table
+    name, data = job.payload["file"]
+    job.progress(0, 1, f"Processing {name}")
+    cap_table = parse_cap_table(NamedBytesIO(data, name), job.api_key)
+    if cap_table is None:
+        raise ValueError(f"Could not parse cap table {name}")
+    return cap_table
+
+# Each document's result is checkpointed as it completes, so a resumed job only
+# processes the rest. Failed documents are not checkpointed and are retried.
+# Uploads are matched for near-duplicates against the payload's "earlier" copies
+# (the session's documents) and documents checkpointed by an earlier run; results
+# whose canonical copy was replaced are checkpointed again.
+def _process_documents_job(job):
+    from engine import NamedBytesIO, process_documents
+    files = [NamedBytesIO(data, name) for name, data in job.payload["files"]]
+    results = {int(key): result for key, result in job.checkpoints().items()}
+    remaining = [index for index in range(len(files)) if index not in results]
+    positions = {id(files[index]): index for index in remaining}
+    checkpointed = [result for result in results.values() if result.get("features") and result["info"] and not result["duplicate_of"]]
+    job.progress(len(results), len(files), f"{len(results)} documents already processed" if results else None)
+
+    def on_progress(completed, total, file, result):
+        index = positions[id(file)]
+        results[index] = result
+        if not result["error"]:
+            job.checkpoint(index, result)
+        job.progress(len(files) - len(remaining) + completed, len(files), f"Processed {file.name}")
+
+    def on_replaced(file, result):
+        job.checkpoint(positions[id(file)], result)
+
+    process_documents([files[index] for index in remaining], job.api_key, on_progress=on_progress,
+                      earlier=checkpointed + job.payload.get("earlier", []), on_replaced=on_replaced)
+
+    # Copies checkpointed by an earlier run that a new upload replaced, and their
+    # near-duplicates, now reuse its info
+    replaced = {file_hash: result["file_hash"] for result in results.values() for file_hash in result.get("replaces") or []}
+    for index, result in results.items():
+        canonical = replaced.get(result["file_hash"]) or replaced.get(result["duplicate_of"])
+        if canonical and result["duplicate_of"] != canonical and not result["error"]:
+            result["duplicate_of"] = canonical
+            job.checkpoint(index, result)
+    return {"files": files, "results": [results[index] for index in range(len(files))]}
+
+def _verify_cap_table_job(job):
+    from engine import verify_cap_table
+    from verification import VERIFICATION_CATEGORIES
+    verified = {}
+
+    def on_category(category, result):
+        verified[category] = result
+        job.progress(len(verified), len(VERIFICATION_CATEGORIES), f"Verified {category.replace('_', ' ')}", partial=dict(verified))
+
+    job.progress(0, len(VERIFICATION_CATEGORIES))
+    results = verify_cap_table(job.payload["cap_table"], job.payload["documents"], job.api_key, on_category=on_category, previous=job.payload["previous"])
+    if results is None:
+        raise ValueError("Verification failed")
+    return results
+
+def _generate_remediation_job(job):
+    from engine import generate_remediation
+    job.progress(0, 1)
+    plan = generate_remediation(job.payload["verification_results"], job.api_key, on_text=lambda text: job.progress(0, 1, partial=text))
+    if not plan:
+        raise ValueError("Could not generate a remediation plan")
+    return plan
+
+JOB_HANDLERS = {
+    "parse_cap_table": _parse_cap_table_job,
+    "process_documents": _process_documents_job,
+    "verify_cap_table": _verify_cap_table_job,
+    "generate_remediation": _generate_remediation_job
+}
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+# Process-wide job queue, created (and interrupted jobs found) on first use
+def get_job_queue():
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(JOB_HANDLERS)
+        return _job_queue
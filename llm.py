@@ -0,0 +1,237 @@
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from chunked_extract import estimate_tokens
+from instrumentation import record_llm_call
+
+# Account limits shared by every call in the process
+REQUESTS_PER_MINUTE = int(os.environ.get("DILIGIZE_RPM", 50))
+TOKENS_PER_MINUTE = int(os.environ.get("DILIGIZE_TPM", 80000))
+# Point the client at another server (e.g. a local mock of the Messages API)
+BASE_URL = os.environ.get("DILIGIZE_LLM_BASE_URL") or os.environ.get("ANTHROPIC_BASE_URL")
+
+# Pooled connections per client
+MAX_CONNECTIONS = 16
+REQUEST_TIMEOUT = 120.0
+
+# Retries for rate limits (429), overload (529), server errors and dropped connections
+MAX_RETRIES = 5
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 30.0
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504, 529}
+
+# Token buckets for requests and tokens per minute. Callers reserve an estimate up
+# front and settle it against the usage reported by the API afterwards.
+class RateLimiter:
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+        self.waiting = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.tokens_used = 0
+        self.wait_seconds = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    # Block until a request with this many estimated tokens fits in both buckets
+    def acquire(self, tokens):
+        # A request larger than the whole bucket waits for a full bucket
+        tokens = min(tokens, self.tokens_per_minute)
+        started = time.monotonic()
+        with self._condition:
+            self.waiting += 1
+            try:
+                while True:
+                    self._refill()
+                    now = time.monotonic()
+                    if now < self._paused_until:
+                        delay = self._paused_until - now
+                    elif self._requests >= 1 and self._tokens >= tokens:
+                        break
+                    else:
+                        delay = max((1 - self._requests) * 60 / self.requests_per_minute, (tokens - self._tokens) * 60 / self.tokens_per_minute)
+                    self._condition.wait(max(delay, 0.01))
+            finally:
+                self.waiting -= 1
+            self._requests -= 1
+            self._tokens -= tokens
+            self.in_flight += 1
+            self.requests += 1
+            self.wait_seconds += time.monotonic() - started
+        return tokens
+
+    # Change the per-minute limits, keeping no more capacity than the new limits allow
+    def set_limits(self, requests_per_minute, tokens_per_minute):
+        with self._condition:
+            self._refill()
+            self.requests_per_minute = requests_per_minute
+            self.tokens_per_minute = tokens_per_minute
+            self._requests = min(self._requests, requests_per_minute)
+            self._tokens = min(self._tokens, tokens_per_minute)
+            self._condition.notify_all()
+
+    # Return the unused part of a reservation once actual usage is known
+    def release(self, reserved, used):
+        with self._condition:
+            self._refill()
+            self._tokens = min(self.tokens_per_minute, self._tokens + reserved - used)
+            self.in_flight -= 1
+            self.tokens_used += used
+            self._condition.notify_all()
+
+    # Hold back every caller after the API reports a rate limit
+    def pause(self, seconds):
+        with self._condition:
+            self.rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def record_retry(self):
+        with self._condition:
+            self.retries += 1
+
+    def stats(self):
+        with self._condition:
+            return {
+                "queue_depth": self.waiting,
+                "in_flight": self.in_flight,
+                "requests": self.requests,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "tokens_used": self.tokens_used,
+                "wait_seconds": self.wait_seconds
+            }
+
+limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+
+# Limit this process to an equal share of the account limits, when it is one of
+# `processes` worker processes calling the API at the same time (e.g. the CLI's pool)
+def share_limits(processes):
+    limiter.set_limits(REQUESTS_PER_MINUTE / processes, TOKENS_PER_MINUTE / processes)
+
+# Estimated tokens for a Messages API request: the prompt plus the output allowance
+def estimate_request_tokens(params):
+    prompt = json.dumps([params.get("system"), params.get("messages"), params.get("tools")], default=str)
+    return estimate_tokens(prompt) + params.get("max_tokens", 0)
+
+def is_retryable(error):
+    import anthropic
+    if isinstance(error, anthropic.APIConnectionError):
+        return True
+    return isinstance(error, anthropic.APIStatusError) and error.status_code in RETRYABLE_STATUS
+
+# Full-jitter exponential backoff, never shorter than the server's retry-after
+def retry_delay(error, attempt):
+    delay = random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt))
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            delay = max(delay, float(response.headers.get("retry-after", 0)))
+        except ValueError:
+            pass
+    return delay
+
+# Tokens counted against the per-minute budget. Prompt cache reads are not counted.
+def _usage_tokens(usage):
+    if usage is None:
+        return None
+    return (usage.input_tokens or 0) + (getattr(usage, "cache_creation_input_tokens", 0) or 0) + (usage.output_tokens or 0)
+
+# Messages API client that shares one pooled connection and the process-wide
+# limiter. Retries are handled here rather than by the SDK so that every attempt
+# goes through the limiter. The SDK is imported on first use to keep app start-up fast.
+class LLMClient:
+    def __init__(self, api_key, base_url=None, rate_limiter=None):
+        import anthropic
+        import httpx
+
+        self.limiter = rate_limiter or limiter
+        self.anthropic = anthropic.Anthropic(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=0,
+            http_client=anthropic.DefaultHttpxClient(
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+                timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=10.0)
+            )
+        )
+
+    # Call fn(), reserving capacity before each attempt and retrying transient errors.
+    # Returns the reservation, the result and the number of retries.
+    def _call(self, params, fn):
+        estimate = estimate_request_tokens(params)
+        for attempt in range(MAX_RETRIES + 1):
+            reserved = self.limiter.acquire(estimate)
+            try:
+                result = fn()
+            except Exception as e:
+                # Rejected requests consume no tokens
+                self.limiter.release(reserved, 0)
+                if not is_retryable(e) or attempt == MAX_RETRIES:
+                    raise
+                delay = retry_delay(e, attempt)
+                if getattr(e, "status_code", None) == 429:
+                    self.limiter.pause(delay)
+                self.limiter.record_retry()
+                time.sleep(delay)
+                continue
+            return reserved, result, attempt
+
+    # messages.create with rate limiting and retries
+    def create(self, **params):
+        reserved, response, retries = self._call(params, lambda: self.anthropic.messages.create(**params))
+        usage = getattr(response, "usage", None)
+        used = _usage_tokens(usage)
+        self.limiter.release(reserved, reserved if used is None else used)
+        record_llm_call(params.get("model"), usage, retries)
+        return response
+
+    # messages.stream with rate limiting. Opening the stream is retried; errors after
+    # events have been delivered are raised to the caller.
+    @contextmanager
+    def stream(self, **params):
+        def open_stream():
+            manager = self.anthropic.messages.stream(**params)
+            return manager, manager.__enter__()
+
+        reserved, (manager, stream), retries = self._call(params, open_stream)
+        usage = None
+        try:
+            yield stream
+            usage = stream.current_message_snapshot.usage
+        finally:
+            manager.__exit__(None, None, None)
+            used = _usage_tokens(usage)
+            self.limiter.release(reserved, reserved if used is None else used)
+            record_llm_call(params.get("model"), usage, retries)
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+# Process-wide client for an API key, created on first use
+def get_client(api_key, base_url=None):
+    base_url = base_url or BASE_URL
+    with _clients_lock:
+        client = _clients.get((api_key, base_url))
+        if client is None:
+            client = _clients[(api_key, base_url)] = LLMClient(api_key, base_url)
+        return client
+
+def stats():
+    return limiter.stats()
@@ -1,14 +1,16 @@
 import streamlit as st
-import pandas as pd
-import io
-import os
-import tempfile
-import anthropic
-import docx
-from PyPDF2 import PdfReader
-import json
-import re
+import logging
 from datetime import datetime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import instrumentation
+import llm
+from doc_cache import get_document_cache, hash_bytes
+from document_store import DocumentIndex, DocumentStore
+from jobs import ACTIVE_STATUSES, get_job_queue
+from workspace import get_workspace_db
+
+# The engine (pandas, the Anthropic SDK, PDF and Word parsers) is imported where it is
+# first needed, so the first page render doesn't wait for it
 
 # Set page configuration
 st.set_page_config(
@@ -26,360 +28,245 @@ if 'verification_results' not in st.session_state:
     st.session_state.verification_results = {}
 if 'diligence_items' not in st.session_state:
     st.session_state.diligence_items = {}
+# Full document contents live on disk; the session keeps metadata and extracted info
+if 'document_store' not in st.session_state:
+    st.session_state.document_store = DocumentStore()
+# Filename, hash and type lookups over the documents, maintained as they are added
+if 'document_index' not in st.session_state:
+    st.session_state.document_index = DocumentIndex(st.session_state.documents)
+# Stage timings and LLM latencies of this session and the jobs it starts
+if 'recorder' not in st.session_state:
+    st.session_state.recorder = instrumentation.Recorder()
+instrumentation.use_recorder(st.session_state.recorder)
+# Background jobs this session is waiting on, by kind. Their IDs are also kept in the
+# URL, so a browser refresh picks them up again.
+if 'jobs' not in st.session_state:
+    st.session_state.jobs = {}
+    for job_id in st.query_params.get_all("job"):
+        status = get_job_queue().status(job_id)
+        if status:
+            st.session_state.jobs[status["kind"]] = job_id
 
-# Extract text from document files
-def extract_text(file):
-    file_extension = os.path.splitext(file.name)[1].lower()
-    
-    if file_extension == '.pdf':
-        try:
-            pdf_reader = PdfReader(io.BytesIO(file.getvalue()))
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            return text
-        except Exception as e:
-            st.error(f"Error extracting text from PDF: {str(e)}")
-            return ""
-    
-    elif file_extension == '.docx':
-        try:
-            doc = docx.Document(io.BytesIO(file.getvalue()))
-            text = ""
-            for para in doc.paragraphs:
-                text += para.text + "\n"
-            return text
-        except Exception as e:
-            st.error(f"Error extracting text from DOCX: {str(e)}")
-            return ""
-    
-    elif file_extension == '.txt':
-        try:
-            return file.getvalue().decode('utf-8')
-        except Exception as e:
-            st.error(f"Error extracting text from TXT: {str(e)}")
-            return ""
-    
-    elif file_extension in ['.xlsx', '.xls', '.csv']:
-        # For spreadsheets, return the file itself
-        return file
-    
-    else:
-        st.warning(f"Unsupported file type: {file_extension}")
-        return ""
+# The deal workspace (id and name) the session's results are saved to, if any
+if 'workspace' not in st.session_state:
+    st.session_state.workspace = None
+
+# Category confidence below which the document list flags a document for review
+LOW_CATEGORY_CONFIDENCE = 0.3
+# Seconds between job status checks while a job is shown
+JOB_POLL_SECONDS = 1.0
 
-# Categorize documents using Claude
-def categorize_document(text, filename):
-    if not isinstance(text, str):
-        # This is likely a spreadsheet file
-        if "cap" in filename.lower() or "table" in filename.lower():
-            return "Cap Table"
+# Shows engine errors and warnings on the page of the script run that logged them
+class StreamlitLogHandler(logging.Handler):
+    def emit(self, record):
+        if get_script_run_ctx() is None:
+            return
+        message = self.format(record)
+        if record.levelno >= logging.ERROR:
+            st.error(message)
         else:
-            return "Spreadsheet"
-    
-    # Basic keyword matching for document categorization
-    text_lower = text.lower()[:1000]
+            st.warning(message)
+
+# The script is re-executed on every rerun, so the handler is attached once by name
+engine_logger = logging.getLogger("engine")
+if not any(handler.get_name() == "streamlit" for handler in engine_logger.handlers):
+    streamlit_handler = StreamlitLogHandler(level=logging.WARNING)
+    streamlit_handler.set_name("streamlit")
+    engine_logger.addHandler(streamlit_handler)
+
+# Markdown list of a document type's files, rebuilt only when documents are added.
+# Near-duplicates are listed under the copy whose info they reuse.
+def document_list_markdown(doc_type):
+    cache = st.session_state.setdefault("document_list_markdown", {})
+    key = (doc_type, st.session_state.document_index.version)
+    if key not in cache:
+        documents = st.session_state.documents
+        doc_ids = st.session_state.document_index.by_type[doc_type]
+        duplicates = {}
+        for doc_id in doc_ids:
+            canonical = documents[doc_id].get("duplicate_of")
+            if canonical in documents:
+                duplicates.setdefault(canonical, []).append(doc_id)
+        
+        lines = []
+        for doc_id in doc_ids:
+            doc = documents[doc_id]
+            if doc.get("duplicate_of") in documents:
+                continue
+            confidence = doc.get("category_confidence")
+            if confidence is not None and confidence < LOW_CATEGORY_CONFIDENCE:
+                lines.append(f"- {doc['filename']} (low confidence: {confidence:.0%})")
+            else:
+                lines.append(f"- {doc['filename']}")
+            for duplicate_id in duplicates.get(doc_id, []):
+                lines.append(f"    - {documents[duplicate_id]['filename']} (near-duplicate, extraction reused)")
+        # Entries for earlier versions are never read again
+        for stale_key in [k for k in cache if k[0] == doc_type]:
+            del cache[stale_key]
+        cache[key] = "\n".join(lines)
+    return cache[key]
+
+# A document's contents read back from the document store: its extracted text, or
+# the original file for spreadsheets
+def document_preview(doc_id):
+    from engine import load_document_content
     
-    if "certificate of incorporation" in text_lower:
-        return "Certificate of Incorporation"
-    elif "amendment" in text_lower and ("charter" in text_lower or "certificate" in text_lower):
-        return "Charter Amendment"
-    elif "board" in text_lower and ("consent" in text_lower or "resolution" in text_lower):
-        return "Board Consent"
-    elif "stockholder" in text_lower and "consent" in text_lower:
-        return "Stockholder Consent"
-    elif "purchase agreement" in text_lower:
-        return "Stock Purchase Agreement"
-    elif "option" in text_lower and "grant" in text_lower:
-        return "Option Grant"
-    elif "equity" in text_lower and "plan" in text_lower:
-        return "Equity Incentive Plan"
-    elif "warrant" in text_lower:
-        return "Warrant Agreement"
-    elif "convertible" in text_lower and "note" in text_lower:
-        return "Convertible Note"
-    elif "safe" in text_lower:
-        return "SAFE Agreement"
-    elif "409a" in text_lower or "valuation" in text_lower:
-        return "409A Valuation"
-    elif "transfer" in text_lower:
-        return "Transfer Agreement"
+    doc = st.session_state.documents[doc_id]
+    content = load_document_content(doc, st.session_state.document_store)
+    if content is None:
+        st.info(f"The contents of {doc['filename']} are no longer stored")
+    elif isinstance(content, str):
+        st.text_area(doc["filename"], content, height=300, disabled=True, key=f"preview_text_{doc_id}")
     else:
-        return "Other"
+        st.download_button(f"Download {doc['filename']}", data=content.getvalue(), file_name=doc["filename"], key=f"preview_file_{doc_id}")
 
-# Extract key info from documents using Claude
-def extract_document_info(text, document_type, api_key):
-    if document_type == "Cap Table" or not isinstance(text, str):
-        return {"message": "Cap Table will be processed separately"}
-    
-    try:
-        client = anthropic.Anthropic(api_key=api_key)
-        
-        # Create prompt based on document type
-        prompt = f"""
-        Extract key information from this {document_type} document related to cap table verification.
-        Here are the first 3000 characters of the document:
-        
-        {text[:3000]}
-        
-        Extract information like:
-        - Document date
-        - Share quantities 
-        - Share classes
-        - Prices/valuations
-        - Stakeholder names
-        - Approval information
-        - Any other relevant data for cap table verification
-        
-        Format your response as JSON with appropriate keys based on the document type.
-        """
-        
-        response = client.messages.create(
-            model="claude-3-sonnet-20240229",
-            max_tokens=800,
-            temperature=0,
-            system="You are an AI assistant that extracts structured information from legal documents related to cap tables. Always respond in valid JSON format.",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        # Extract JSON from the response
-        json_text = response.content[0].text
-        # Clean up any markdown formatting
-        json_text = re.sub(r'```json', '', json_text)
-        json_text = re.sub(r'```', '', json_text)
-        
-        result = json.loads(json_text.strip())
-        return result
+# Replace the session's data with a workspace's, creating the workspace if needed. A
+# new workspace starts with whatever the session already holds.
+def open_workspace(name):
+    db = get_workspace_db()
+    workspace_id = db.open(name)
+    state = db.load(workspace_id)
+    if not state["documents"] and state["cap_table"] is None and state["verification_results"] is None:
+        if st.session_state.documents:
+            db.save_documents(workspace_id, st.session_state.documents)
+        if st.session_state.cap_table:
+            db.save_cap_table(workspace_id, st.session_state.cap_table)
+        if st.session_state.verification_results:
+            db.save_verification(workspace_id, st.session_state.verification_results)
+            if st.session_state.get("remediation_plan"):
+                db.save_remediation(workspace_id, st.session_state.remediation_plan)
+        state = db.load(workspace_id)
     
-    except Exception as e:
-        st.error(f"Error extracting information: {str(e)}")
-        return {"error": str(e)}
+    st.session_state.workspace = {"id": workspace_id, "name": name.strip()}
+    st.session_state.documents = state["documents"]
+    st.session_state.document_index = DocumentIndex(state["documents"])
+    st.session_state.cap_table = state["cap_table"]
+    st.session_state.verification_results = state["verification_results"] or {}
+    st.session_state.remediation_plan = state["remediation_plan"]
+    st.query_params["workspace"] = name.strip()
 
-# Parse cap table file
-def parse_cap_table(file, api_key):
-    try:
-        # Read the file based on extension
-        file_extension = os.path.splitext(file.name)[1].lower()
-        
-        if file_extension in ['.xlsx', '.xls']:
-            df = pd.read_excel(file)
-        elif file_extension == '.csv':
-            df = pd.read_csv(file)
+# ID of the open workspace, or None
+def workspace_id():
+    return st.session_state.workspace["id"] if st.session_state.workspace else None
+
+def track_job(job_id):
+    st.session_state.jobs[get_job_queue().status(job_id)["kind"]] = job_id
+    st.query_params["job"] = list(st.session_state.jobs.values())
+
+def untrack_job(kind):
+    st.session_state.jobs.pop(kind, None)
+    st.query_params["job"] = list(st.session_state.jobs.values())
+
+# Errors and warnings the engine logged while a job ran
+def show_job_log(status):
+    for entry in status.get("log") or []:
+        if entry["level"] == "error":
+            st.error(entry["message"])
         else:
-            st.error("Unsupported cap table format. Please upload an Excel or CSV file.")
-            return None
-        
-        # Use Claude to analyze the cap table structure
-        client = anthropic.Anthropic(api_key=api_key)
-        
-        # Convert the first few rows to string for analysis
-        table_preview = df.head(10).to_string()
-        
-        prompt = f"""
-        Analyze this cap table and identify the key columns:
-        
-        {table_preview}
-        
-        Identify which columns represent:
-        1. Stakeholder/shareholder names
-        2. Share class (common, preferred, etc.)
-        3. Number of shares
-        4. Percentage ownership
-        5. Issue date or grant date
-        6. Price per share
-        
-        Respond in JSON format with column names as values.
-        """
-        
-        response = client.messages.create(
-            model="claude-3-sonnet-20240229",
-            max_tokens=500,
-            temperature=0,
-            system="You are an AI assistant that analyzes cap table structures. Respond in valid JSON format.",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        # Extract column mapping from response
-        json_text = response.content[0].text
-        json_text = re.sub(r'```json', '', json_text)
-        json_text = re.sub(r'```', '', json_text)
-        
-        column_mapping = json.loads(json_text.strip())
-        
-        # Create summary statistics
-        total_rows = len(df)
-        share_classes = []
-        total_shares = 0
-        
-        # Get share classes if available
-        if "share_class" in column_mapping and column_mapping["share_class"] in df.columns:
-            share_classes = df[column_mapping["share_class"]].dropna().unique().tolist()
-        
-        # Get total shares if available
-        if "shares" in column_mapping and column_mapping["shares"] in df.columns:
-            # Convert to numeric, handling errors
-            df[column_mapping["shares"]] = pd.to_numeric(df[column_mapping["shares"]], errors='coerce')
-            total_shares = df[column_mapping["shares"]].sum()
-        
-        # Create structured cap table data
-        cap_table_data = {
-            "raw_data": df,
-            "column_mapping": column_mapping,
-            "summary": {
-                "total_rows": total_rows,
-                "total_shares": total_shares,
-                "share_classes": share_classes
-            }
-        }
-        
-        return cap_table_data
-    
-    except Exception as e:
-        st.error(f"Error parsing cap table: {str(e)}")
-        return None
+            st.warning(entry["message"])
 
-# Perform cap table tie-out verification using Claude
-def verify_cap_table(cap_table, documents, api_key):
-    try:
-        client = anthropic.Anthropic(api_key=api_key)
-        
-        # Prepare document information
-        doc_info = {}
-        for doc_id, doc in documents.items():
-            if "info" in doc and doc["info"]:
-                doc_info[doc_id] = {
-                    "type": doc["type"],
-                    "info": doc["info"]
-                }
-        
-        # Extract cap table summary and sample data
-        cap_summary = cap_table["summary"]
-        cap_sample = cap_table["raw_data"].head(10).to_string()
-        column_mapping = cap_table["column_mapping"]
-        
-        # Create prompt for verification
-        prompt = f"""
-        Verify this cap table against supporting documents using the following due diligence checklist:
-        
-        DUE DILIGENCE CHECKLIST FOR CAP TABLE TIE-OUT:
-        
-        1. Authorized Shares Verification:
-           - Verify authorized shares in charter vs. cap table
-           - Check all share classes (common, preferred series)
-        
-        2. Share Issuances Verification:
-           - Verify board approval for all issuances
-           - Match issuances to stock purchase agreements
-           - Confirm share counts, names, dates match
-        
-        3. Option Grants Verification:
-           - Verify option grants match board approvals
-           - Check exercise prices against 409A valuations
-           - Verify vesting schedules are properly reflected
-        
-        4. Warrants Verification:
-           - Verify warrants match agreements
-           - Check exercise prices and expiration dates
-           - Verify board approval for warrants
-        
-        5. Convertible Instruments Verification:
-           - Verify convertible notes and SAFEs are properly reflected
-           - Check conversion terms and valuation caps
-           - Verify board approval for convertible instruments
-        
-        Cap table summary:
-        {json.dumps(cap_summary, indent=2)}
-        
-        Column mapping:
-        {json.dumps(column_mapping, indent=2)}
-        
-        Sample cap table data:
-        {cap_sample}
-        
-        Supporting documents:
-        {json.dumps(doc_info, indent=2)}
-        
-        Provide verification results for each checklist category, any discrepancies found, and recommendations.
-        """
-        
-        response = client.messages.create(
-            model="claude-3-sonnet-20240229",
-            max_tokens=1500,
-            temperature=0,
-            system="You are an AI assistant that verifies cap tables against supporting documentation.",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        # Process and structure the verification results
-        verification_text = response.content[0].text
-        
-        # Second prompt to structure the results
-        structure_prompt = f"""
-        Convert the following cap table verification results into a structured JSON format:
-        
-        {verification_text}
-        
-        The JSON should have these main sections:
-        1. "verification_results" - results for each category (authorized_shares, share_issuances, option_grants, warrants, convertible_instruments)
-        2. "discrepancies" - list of specific discrepancies found
-        3. "recommendations" - list of recommendations
-        
-        Each verification result should have a "verified" boolean and "notes" field.
-        """
-        
-        structured_response = client.messages.create(
-            model="claude-3-sonnet-20240229",
-            max_tokens=1500,
-            temperature=0,
-            system="You are an AI assistant that structures cap table verification results into JSON format.",
-            messages=[{"role": "user", "content": structure_prompt}]
-        )
-        
-        # Extract JSON from the response
-        json_text = structured_response.content[0].text
-        json_text = re.sub(r'```json', '', json_text)
-        json_text = re.sub(r'```', '', json_text)
-        
-        results = json.loads(json_text.strip())
-        return results
+# Move the results of finished jobs into the session
+def apply_finished_jobs():
+    queue = get_job_queue()
+    for kind, job_id in list(st.session_state.jobs.items()):
+        status = queue.status(job_id)
+        if status is None:
+            untrack_job(kind)
+            continue
+        if status["status"] != "done":
+            continue
+        
+        show_job_log(status)
+        result = queue.result(job_id)
+        if kind == "parse_cap_table":
+            st.session_state.cap_table = result
+            if workspace_id():
+                get_workspace_db().save_cap_table(workspace_id(), result)
+            st.success(f"Cap table processed: {result['summary']['total_rows']} entries found")
+        elif kind == "process_documents":
+            from engine import add_processed_documents
+            
+            # Documents added while the job ran are not added twice
+            index = st.session_state.document_index
+            files, results = [], []
+            for file, file_result in zip(result["files"], result["results"]):
+                if file_result["error"]:
+                    st.error(f"Error processing {file.name}: {file_result['error']}")
+                elif not index.contains(file.name, file_result["file_hash"]):
+                    files.append(file)
+                    results.append(file_result)
+            # Earlier documents may now be near-duplicates of a more executed upload
+            existing = {doc_id: doc.get("duplicate_of") for doc_id, doc in st.session_state.documents.items()}
+            add_processed_documents(st.session_state.documents, files, results, st.session_state.document_store, index)
+            if workspace_id():
+                changed = {doc_id: doc for doc_id, doc in st.session_state.documents.items() if doc_id not in existing or existing[doc_id] != doc.get("duplicate_of")}
+                get_workspace_db().save_documents(workspace_id(), changed)
+            st.success(f"Processed {len(result['files'])} documents")
+        elif kind == "verify_cap_table":
+            st.session_state.verification_results = result
+            # The remediation plan was based on the previous results
+            st.session_state.remediation_plan = None
+            if workspace_id():
+                get_workspace_db().save_verification(workspace_id(), result)
+            st.success("Verification completed")
+        elif kind == "generate_remediation":
+            st.session_state.remediation_plan = result
+            if workspace_id():
+                get_workspace_db().save_remediation(workspace_id(), result)
+            st.success("Remediation plan generated")
+        queue.discard(job_id)
+        untrack_job(kind)
+
+# Progress of this session's job of the given kind, refreshed while it runs. Once it
+# finishes the whole page reruns to show the result.
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def job_status(kind, label):
+    # Fragment reruns skip the top of the script; a resumed job records to this session
+    instrumentation.use_recorder(st.session_state.recorder)
+    job_id = st.session_state.jobs.get(kind)
+    status = get_job_queue().status(job_id) if job_id else None
+    if status is None:
+        return
     
-    except Exception as e:
-        st.error(f"Error verifying cap table: {str(e)}")
-        return None
+    if status["status"] == "done":
+        st.rerun()
+    elif status["status"] in ACTIVE_STATUSES:
+        progress = status["progress"]
+        st.progress(progress["done"] / progress["total"] if progress["total"] else 0.0, text=f"{label}: {status['message'] or status['status']}")
+        partial = status["partial"]
+        if kind == "verify_cap_table" and partial:
+            for category, result in partial.items():
+                with st.expander(f"{category.replace('_', ' ').title()} - {'✅ Verified' if result.get('verified', False) else '❌ Issues Found'}"):
+                    st.write(result.get("notes", "No notes available"))
+        elif kind == "generate_remediation" and partial:
+            st.markdown(partial)
+        show_job_log(status)
+    else:
+        # Failed, or interrupted by a restart: resuming keeps completed checkpoints
+        if status["status"] == "failed":
+            st.error(f"{label} failed: {status['error']}")
+        else:
+            st.warning(f"{label} was interrupted ({status['progress']['done']}/{status['progress']['total']} done)")
+        show_job_log(status)
+        resume_column, dismiss_column = st.columns(2)
+        if resume_column.button("Resume", key=f"resume_{kind}", disabled=not st.session_state.get("api_key")):
+            get_job_queue().resume(job_id, st.session_state.api_key)
+        if dismiss_column.button("Dismiss", key=f"dismiss_{kind}"):
+            get_job_queue().discard(job_id)
+            untrack_job(kind)
+            st.rerun()
 
-# Generate remediation plan
-def generate_remediation(verification_results, api_key):
-    try:
-        client = anthropic.Anthropic(api_key=api_key)
-        
-        prompt = f"""
-        Create a remediation plan for the following cap table verification results:
-        
-        {json.dumps(verification_results, indent=2)}
-        
-        The remediation plan should:
-        1. Prioritize issues by severity
-        2. Provide specific action steps for each discrepancy
-        3. Include recommendations for documentation fixes
-        4. Suggest timeline for implementation
-        
-        Be specific and practical with your recommendations.
-        """
-        
-        response = client.messages.create(
-            model="claude-3-sonnet-20240229",
-            max_tokens=1500,
-            temperature=0,
-            system="You are an AI assistant that creates remediation plans for cap table discrepancies.",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        remediation_plan = response.content[0].text
-        return remediation_plan
+# Categories with changed inputs, recomputed only when the cap table, the documents or
+# the previous results change
+def stale_categories_for(previous_results):
+    from engine import stale_verification_categories
     
-    except Exception as e:
-        st.error(f"Error generating remediation plan: {str(e)}")
-        return None
+    key = (id(st.session_state.cap_table), st.session_state.document_index.version, id(previous_results))
+    memo = st.session_state.get("stale_categories_memo")
+    if memo is None or memo[0] != key:
+        memo = (key, stale_verification_categories(st.session_state.cap_table, st.session_state.documents, previous_results))
+        st.session_state.stale_categories_memo = memo
+    return memo[1]
 
 # Main UI
 def main():
@@ -395,20 +282,72 @@ def main():
         
         st.divider()
         
+        # Deal workspaces: the session's documents and results are saved to the open
+        # one as they are produced, and opening one restores them
+        st.header("Deal Workspace")
+        if st.session_state.workspace is None and st.query_params.get("workspace"):
+            open_workspace(st.query_params["workspace"])
+        if st.session_state.workspace:
+            st.caption(f"Open: {st.session_state.workspace['name']}")
+        else:
+            st.caption("Not saved to a workspace")
+        names = [name for _, name, _ in get_workspace_db().workspaces()]
+        choice = st.selectbox("Workspace", ["New workspace"] + names)
+        workspace_name = st.text_input("Workspace name") if choice == "New workspace" else choice
+        if st.button("Open Workspace", disabled=not workspace_name.strip()):
+            open_workspace(workspace_name)
+            st.rerun()
+        
+        st.divider()
+        
         # Document statistics if available
         if st.session_state.documents:
             st.header("Document Statistics")
-            doc_types = {}
-            for doc in st.session_state.documents.values():
-                doc_type = doc["type"]
-                if doc_type in doc_types:
-                    doc_types[doc_type] += 1
-                else:
-                    doc_types[doc_type] = 1
-            
-            for doc_type, count in doc_types.items():
+            for doc_type, count in st.session_state.document_index.type_counts().items():
                 st.write(f"{doc_type}: {count}")
         
+        # Wall time, tokens, cost and retries per pipeline stage
+        stage_totals = instrumentation.stage_summary()
+        if stage_totals:
+            st.header("Performance")
+            for stage_name, totals in stage_totals.items():
+                st.write(f"{stage_name}: {totals['calls']} calls, {totals['total_time']:.1f}s (max {totals['max_time']:.1f}s)")
+                if totals["llm_calls"]:
+                    st.caption(f"{totals['input_tokens']:,} in / {totals['output_tokens']:,} out tokens, {totals['cache_read_tokens']:,} from cache, ${totals['cost']:.3f}, {totals['retries']} retries")
+            st.download_button(
+                "Export Trace",
+                data=instrumentation.export_trace(cache=get_document_cache().stats(), llm=llm.stats()),
+                file_name=f"trace_{datetime.now().strftime('%Y%m%d%H%M%S')}.json",
+                mime="application/json"
+            )
+        
+        # Latency of recent streamed calls
+        llm_timings = st.session_state.recorder.llm_timings
+        if llm_timings:
+            st.header("LLM Latency")
+            for timing in reversed(list(llm_timings)[-5:]):
+                first_token = f"{timing['time_to_first_token']:.1f}s" if timing["time_to_first_token"] is not None else "n/a"
+                st.write(f"{timing['call']}: first token {first_token}, total {timing['total']:.1f}s")
+        
+        # Shared rate limiter: requests waiting for capacity, in flight and retried
+        llm_stats = llm.stats()
+        if llm_stats["requests"]:
+            st.header("LLM Requests")
+            st.write(f"Queued: {llm_stats['queue_depth']}, in flight: {llm_stats['in_flight']}")
+            st.write(f"Sent: {llm_stats['requests']}, retried: {llm_stats['retries']}, rate limited: {llm_stats['rate_limited']}")
+            st.write(f"Time waiting for capacity: {llm_stats['wait_seconds']:.1f}s")
+        
+        # Document cache statistics
+        cache_stats = get_document_cache().stats()
+        if cache_stats["hits"] or cache_stats["misses"]:
+            st.header("Cache")
+            st.write(f"Hit rate: {cache_stats['hit_rate']:.0%}")
+            for kind in sorted(set(cache_stats["hits"]) | set(cache_stats["misses"])):
+                st.write(f"{kind}: {cache_stats['hits'].get(kind, 0)} hits, {cache_stats['misses'].get(kind, 0)} misses")
+            st.write(f"Size: {cache_stats['size_bytes'] / (1024 * 1024):.1f} MB of {cache_stats['max_bytes'] / (1024 * 1024):.0f} MB")
+            store_stats = st.session_state.document_store.stats()
+            st.write(f"Document text in memory: {store_stats['resident_bytes'] / (1024 * 1024):.1f} MB of {store_stats['memory_limit'] / (1024 * 1024):.0f} MB")
+        
         # Clear button
         if st.button("Clear All Data"):
             for key in list(st.session_state.keys()):
@@ -418,6 +357,13 @@ def main():
             st.session_state.cap_table = None
             st.session_state.verification_results = {}
             st.session_state.diligence_items = {}
+            st.session_state.document_store = DocumentStore()
+            st.session_state.document_index = DocumentIndex()
+            # Running jobs finish in the background, but their results are not used
+            st.session_state.jobs = {}
+            # The workspace keeps its data; the session is just no longer saved to it
+            st.session_state.workspace = None
+            st.query_params.clear()
             st.success("All data cleared")
     
     # Check if API key is set
@@ -425,6 +371,8 @@ def main():
         st.warning("Please enter your Anthropic API Key in the sidebar to use the application")
         return
     
+    apply_finished_jobs()
+    
     # Create tabs
     tab1, tab2, tab3 = st.tabs(["Document Upload", "Verification", "Remediation"])
     
@@ -439,12 +387,10 @@ def main():
             cap_table_file = st.file_uploader("Upload Cap Table (Excel or CSV)", type=["xlsx", "xls", "csv"])
             
             if cap_table_file is not None:
-                if st.button("Process Cap Table"):
-                    with st.spinner("Processing cap table..."):
-                        cap_table_data = parse_cap_table(cap_table_file, st.session_state.api_key)
-                        if cap_table_data:
-                            st.session_state.cap_table = cap_table_data
-                            st.success(f"Cap table processed: {cap_table_data['summary']['total_rows']} entries found")
+                if st.button("Process Cap Table", disabled="parse_cap_table" in st.session_state.jobs):
+                    track_job(get_job_queue().submit("parse_cap_table", {"file": (cap_table_file.name, cap_table_file.getvalue())}, st.session_state.api_key))
+            if "parse_cap_table" in st.session_state.jobs:
+                job_status("parse_cap_table", "Processing cap table")
             
             # Display cap table summary if available
             if st.session_state.cap_table:
@@ -462,57 +408,45 @@ def main():
             uploaded_files = st.file_uploader("Upload Supporting Documents", type=["pdf", "docx", "txt", "xlsx", "xls", "csv"], accept_multiple_files=True)
             
             if uploaded_files:
-                process_button = st.button("Process Uploaded Documents")
-                if process_button:
-                    progress_bar = st.progress(0)
-                    for i, file in enumerate(uploaded_files):
-                        if file.name not in [doc.get("filename", "") for doc in st.session_state.documents.values()]:
-                            with st.spinner(f"Processing {file.name}..."):
-                                # Extract text
-                                extracted_content = extract_text(file)
-                                
-                                if extracted_content is not None:
-                                    # Categorize document
-                                    category = categorize_document(extracted_content, file.name)
-                                    
-                                    # Generate unique ID
-                                    doc_id = f"{category}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{len(st.session_state.documents)}"
-                                    
-                                    # Extract information if it's not a cap table
-                                    info = None
-                                    if category != "Cap Table" and isinstance(extracted_content, str):
-                                        info = extract_document_info(extracted_content, category, st.session_state.api_key)
-                                    
-                                    # Store document
-                                    st.session_state.documents[doc_id] = {
-                                        "filename": file.name,
-                                        "type": category,
-                                        "content": extracted_content,
-                                        "info": info
-                                    }
-                                    
-                        # Update progress
-                        progress_bar.progress((i + 1) / len(uploaded_files))
+                if st.button("Process Uploaded Documents", disabled="process_documents" in st.session_state.jobs):
+                    # Skip files already processed (or repeated within this upload),
+                    # matching by name or by identical contents under a new name
+                    index = st.session_state.document_index
+                    upload_filenames = set()
+                    upload_hashes = set()
+                    new_files = []
+                    for file in uploaded_files:
+                        file_hash = hash_bytes(file.getvalue())
+                        if not index.contains(file.name, file_hash) and file.name not in upload_filenames and file_hash not in upload_hashes:
+                            upload_filenames.add(file.name)
+                            upload_hashes.add(file_hash)
+                            new_files.append(file)
                     
-                    st.success(f"Processed {len(uploaded_files)} documents")
+                    if new_files:
+                        from engine import earlier_copies
+                        
+                        # New uploads are matched against the documents already added
+                        payload = {"files": [(file.name, file.getvalue()) for file in new_files], "earlier": earlier_copies(st.session_state.documents)}
+                        track_job(get_job_queue().submit("process_documents", payload, st.session_state.api_key))
+                    else:
+                        st.info("All uploaded documents have already been processed")
+            if "process_documents" in st.session_state.jobs:
+                job_status("process_documents", "Processing documents")
         
         # Show document list
         if st.session_state.documents:
             st.header("Uploaded Documents")
             
-            # Group by document type
-            documents_by_type = {}
-            for doc_id, doc in st.session_state.documents.items():
-                doc_type = doc["type"]
-                if doc_type not in documents_by_type:
-                    documents_by_type[doc_type] = []
-                documents_by_type[doc_type].append((doc_id, doc))
-            
             # Display documents by type
-            for doc_type, docs in documents_by_type.items():
-                with st.expander(f"{doc_type} ({len(docs)})"):
-                    for doc_id, doc in docs:
-                        st.write(f"- {doc['filename']}")
+            for doc_type, doc_ids in st.session_state.document_index.by_type.items():
+                with st.expander(f"{doc_type} ({len(doc_ids)})"):
+                    st.markdown(document_list_markdown(doc_type))
+                    preview_id = st.selectbox(
+                        "Preview", doc_ids, index=None, key=f"preview_{doc_type}", placeholder="Choose a document to view its contents",
+                        format_func=lambda doc_id: st.session_state.documents[doc_id]["filename"]
+                    )
+                    if preview_id:
+                        document_preview(preview_id)
     
     # Tab 2: Verification
     with tab2:
@@ -523,15 +457,22 @@ def main():
         elif not st.session_state.documents:
             st.warning("Please upload supporting documents first")
         else:
-            # Verify button
-            if "verification_results" not in st.session_state or not st.session_state.verification_results:
-                if st.button("Verify Cap Table"):
-                    with st.spinner("Verifying cap table against supporting documents..."):
-                        results = verify_cap_table(st.session_state.cap_table, st.session_state.documents, st.session_state.api_key)
-                        if results:
-                            st.session_state.verification_results = results
-                            st.success("Verification completed")
-                            st.experimental_rerun()
+            # Verify button. Once results exist, only categories whose documents or cap
+            # table rows changed are verified again.
+            previous_results = st.session_state.verification_results or None
+            stale_categories = stale_categories_for(previous_results) if previous_results else []
+            failed_categories = [category for category in (previous_results or {}).get("failed", []) if category in stale_categories]
+            changed_categories = [category for category in stale_categories if category not in failed_categories]
+            if failed_categories:
+                st.warning(f"Verification failed for: {', '.join(category.replace('_', ' ').title() for category in failed_categories)}")
+            if previous_results and changed_categories:
+                st.info(f"Inputs changed for: {', '.join(category.replace('_', ' ').title() for category in changed_categories)}")
+            if not previous_results or stale_categories:
+                if st.button("Verify Cap Table" if not previous_results else f"Re-verify {len(stale_categories)} Categories", disabled="verify_cap_table" in st.session_state.jobs):
+                    payload = {"cap_table": st.session_state.cap_table, "documents": st.session_state.documents, "previous": previous_results}
+                    track_job(get_job_queue().submit("verify_cap_table", payload, st.session_state.api_key))
+            if "verify_cap_table" in st.session_state.jobs:
+                job_status("verify_cap_table", "Verifying cap table against supporting documents")
             
             # Display verification results
             if "verification_results" in st.session_state and st.session_state.verification_results:
@@ -541,6 +482,15 @@ def main():
                 # Display verification status for each category
                 st.subheader("Verification Results")
                 
+                # Document facts sent with the last verification request
+                context = st.session_state.verification_results.get("context")
+                if context:
+                    st.caption(
+                        f"Packed {context['packed_documents']} of {context['documents']} documents ({context['packed_tokens']:,} tokens); "
+                        f"dropped {context['dropped_documents']} ({context['dropped_tokens']:,} tokens). "
+                        f"{context.get('cache_read_tokens', 0):,} prompt tokens read from cache, {context.get('cache_write_tokens', 0):,} written."
+                    )
+                
                 for category, result in verification_categories.items():
                     with st.expander(f"{category.replace('_', ' ').title()} - {'✅ Verified' if result.get('verified', False) else '❌ Issues Found'}"):
                         st.write(result.get("notes", "No notes available"))
@@ -557,10 +507,13 @@ def main():
                             "low": "green"
                         }.get(severity, "black")
                         
-                        st.markdown(f"**{i+1}. {discrepancy.get('type', 'Issue')}** - <span style='color:{severity_color}'>{severity.upper()}</span>", unsafe_allow_html=True)
-                        st.write(discrepancy.get("description", "No description available"))
-                        st.write(f"*Recommendation: {discrepancy.get('recommendation', 'None provided')}*")
-                        st.divider()
+                        # One element per discrepancy keeps reruns fast with hundreds of them
+                        st.markdown(
+                            f"**{i+1}. {discrepancy.get('type', 'Issue')}** - <span style='color:{severity_color}'>{severity.upper()}</span>\n\n"
+                            f"{discrepancy.get('description', 'No description available')}\n\n"
+                            f"*Recommendation: {discrepancy.get('recommendation', 'None provided')}*\n\n---",
+                            unsafe_allow_html=True
+                        )
                 
                 # Display recommendations
                 recommendations = st.session_state.verification_results.get("recommendations", [])
@@ -577,12 +530,11 @@ def main():
             st.warning("Please verify the cap table first (in the Verification tab)")
         else:
             if "remediation_plan" not in st.session_state or not st.session_state.remediation_plan:
-                if st.button("Generate Remediation Plan"):
-                    with st.spinner("Generating remediation plan..."):
-                        plan = generate_remediation(st.session_state.verification_results, st.session_state.api_key)
-                        if plan:
-                            st.session_state.remediation_plan = plan
-                            st.success("Remediation plan generated")
+                if st.button("Generate Remediation Plan", disabled="generate_remediation" in st.session_state.jobs):
+                    payload = {"verification_results": st.session_state.verification_results}
+                    track_job(get_job_queue().submit("generate_remediation", payload, st.session_state.api_key))
+                if "generate_remediation" in st.session_state.jobs:
+                    job_status("generate_remediation", "Generating remediation plan")
             
             # Display remediation plan
             if "remediation_plan" in st.session_state and st.session_state.remediation_plan:
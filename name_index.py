@@ -0,0 +1,114 @@
+import math
+import re
+from array import array
+
+import numpy as np
+
+LEGAL_SUFFIXES = r"\b(inc|incorporated|llc|l l c|lp|l p|llp|ltd|limited|corp|corporation|co|company|plc|gmbh)\b"
+_PUNCTUATION = re.compile(r"[^a-z0-9]+")
+_LEGAL_SUFFIXES = re.compile(LEGAL_SUFFIXES)
+# Words that vary between spellings of the same entity ("Acme Ventures Fund II" and
+# "Acme Ventures II") and are ignored when matching
+NOISE_WORDS = {"the", "and", "of", "fund"}
+
+# Default minimum similarity (Dice coefficient over character trigrams) for a match
+NAME_MATCH_THRESHOLD = 0.6
+
+# Key for fuzzy matching: lowercase words without punctuation, legal suffixes or
+# noise words, in their original order
+def match_key(name):
+    words = _LEGAL_SUFFIXES.sub(" ", _PUNCTUATION.sub(" ", str(name).lower())).split()
+    return " ".join(word for word in words if word not in NOISE_WORDS)
+
+# Character trigrams of each word padded with spaces, so word order doesn't matter
+def _grams(key):
+    grams = set()
+    for word in key.split():
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+# Fuzzy index over stakeholder names. Names are blocked by character trigram: a query
+# only scores names that share one of its rarest trigrams, enough of them that no
+# name above the threshold is missed, so a lookup touches a small fraction of a
+# large ledger. Candidates are scored together with NumPy. Names can be added at
+# any time; names with the same match key share one ID.
+class NameIndex:
+    def __init__(self, names=(), threshold=NAME_MATCH_THRESHOLD):
+        self.threshold = threshold
+        self.names = []
+        self._ids = {}
+        self._gram_ids = {}
+        self._postings = []
+        # Every name's trigram IDs back to back, with each name's offset and count.
+        # Queries read them through NumPy views without copying.
+        self._grams = array("i")
+        self._offsets = array("q")
+        self._lengths = array("q")
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    # Add a name and return its ID
+    def add(self, name):
+        key = match_key(name)
+        name_id = self._ids.get(key)
+        if name_id is not None:
+            return name_id
+
+        name_id = self._ids[key] = len(self.names)
+        self.names.append(name)
+        gram_ids = []
+        postings = self._postings
+        for gram in _grams(key):
+            gram_id = self._gram_ids.setdefault(gram, len(postings))
+            if gram_id == len(postings):
+                postings.append([])
+            postings[gram_id].append(name_id)
+            gram_ids.append(gram_id)
+        self._offsets.append(len(self._grams))
+        self._lengths.append(len(gram_ids))
+        self._grams.extend(gram_ids)
+        return name_id
+
+    # Up to limit (name ID, score) pairs with score at least threshold, best first;
+    # every such pair when limit is None
+    def query(self, name, limit=5, threshold=None):
+        threshold = self.threshold if threshold is None else threshold
+        grams = _grams(match_key(name))
+        if not grams or not self.names:
+            return []
+
+        # A name scoring at least threshold shares at least min_shared of the query's
+        # trigrams, so it shares one of any len(grams) - min_shared + 1 of them. The
+        # small margin keeps float rounding (0.6 * 7 / 1.4 is just above 3) from
+        # raising the bound and pruning names that score exactly the threshold.
+        min_shared = max(1, math.ceil(threshold * len(grams) / (2 - threshold) - 1e-9))
+        known = [self._gram_ids[gram] for gram in grams if gram in self._gram_ids]
+        if len(known) < min_shared:
+            return []
+        known.sort(key=lambda gram_id: len(self._postings[gram_id]))
+        blocking = known[:len(known) - min_shared + 1]
+        candidates = np.unique(np.concatenate([np.asarray(self._postings[gram_id], dtype=np.int64) for gram_id in blocking]))
+
+        # Shared trigrams per candidate: gather the candidates' trigrams from the flat
+        # array, flag those in the query and sum the flags per candidate
+        lengths = np.frombuffer(self._lengths, dtype=np.int64)[candidates]
+        starts = np.cumsum(lengths) - lengths
+        positions = np.repeat(np.frombuffer(self._offsets, dtype=np.int64)[candidates] - starts, lengths) + np.arange(lengths.sum())
+        in_query = np.zeros(len(self._postings), dtype=bool)
+        in_query[known] = True
+        hits = in_query[np.frombuffer(self._grams, dtype=np.int32)[positions]]
+        shared = np.add.reduceat(hits, starts)
+        scores = 2 * shared / (len(grams) + lengths)
+
+        keep = np.flatnonzero(scores >= threshold)
+        best = keep[np.argsort(-scores[keep], kind="stable")[:limit]]
+        return [(int(candidates[i]), float(scores[i])) for i in best]
+
+    # The best matching name and its score, or None
+    def best(self, name, threshold=None):
+        matches = self.query(name, limit=1, threshold=threshold)
+        return (self.names[matches[0][0]], matches[0][1]) if matches else None
@@ -0,0 +1,120 @@
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+
+# Words per shingle, MinHash permutations, and LSH bands (rows per band is
+# NUM_PERMUTATIONS // LSH_BANDS). 16 bands of 8 rows make pairs above about 0.7
+# estimated similarity likely to share a bucket.
+SHINGLE_WORDS = 3
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 16
+# Minimum estimated Jaccard similarity of shingles for two documents to be near-duplicates
+NEAR_DUPLICATE_THRESHOLD = 0.8
+# Shingles hashed per block, bounding memory for long documents
+SHINGLE_BLOCK = 8192
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240611)
+_A = _rng.integers(1, _PRIME, NUM_PERMUTATIONS, dtype=np.uint64)[:, None]
+_B = _rng.integers(0, _PRIME, NUM_PERMUTATIONS, dtype=np.uint64)[:, None]
+
+_WORD = re.compile(r"[A-Za-z0-9$/][A-Za-z0-9$/.,%-]*")
+# Words that mark a copy as a draft or as executed, ignored when comparing facts
+EXECUTION_MARKERS = {"draft", "execution", "executed", "version", "final", "confidential", "signed"}
+EXECUTED_FILENAME = re.compile(r"execut|signed|final|conformed", re.IGNORECASE)
+DRAFT_FILENAME = re.compile(r"draft|redline|blackline|comments|markup|\bv\d+\b", re.IGNORECASE)
+
+# MinHash signature of a text's word shingles (lowercased), or None for texts too
+# short to shingle
+def minhash(text):
+    words = [word.lower().rstrip(".,") for word in _WORD.findall(text)]
+    if len(words) < SHINGLE_WORDS:
+        return None
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles)) % _PRIME
+    signature = np.full(NUM_PERMUTATIONS, _PRIME, dtype=np.uint64)
+    for start in range(0, len(hashes), SHINGLE_BLOCK):
+        block = hashes[start:start + SHINGLE_BLOCK]
+        np.minimum(signature, ((_A * block + _B) % _PRIME).min(axis=1), out=signature)
+    return signature
+
+# Counts of the numbers and capitalized words (amounts, dates, names) in a text.
+# Copies of one agreement state the same facts; one may lack some (a draft's blank
+# signature block).
+def fact_tokens(text):
+    tokens = Counter()
+    for word in _WORD.findall(text):
+        word = word.rstrip(".,")
+        if any(char.isdigit() for char in word):
+            tokens[word.replace(",", "")] += 1
+        elif word[:1].isupper() and word.lower() not in EXECUTION_MARKERS:
+            tokens[word] += 1
+    return tokens
+
+# Whether two copies' facts agree: one's facts include all of the other's, as often.
+# Forms filled in for different holders, amounts or dates fail this however similar
+# the rest of their text is.
+def facts_agree(tokens, other):
+    return tokens <= other or other <= tokens
+
+# How strongly a copy looks like the executed version: its filename says executed
+# or signed rather than draft, and its text carries conformed signatures
+def execution_score(filename, text):
+    score = 0
+    if EXECUTED_FILENAME.search(filename or ""):
+        score += 2
+    if DRAFT_FILENAME.search(filename or ""):
+        score -= 2
+    if "/s/" in text:
+        score += 1
+    if re.search(r"\bDRAFT\b", text[:5000]):
+        score -= 1
+    return score
+
+# What a copy is matched on, kept with its document so later uploads can be compared
+# with it: its MinHash signature (as a list), fact tokens and execution score. None
+# for texts too short to shingle.
+def copy_features(filename, text):
+    signature = minhash(text)
+    if signature is None:
+        return None
+    return {"signature": signature.tolist(), "facts": dict(fact_tokens(text)), "execution_score": execution_score(filename, text)}
+
+# Locality-sensitive hashing over MinHash signatures. Each signature is split into
+# bands and a document is compared only with documents sharing a band's bucket, so
+# finding near-duplicates among n documents takes about linear time.
+class NearDuplicateIndex:
+    def __init__(self, threshold=NEAR_DUPLICATE_THRESHOLD, bands=LSH_BANDS):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = NUM_PERMUTATIONS // bands
+        self.signatures = {}
+        self._buckets = {}
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def _band_keys(self, signature):
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    # Keys of indexed documents at least threshold similar to signature (an array or a
+    # list), most similar first, as (key, estimated similarity) pairs
+    def query(self, signature):
+        signature = np.asarray(signature, dtype=np.uint64)
+        candidates = set()
+        for band_key in self._band_keys(signature):
+            candidates.update(self._buckets.get(band_key, ()))
+        matches = []
+        for key in candidates:
+            similarity = float(np.mean(self.signatures[key] == signature))
+            if similarity >= self.threshold:
+                matches.append((key, similarity))
+        return sorted(matches, key=lambda match: -match[1])
+
+    def add(self, key, signature):
+        signature = np.asarray(signature, dtype=np.uint64)
+        self.signatures[key] = signature
+        for band_key in self._band_keys(signature):
+            self._buckets.setdefault(band_key, []).append(key)
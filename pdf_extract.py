@@ -0,0 +1,127 @@
+import bisect
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+# PDFs with at least this many pages are split across the process pool
+PARALLEL_PAGE_THRESHOLD = 150
+# Pages handled by one process pool task
+PAGES_PER_TASK = 40
+# Upper bound on process pool size
+MAX_PDF_WORKERS = min(4, os.cpu_count() or 1)
+# Memory budget for PDF extraction. Each in-flight task parses its own copy of the
+# document, which costs roughly WORKER_MEMORY_FACTOR times the file size.
+PDF_MEMORY_BUDGET = int(os.environ.get("DILIGIZE_PDF_MEMORY_BUDGET", 1024 * 1024 * 1024))
+WORKER_MEMORY_FACTOR = 6
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Shared process pool, started on first use. Spawned rather than forked because
+# extraction is called from worker threads.
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=MAX_PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+# Yield (page_number, text) for each page in [start, stop). Pages that have no
+# extractable text, or that fail to parse, yield an empty string.
+def iter_pdf_pages(source, start=0, stop=None):
+    from PyPDF2 import PdfReader
+    reader = source if isinstance(source, PdfReader) else PdfReader(source)
+    pages = reader.pages
+    stop = len(pages) if stop is None else min(stop, len(pages))
+    for page_number in range(start, stop):
+        try:
+            text = pages[page_number].extract_text() or ""
+        except Exception:
+            text = ""
+        yield page_number, text
+
+# Process pool task: extract one page range from a PDF on disk
+def _extract_page_range(path, start, stop):
+    with open(path, "rb") as f:
+        return [text for _, text in iter_pdf_pages(f, start, stop)]
+
+# Join page texts into one string. page_offsets[i] is the character offset where page i starts.
+def _join_pages(page_texts):
+    page_offsets = []
+    offset = 0
+    for text in page_texts:
+        page_offsets.append(offset)
+        offset += len(text) + 1
+    return "".join(f"{text}\n" for text in page_texts), page_offsets
+
+def _stream_size(stream):
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+# Number of tasks that may run at once without exceeding the memory budget
+def _max_in_flight(file_size, memory_budget):
+    per_task = max(1, file_size * WORKER_MEMORY_FACTOR)
+    return max(1, min(MAX_PDF_WORKERS, memory_budget // per_task))
+
+# Extract page texts from a large PDF using the process pool, keeping at most
+# max_in_flight page ranges parsing at once
+def _extract_parallel(stream, page_count, max_in_flight):
+    ranges = [(start, min(start + PAGES_PER_TASK, page_count)) for start in range(0, page_count, PAGES_PER_TASK)]
+    page_texts = [None] * len(ranges)
+
+    # Workers read the document from a temporary file instead of receiving a pickled copy
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            stream.seek(0)
+            shutil.copyfileobj(stream, f)
+
+        pool = _get_pool()
+        pending = {}
+        next_range = 0
+        while next_range < len(ranges) or pending:
+            while next_range < len(ranges) and len(pending) < max_in_flight:
+                start, stop = ranges[next_range]
+                pending[pool.submit(_extract_page_range, path, start, stop)] = next_range
+                next_range += 1
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                page_texts[pending.pop(future)] = future.result()
+    finally:
+        os.remove(path)
+
+    return [text for texts in page_texts for text in texts]
+
+# Extract the text of a PDF from a path or seekable binary stream.
+# Returns (text, page_offsets). Each page's text is followed by a newline.
+def extract_pdf_pages(source, parallel=True, memory_budget=PDF_MEMORY_BUDGET):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return extract_pdf_pages(f, parallel, memory_budget)
+
+    # Imported here so that importing this module stays cheap
+    from PyPDF2 import PdfReader
+    source.seek(0)
+    reader = PdfReader(source)
+    page_count = len(reader.pages)
+    max_in_flight = _max_in_flight(_stream_size(source), memory_budget)
+
+    if parallel and page_count >= PARALLEL_PAGE_THRESHOLD and max_in_flight > 1:
+        del reader
+        page_texts = _extract_parallel(source, page_count, max_in_flight)
+    else:
+        page_texts = [text for _, text in iter_pdf_pages(reader)]
+
+    return _join_pages(page_texts)
+
+# Map a character offset back to its page number (0-based)
+def page_for_offset(page_offsets, offset):
+    if not page_offsets:
+        return None
+    return max(0, bisect.bisect_right(page_offsets, offset) - 1)
@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+# Caches, stores and job records go to a scratch directory, set before the
+# modules that read these variables are imported
+_scratch = tempfile.mkdtemp(prefix="diligize-tests-")
+for name, path in [
+    ("DILIGIZE_CACHE_DIR", "cache"),
+    ("DILIGIZE_STORE_DIR", "documents"),
+    ("DILIGIZE_JOBS_DIR", "jobs"),
+    ("DILIGIZE_WORKSPACE_DB", "workspaces.db"),
+]:
+    os.environ.setdefault(name, os.path.join(_scratch, path))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,55 @@
+import pandas as pd
+
+from cap_columns import CONFIDENCE_THRESHOLD, header_signature, infer_column_mapping, mapping_fits
+
+HOLDERS = ["Jane Smith", "John Doe", "Acme Ventures II, L.P.", "Priya Patel", "Wei Chen", "Maria Garcia"]
+
+# A ledger export with one row per certificate, so holders repeat across grants
+def _ledger(columns):
+    rows = []
+    for i in range(60):
+        rows.append(dict(zip(columns, [
+            HOLDERS[i % len(HOLDERS)], f"CS-{i + 1}", "Common" if i % 3 else "Series A Preferred",
+            f"2021-{i % 12 + 1:02d}-15", 1000 * (i + 1), "$0.10" if i % 3 else "$1.25"
+        ])))
+    return pd.DataFrame(rows)
+
+def test_exact_headers_skip_the_llm_with_repeated_holders():
+    df = _ledger(["Stakeholder Name", "Certificate ID", "Share Class", "Issue Date", "Quantity", "Price per Share"])
+    mapping, confidence = infer_column_mapping(df)
+    assert confidence >= CONFIDENCE_THRESHOLD
+    assert mapping == {
+        "stakeholder": "Stakeholder Name", "share_class": "Share Class", "date": "Issue Date",
+        "shares": "Quantity", "price": "Price per Share"
+    }
+
+def test_unrecognized_headers_still_go_to_the_llm():
+    df = _ledger(["Column A", "Column B", "Column C", "Column D", "Column E", "Column F"])
+    _, confidence = infer_column_mapping(df)
+    assert confidence < CONFIDENCE_THRESHOLD
+
+def test_mapping_fits_rejects_malformed_mappings():
+    df = _ledger(["Stakeholder Name", "Certificate ID", "Share Class", "Issue Date", "Quantity", "Price per Share"])
+    assert mapping_fits({"stakeholder": "Stakeholder Name", "shares": "Quantity", "percentage": None}, df)
+    assert not mapping_fits({"stakeholder": ["Stakeholder Name"], "shares": "Quantity"}, df)
+    assert not mapping_fits({"stakeholder": "Holder", "shares": "Quantity"}, df)
+    assert not mapping_fits({"holders": "Stakeholder Name"}, df)
+    assert not mapping_fits(["Stakeholder Name"], df)
+    assert not mapping_fits(None, df)
+
+# A malformed mapping from Claude is neither used nor cached, so later uploads with
+# the same headers still parse
+def test_invalid_llm_mapping_is_not_cached(monkeypatch):
+    import engine
+    from engine import NamedBytesIO, parse_cap_table
+
+    df = _ledger(["Column A", "Column B", "Column C", "Column D", "Column E", "Column F"])
+    requests = []
+    monkeypatch.setattr(engine, "request_column_mapping", lambda df, api_key: requests.append(df) or {"stakeholder": ["Column A"], "shares": "Column E"})
+    data = df.to_csv(index=False).encode("utf-8")
+    for _ in range(2):
+        cap_table = parse_cap_table(NamedBytesIO(data, "cap_table.csv"), "key")
+        assert cap_table is not None
+        assert cap_table["column_mapping"] == infer_column_mapping(df)[0]
+    assert len(requests) == 2
+    assert engine.get_document_cache().get("column_mapping", header_signature(df.columns)) is None
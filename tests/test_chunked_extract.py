@@ -0,0 +1,17 @@
+from chunked_extract import merge_partials
+
+# A conflicting value found in several chunks is reported once, from its first chunk
+def test_repeated_conflicts_are_reported_once():
+    merged = merge_partials([
+        ({"chunk": 0}, {"purchaser": "Acme Ventures II, L.P.", "shares": 120000}),
+        ({"chunk": 1}, {"purchaser": "Acme Ventures II, L.P.", "shares": 125000}),
+        ({"chunk": 2}, {"shares": 125000}),
+        ({"chunk": 3}, {"shares": 130000}),
+        ({"chunk": 4}, {"shares": 125000}),
+    ])
+    assert merged["shares"] == 120000
+    assert merged["_conflicts"] == [
+        {"field": "shares", "value": 125000, "source": {"chunk": 1}},
+        {"field": "shares", "value": 130000, "source": {"chunk": 3}},
+    ]
+    assert merged["_provenance"]["purchaser"] == [{"chunk": 0}, {"chunk": 1}]
@@ -0,0 +1,19 @@
+import random
+
+from benchmarks.synthetic import synthetic_lines
+from classifier import classify, classify_batch
+
+TITLES = ["STOCK PURCHASE AGREEMENT", "NOTICE OF STOCK OPTION GRANT", "WARRANT TO PURCHASE SHARES", "MEMORANDUM"]
+
+def _documents(count):
+    rng = random.Random(0)
+    return [f"{rng.choice(TITLES)}\n" + "\n".join(synthetic_lines(20, rng)) for _ in range(count)]
+
+# A batch spread over a process pool gives the same results, in order, as one
+# classify call per document
+def test_classify_batch_matches_classify():
+    texts = _documents(40)
+    expected = [classify(text) for text in texts]
+    assert classify_batch(texts) == expected
+    assert classify_batch(texts, processes=2, chunksize=8) == expected
+    assert {category for category, _ in expected} >= {"Stock Purchase Agreement", "Option Grant", "Warrant Agreement"}
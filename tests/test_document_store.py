@@ -0,0 +1,36 @@
+import os
+import time
+
+from doc_cache import directory_entries
+from document_store import DocumentStore
+
+def _stored_bytes(store):
+    return sum(size for _, size, _ in directory_entries(store.store_dir))
+
+# The least recently used contents are removed once the store passes its limit
+def test_store_evicts_least_recently_used(tmp_path):
+    store = DocumentStore(str(tmp_path), memory_limit=0, max_bytes=3000)
+    texts = {f"{i:02d}" * 32: os.urandom(600).hex() for i in range(3)}
+    for key, text in texts.items():
+        store.put_text(key, text)
+        time.sleep(0.01)
+    first = next(iter(texts))
+    assert store.get_text(first) == texts[first]
+
+    for i in range(3, 6):
+        store.put_text(f"{i:02d}" * 32, os.urandom(600).hex())
+        time.sleep(0.01)
+    assert _stored_bytes(store) <= 3000
+    assert store.get_text(first) == texts[first]
+    assert store.get_text("01" * 32) is None
+
+# Read contents stay in memory up to the limit
+def test_reads_are_held_in_memory(tmp_path):
+    store = DocumentStore(str(tmp_path), memory_limit=10)
+    store.put_text("aa" * 32, "abcdef")
+    store.put_text("bb" * 32, "ghijkl")
+    assert store.get_text("aa" * 32) == "abcdef"
+    assert store.get_text("aa" * 32) == "abcdef"
+    assert store.get_text("bb" * 32) == "ghijkl"
+    stats = store.stats()
+    assert (stats["hits"], stats["loads"], stats["resident_bytes"]) == (1, 2, 6)
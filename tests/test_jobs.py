@@ -0,0 +1,60 @@
+import contextvars
+import time
+
+import instrumentation
+from jobs import ACTIVE_STATUSES, JOB_HANDLERS, JobQueue
+
+def _wait(queue, job_id):
+    deadline = time.monotonic() + 30
+    while queue.status(job_id)["status"] in ACTIVE_STATUSES:
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+    return queue.status(job_id)
+
+# A document that fails text extraction is a per-file error, and the reason the
+# engine logged from its worker thread is in the job's log
+def test_document_extraction_errors_reach_the_job(tmp_path):
+    queue = JobQueue(JOB_HANDLERS, jobs_dir=str(tmp_path))
+    files = [("broken.pdf", b"not a pdf")]
+    job_id = queue.submit("process_documents", {"files": files}, "key")
+    status = _wait(queue, job_id)
+
+    assert status["status"] == "done"
+    results = queue.result(job_id)["results"]
+    assert results[0]["error"] == "No text could be extracted"
+    assert [entry["level"] for entry in status["log"]] == ["error"]
+    assert "broken.pdf" in status["log"][0]["message"]
+
+# A cap table that cannot be read fails the job with the logged reason alongside
+def test_cap_table_errors_reach_the_job(tmp_path):
+    queue = JobQueue(JOB_HANDLERS, jobs_dir=str(tmp_path))
+    job_id = queue.submit("parse_cap_table", {"file": ("bad.csv", b"\xff\xfe\x00garbage\x00\n\x00")}, "key")
+    status = _wait(queue, job_id)
+
+    assert status["status"] == "failed"
+    assert status["error"] == "Could not parse cap table bad.csv"
+    assert any(entry["message"].startswith("Error parsing cap table") for entry in status["log"])
+
+    # The log starts over when the job is resumed
+    queue.resume(job_id, "key")
+    assert _wait(queue, job_id)["log"] == status["log"]
+
+# Stages a job runs are recorded for the session that submitted it, not for others
+def test_jobs_record_to_their_session(tmp_path):
+    @instrumentation.stage("session_work")
+    def work(job):
+        return job.payload
+
+    queue = JobQueue({"work": work}, jobs_dir=str(tmp_path))
+    recorders = [instrumentation.Recorder(), instrumentation.Recorder()]
+
+    def session(recorder, runs):
+        instrumentation.use_recorder(recorder)
+        for _ in range(runs):
+            _wait(queue, queue.submit("work", {}, "key"))
+        return instrumentation.stage_summary()
+
+    summaries = [contextvars.copy_context().run(session, recorder, runs) for recorder, runs in zip(recorders, [1, 2])]
+    assert [summary["session_work"]["calls"] for summary in summaries] == [1, 2]
+    assert [len(recorder.spans) for recorder in recorders] == [1, 2]
+    assert "session_work" not in instrumentation.stage_summary()
@@ -0,0 +1,40 @@
+import threading
+from types import SimpleNamespace
+
+import engine
+import llm
+from benchmarks.mock_llm import _cache_usage
+from context_packer import CACHE_CONTROL, CACHE_MIN_TOKENS, cached_text
+from llm import RateLimiter
+
+def test_set_limits_caps_capacity():
+    limiter = RateLimiter(60, 6000)
+    limiter.set_limits(15, 1500)
+    assert (limiter.requests_per_minute, limiter.tokens_per_minute) == (15, 1500)
+    assert limiter.acquire(4000) == 1500
+    assert limiter._tokens <= 0
+
+# Worker processes split the account limits between them
+def test_share_limits(monkeypatch):
+    limiter = RateLimiter(llm.REQUESTS_PER_MINUTE, llm.TOKENS_PER_MINUTE)
+    monkeypatch.setattr(llm, "limiter", limiter)
+    llm.share_limits(4)
+    assert limiter.requests_per_minute == llm.REQUESTS_PER_MINUTE / 4
+    assert limiter.tokens_per_minute == llm.TOKENS_PER_MINUTE / 4
+
+# The mock reports cache reads only as the API does: for a model that supports
+# prompt caching and a prefix of at least the minimum length
+def test_mock_cache_usage_follows_api_limits():
+    server = SimpleNamespace(lock=threading.Lock(), cached_prefixes=set())
+    long_documents = cached_text("x" * 4 * (CACHE_MIN_TOKENS + 100))
+    short_documents = {"type": "text", "text": "short", "cache_control": CACHE_CONTROL}
+
+    def request(model, block):
+        return {"model": model, "system": "checklist", "messages": [{"role": "user", "content": [block, {"type": "text", "text": "verify"}]}]}
+
+    assert "cache_control" in long_documents and "cache_control" not in cached_text("short")
+    assert _cache_usage(server, request(engine.MODEL, long_documents))[1] > 0
+    assert _cache_usage(server, request(engine.MODEL, long_documents))[2] > 0
+    for _ in range(2):
+        assert _cache_usage(server, request(engine.MODEL, short_documents))[1:] == (0, 0)
+        assert _cache_usage(server, request("claude-3-sonnet-20240229", long_documents))[1:] == (0, 0)
@@ -0,0 +1,21 @@
+import random
+
+from benchmarks.bench_name_index import all_pairs, ledger_names, variant
+from name_index import NAME_MATCH_THRESHOLD, NameIndex, _grams, match_key
+
+# The index finds exactly the names a scan of every name finds, including names
+# scoring exactly the threshold
+def test_index_matches_brute_force():
+    rng = random.Random(7)
+    names = ledger_names(3000, seed=3)
+    index = NameIndex(names)
+    ledger_grams = [_grams(match_key(name)) for name in index.names]
+    queries = [variant(rng.choice(names), rng) for _ in range(300)] + ["John Dough", "Acme", "Ka Lo"]
+    for threshold in [NAME_MATCH_THRESHOLD, 0.5, 0.75]:
+        for query in queries:
+            found = {name_id for name_id, _ in index.query(query, limit=None, threshold=threshold)}
+            assert found == all_pairs(query, ledger_grams, threshold), query
+
+# "abc" has 3 trigrams, all among the 7 of "abc defg": Dice 6 / 10, exactly 0.6
+def test_match_scoring_exactly_the_threshold():
+    assert NameIndex(["abc"]).query("abc defg", threshold=0.6) == [(0, 0.6)]
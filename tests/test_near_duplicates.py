@@ -0,0 +1,165 @@
+import pickle
+import random
+import threading
+import time
+
+import engine
+from benchmarks.synthetic import synthetic_lines
+from document_store import DocumentStore
+from engine import NamedBytesIO, add_processed_documents, earlier_copies, process_documents
+from jobs import ACTIVE_STATUSES, JOB_HANDLERS, JobQueue
+from workspace import WorkspaceDB
+
+BODY = "\n".join(synthetic_lines(80, random.Random(0)))
+SPA = "STOCK PURCHASE AGREEMENT\nAcme Ventures II, L.P. purchases 120,000 shares of Series A Preferred Stock at $1.2500 per share on 2021-06-30\n" + BODY
+
+# A more executed copy parsed while the first canonical copy is still extracting
+# takes over its followers, and every copy points at it
+def test_replaced_canonical_while_extraction_pending(monkeypatch):
+    executed = SPA + "\nBy: /s/ Jane Smith"
+    files = [
+        NamedBytesIO(SPA.encode(), "spa_copy1.txt"),
+        NamedBytesIO(SPA.replace("\n", "\n\n").encode(), "spa_copy2.txt"),
+        NamedBytesIO(executed.encode(), "spa_executed.txt"),
+    ]
+    executed_extracted = threading.Event()
+    extracted = []
+
+    # copy1's extraction finishes only after the executed copy's has started
+    def fake_extract(text, document_type, api_key, file_hash, cache, page_offsets=None):
+        extracted.append(text)
+        if text == executed:
+            executed_extracted.set()
+        else:
+            assert executed_extracted.wait(10)
+        return {"text": text[:20]}
+
+    monkeypatch.setattr(engine, "extract_document_info_cached", fake_extract)
+    results = process_documents(files, "key", parse_workers=1, max_extractions=2)
+
+    executed_hash = results[2]["file_hash"]
+    assert [result["error"] for result in results] == [None, None, None]
+    assert len(extracted) == 2
+    assert results[0]["duplicate_of"] == executed_hash
+    assert results[1]["duplicate_of"] == executed_hash
+    assert results[2]["duplicate_of"] is None
+    assert results[1]["info"] == results[2]["info"]
+
+    documents = add_processed_documents({}, files, results, DocumentStore(memory_limit=0))
+    doc_ids = {doc["filename"]: doc_id for doc_id, doc in documents.items()}
+    assert documents[doc_ids["spa_copy1.txt"]]["duplicate_of"] == doc_ids["spa_executed.txt"]
+    assert documents[doc_ids["spa_copy2.txt"]]["duplicate_of"] == doc_ids["spa_executed.txt"]
+
+# Chains left by earlier uploads resolve to the final canonical copy
+def test_add_processed_documents_resolves_chains():
+    files = [NamedBytesIO(text.encode(), name) for name, text in [("a.txt", "a"), ("b.txt", "b"), ("c.txt", "c")]]
+    results = [
+        {"content": text, "category": "Stock Purchase Agreement", "category_confidence": 1.0, "info": {}, "file_hash": name,
+         "page_offsets": None, "tables": None, "duplicate_of": duplicate_of, "error": None}
+        for name, text, duplicate_of in [("a", "a", "b"), ("b", "b", "c"), ("c", "c", None)]
+    ]
+    documents = add_processed_documents({}, files, results, DocumentStore(memory_limit=0))
+    doc_ids = {doc["filename"]: doc_id for doc_id, doc in documents.items()}
+    assert documents[doc_ids["a.txt"]]["duplicate_of"] == doc_ids["c.txt"]
+    assert documents[doc_ids["b.txt"]]["duplicate_of"] == doc_ids["c.txt"]
+    assert documents[doc_ids["c.txt"]]["duplicate_of"] is None
+
+# An executed copy uploaded after its draft was added replaces it: the draft and the
+# copy that followed it reuse the executed copy's info, also once saved to and
+# loaded from a workspace. A draft uploaded later still is not extracted.
+def test_later_uploads_match_earlier_documents(monkeypatch):
+    extracted = []
+
+    def fake_extract(text, document_type, api_key, file_hash, cache, page_offsets=None):
+        extracted.append(text)
+        return {"text": text[:20]}
+
+    monkeypatch.setattr(engine, "extract_document_info_cached", fake_extract)
+    executed = SPA + "\nBy: /s/ Jane Smith"
+    batches = [
+        [("spa_draft.txt", "DRAFT\n" + SPA), ("spa_draft_copy.txt", "DRAFT\n\n" + SPA.replace("\n", "\n\n"))],
+        [("spa_executed.txt", executed)],
+        [("spa_draft_v2.txt", "DRAFT\n" + SPA + "\n")],
+    ]
+    db = WorkspaceDB(":memory:")
+    workspace_id = db.open("deal")
+    documents = {}
+    for batch in batches:
+        files = [NamedBytesIO(text.encode(), name) for name, text in batch]
+        before = {doc_id: doc["duplicate_of"] for doc_id, doc in documents.items()}
+        results = process_documents(files, "key", parse_workers=1, earlier=earlier_copies(documents))
+        add_processed_documents(documents, files, results, DocumentStore(memory_limit=0))
+        db.save_documents(workspace_id, {doc_id: doc for doc_id, doc in documents.items() if before.get(doc_id, "new") != doc["duplicate_of"]})
+
+    assert extracted == ["DRAFT\n" + SPA, executed]
+    doc_ids = {doc["filename"]: doc_id for doc_id, doc in documents.items()}
+    for name in ["spa_draft.txt", "spa_draft_copy.txt", "spa_draft_v2.txt"]:
+        assert documents[doc_ids[name]]["duplicate_of"] == doc_ids["spa_executed.txt"]
+    assert documents[doc_ids["spa_draft_v2.txt"]]["info"] == documents[doc_ids["spa_executed.txt"]]["info"]
+
+    saved = db.documents(workspace_id)
+    assert [doc["filename"] for doc in saved.values()] == [name for batch in batches for name, _ in batch]
+    assert {doc_id: doc["duplicate_of"] for doc_id, doc in saved.items()} == {doc_id: doc["duplicate_of"] for doc_id, doc in documents.items()}
+    assert earlier_copies(saved) == earlier_copies(documents)
+
+# Copies that completed before their canonical copy was replaced are reported again
+# with the new duplicate_of, so a job can checkpoint them again
+def test_replaced_canonical_reports_completed_copies(monkeypatch):
+    monkeypatch.setattr(engine, "extract_document_info_cached", lambda text, *args, **kwargs: {"text": text[:20]})
+    drafts_done = threading.Event()
+    parse = engine.parse_document
+
+    # The executed copy is parsed only after both drafts completed
+    def parse_after_drafts(file, cache):
+        if file.name == "spa_executed.txt":
+            assert drafts_done.wait(10)
+        return parse(file, cache)
+
+    monkeypatch.setattr(engine, "parse_document", parse_after_drafts)
+    files = [
+        NamedBytesIO(("DRAFT\n" + SPA).encode(), "spa_draft.txt"),
+        NamedBytesIO(("DRAFT\n\n" + SPA).encode(), "spa_draft_copy.txt"),
+        NamedBytesIO((SPA + "\nBy: /s/ Jane Smith").encode(), "spa_executed.txt"),
+    ]
+    reported = []
+
+    def on_progress(completed, total, file, result):
+        if completed == 2:
+            drafts_done.set()
+
+    results = process_documents(files, "key", on_progress=on_progress, parse_workers=1,
+                                on_replaced=lambda file, result: reported.append((file.name, result["duplicate_of"])))
+
+    executed_hash = results[2]["file_hash"]
+    assert sorted(reported) == [("spa_draft.txt", executed_hash), ("spa_draft_copy.txt", executed_hash)]
+    assert [result["duplicate_of"] for result in results] == [executed_hash, executed_hash, None]
+
+# A resumed job matches its remaining uploads against documents checkpointed by the
+# interrupted run, and checkpoints a copy again when a later upload replaced it
+def test_resumed_job_replaces_checkpointed_copy(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, "extract_document_info_cached", lambda text, *args, **kwargs: {"text": text[:20]})
+    files = [("spa_draft.txt", ("DRAFT\n" + SPA).encode()), ("spa_executed.txt", (SPA + "\nBy: /s/ Jane Smith").encode())]
+    draft_result = process_documents([NamedBytesIO(files[0][1], files[0][0])], "key")[0]
+
+    # The first run is interrupted after the draft was checkpointed
+    def handler(job):
+        if not job.checkpoints():
+            job.checkpoint(0, draft_result)
+            raise RuntimeError("interrupted")
+        return JOB_HANDLERS["process_documents"](job)
+
+    queue = JobQueue({"process_documents": handler}, jobs_dir=str(tmp_path))
+    job_id = queue.submit("process_documents", {"files": files}, "key")
+    for _ in range(2):
+        deadline = time.monotonic() + 30
+        while queue.status(job_id)["status"] in ACTIVE_STATUSES:
+            assert time.monotonic() < deadline
+            time.sleep(0.02)
+        if queue.status(job_id)["status"] == "failed":
+            queue.resume(job_id, "key")
+
+    results = queue.result(job_id)["results"]
+    assert results[1]["replaces"] == [draft_result["file_hash"]]
+    assert results[0]["duplicate_of"] == results[1]["file_hash"]
+    with open(tmp_path / job_id / "checkpoints" / "0.pkl", "rb") as f:
+        assert pickle.load(f)["duplicate_of"] == results[1]["file_hash"]
@@ -0,0 +1,17 @@
+import os
+
+from engine import run_deal, write_reports
+
+# Deals whose directories share a name get separate reports, and running a deal
+# again overwrites its own
+def test_reports_of_same_named_deals_do_not_collide(tmp_path):
+    out_dir = tmp_path / "reports"
+    paths = []
+    for deal_dir in [tmp_path / "a" / "Acme", tmp_path / "b" / "Acme", tmp_path / "a" / "Acme"]:
+        deal_dir.mkdir(parents=True, exist_ok=True)
+        report = run_deal(str(deal_dir), "key", remediation=False)
+        paths.append(write_reports(report, str(out_dir)))
+
+    assert paths[0] != paths[1] and paths[0] == paths[2]
+    assert all(os.path.basename(path).startswith("Acme-") for path in paths[0] + paths[1])
+    assert len(os.listdir(out_dir)) == 4
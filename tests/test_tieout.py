@@ -0,0 +1,96 @@
+import pandas as pd
+
+from tieout import tie_out
+
+def _cap_table(rows):
+    df = pd.DataFrame(rows, columns=["Stakeholder", "Share Class", "Shares", "Issue Date", "Price"])
+    return {"raw_data": df, "column_mapping": {"stakeholder": "Stakeholder", "share_class": "Share Class", "shares": "Shares", "date": "Issue Date", "price": "Price"}}
+
+def _doc(doc_type, holder, shares, date=None, share_class="Common", **extra):
+    info = {"holder": holder, "share_class": share_class, "shares": shares, "price": 0.1}
+    if date:
+        info["grant_date"] = date
+    return {"type": doc_type, "info": info, **extra}
+
+def _position(result, discrepancy_type):
+    return [discrepancy for discrepancy in result["discrepancies"] if discrepancy["type"] == discrepancy_type]
+
+# Two equal grants to one holder in separate documents are two issuances
+def test_repeated_equal_grants_are_counted_separately():
+    cap_table = _cap_table([["Jane Smith", "Common", 10000, "2022-01-15", 0.1], ["Jane Smith", "Common", 10000, "2022-06-15", 0.1]])
+    documents = {"d1": _doc("Option Grant", "Jane Smith", 10000, "2022-01-15"), "d2": _doc("Option Grant", "Jane Smith", 10000, "2022-06-15")}
+    result = tie_out(cap_table, documents)
+    assert result["summary"]["matched"] == 1
+    assert not _position(result, "Share Count Mismatch")
+
+def test_repeated_equal_grants_without_dates_are_counted_separately():
+    cap_table = _cap_table([["Jane Smith", "Common", 20000, None, 0.1]])
+    documents = {"d1": _doc("Option Grant", "Jane Smith", 10000), "d2": _doc("Option Grant", "Jane Smith", 10000)}
+    assert tie_out(cap_table, documents)["summary"]["matched"] == 1
+
+# The same issuance described by an agreement and a board consent counts once, and
+# both documents are cited
+def test_issuance_described_by_several_document_types_counts_once():
+    cap_table = _cap_table([["Jane Smith", "Common", 10000, "2022-01-15", 0.2]])
+    documents = {"d1": _doc("Stock Purchase Agreement", "Jane Smith", 10000, "2022-01-15"), "d2": _doc("Board Consent", "Jane Smith", 10000, "2022-01-15")}
+    result = tie_out(cap_table, documents)
+    assert result["summary"]["price_mismatch"] == 1
+    [mismatch] = _position(result, "Price Mismatch")
+    assert mismatch["documents"] == ["d1", "d2"]
+
+# A near-duplicate repeats its canonical copy's facts and is not counted again
+def test_near_duplicates_are_skipped():
+    cap_table = _cap_table([["Jane Smith", "Common", 10000, "2022-01-15", 0.1]])
+    documents = {
+        "d1": _doc("Option Grant", "Jane Smith", 10000, "2022-01-15"),
+        "d2": _doc("Option Grant", "Jane Smith", 10000, "2022-01-15", duplicate_of="d1")
+    }
+    result = tie_out(cap_table, documents)
+    assert result["summary"]["matched"] == 1
+    assert result["summary"]["document_facts"] == 1
+
+# A close spelling of a cap table holder is joined to it and compared
+def test_close_name_variant_is_joined_and_compared():
+    cap_table = _cap_table([["Acme Ventures II, L.P.", "Series A Preferred", 120000, "2021-06-30", 1.25]])
+    documents = {"d1": _doc("Stock Purchase Agreement", "Acme Ventures Fund II LP", 100000, "2021-06-30", share_class="Series A Preferred")}
+    result = tie_out(cap_table, documents)
+    assert result["summary"]["name_matched"] == 0
+    assert result["summary"]["share_mismatch"] == 1
+    [mismatch] = _position(result, "Share Count Mismatch")
+    assert mismatch["documents"] == ["d1"]
+    assert not result["ambiguous"]
+
+def test_typo_in_holder_name_is_joined():
+    cap_table = _cap_table([["Jonathan Doerfler", "Common", 10000, "2022-01-15", 0.1], ["Maria Garcia", "Common", 5000, "2022-01-15", 0.1]])
+    documents = {"d1": _doc("Option Grant", "Jonathan A. Doerfler", 10000, "2022-01-15")}
+    result = tie_out(cap_table, documents)
+    assert result["summary"]["name_matched"] == 1
+    assert result["summary"]["matched"] == 1
+    assert not result["ambiguous"]
+
+# A fund with a different number is a different entity, however close the names
+def test_differently_numbered_funds_are_not_joined():
+    cap_table = _cap_table([["Acme Ventures II, L.P.", "Series A Preferred", 120000, "2021-06-30", 1.25]])
+    documents = {"d1": _doc("Stock Purchase Agreement", "Acme Ventures III, L.P.", 120000, "2021-06-30", share_class="Series A Preferred")}
+    result = tie_out(cap_table, documents)
+    assert result["summary"]["name_matched"] == 0
+    assert result["summary"]["ambiguous"] == 2
+
+# Names that are only somewhat close are left to the LLM with candidates
+def test_middle_band_matches_are_ambiguous():
+    cap_table = _cap_table([["John Doe", "Common", 10000, "2022-01-15", 0.1]])
+    documents = {"d1": _doc("Option Grant", "John Dough", 10000, "2022-01-15")}
+    result = tie_out(cap_table, documents)
+    assert result["summary"]["name_matched"] == 0
+    assert result["summary"]["ambiguous"] == 2
+    assert {case["source"] for case in result["ambiguous"]} == {"cap_table", "documents"}
+    assert result["ambiguous"][0]["candidates"]
+
+# The cap table's name index is built once and reused
+def test_name_index_is_kept_on_the_cap_table():
+    cap_table = _cap_table([["John Doe", "Common", 10000, "2022-01-15", 0.1]])
+    documents = {"d1": _doc("Option Grant", "John Dough", 10000, "2022-01-15")}
+    tie_out(cap_table, documents)
+    index = cap_table["name_index"]
+    tie_out(cap_table, documents)
+    assert cap_table["name_index"] is index
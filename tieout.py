@@ -0,0 +1,372 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from name_index import LEGAL_SUFFIXES, NameIndex, match_key
+
+# Accepted column_mapping keys for each cap table field. The mapping comes from
+# parse_cap_table, so key names vary a little between runs.
+FIELD_ALIASES = {
+    "stakeholder": ["stakeholder", "stakeholder_name", "shareholder", "holder", "name", "investor"],
+    "share_class": ["share_class", "class", "security_class", "share_type", "security"],
+    "shares": ["shares", "number_of_shares", "share_count", "quantity", "shares_outstanding"],
+    "percentage": ["percentage", "percentage_ownership", "ownership", "ownership_percentage", "percent"],
+    "date": ["date", "issue_date", "grant_date", "issue_or_grant_date"],
+    "price": ["price", "price_per_share", "exercise_price", "issue_price"]
+}
+
+# Keys inside extracted document info that hold each fact
+FACT_KEYS = {
+    "holder": re.compile(r"(stakeholder|shareholder|holder|purchaser|investor|optionee|grantee|recipient|name)"),
+    "share_class": re.compile(r"(share_?class|class|series|security_?type|type_of_(stock|shares))"),
+    "shares": re.compile(r"(shares|quantity|number_of|share_count|amount_of_shares)"),
+    "price": re.compile(r"(price|exercise_price|purchase_price|per_share)"),
+    "date": re.compile(r"(date|dated|effective)")
+}
+
+# Rows searched for a table's header row
+TABLE_HEADER_ROWS = 3
+
+# Relative tolerance for share count and price comparisons
+SHARE_TOLERANCE = 0.0
+PRICE_TOLERANCE = 0.005
+# Caps on the number of discrepancies and ambiguous cases reported in detail
+MAX_DISCREPANCIES = 200
+MAX_AMBIGUOUS = 50
+# Close cap table names listed for each ambiguous document holder
+MAX_NAME_CANDIDATES = 3
+# A document holder whose only close cap table name scores at least this (with the
+# same fund or series numbering) is joined to it directly; closer calls between the
+# name index threshold and this go to the LLM
+AUTO_MATCH_THRESHOLD = 0.9
+
+_NUMBERING = re.compile(r"^(?:[ivxlc]+|\d+\w*)$")
+
+# Words that tell related entities apart ("ii" in "acme ventures ii", "2021"): two
+# names are only joined without review when these agree
+def _numbering(key):
+    return {word for word in key.split() if _NUMBERING.match(word)}
+
+# Normalize names for joining with name_index.match_key, so exact joins and fuzzy
+# matches agree: lowercase, no punctuation, legal suffixes or noise words
+def normalize_names(series):
+    names = series.astype("string")
+    keys = {name: match_key(name) for name in names.dropna().unique()}
+    return names.map(keys).astype("string")
+
+# Normalize share classes: "Series A Preferred Stock" -> "series a preferred"
+def normalize_classes(series):
+    normalized = series.astype("string").str.lower()
+    normalized = normalized.str.replace(r"[^a-z0-9]+", " ", regex=True)
+    normalized = normalized.str.replace(LEGAL_SUFFIXES, " ", regex=True).str.replace(r"\s+", " ", regex=True).str.strip()
+    return normalized.str.replace(r"\b(stock|shares?)\b", "", regex=True).str.replace(r"\s+", " ", regex=True).str.strip()
+
+# Parse numbers such as "1,000,000", "$0.50" or "12.5%" to floats
+def to_number(series):
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype("float64")
+    cleaned = series.astype("string").str.replace(r"[,$\s%]", "", regex=True)
+    return pd.to_numeric(cleaned, errors="coerce")
+
+# Resolve column_mapping to actual DataFrame columns for each field
+def resolve_columns(column_mapping, df):
+    resolved = {}
+    normalized_mapping = {re.sub(r"[^a-z0-9]+", "_", str(key).lower()).strip("_"): value for key, value in (column_mapping or {}).items()}
+    for field, aliases in FIELD_ALIASES.items():
+        for alias in aliases:
+            column = normalized_mapping.get(alias)
+            if isinstance(column, list):
+                column = column[0] if column else None
+            if column in df.columns:
+                resolved[field] = column
+                break
+    return resolved
+
+# Normalized view of the cap table: one row per cap table row
+def normalize_cap_table(df, column_mapping):
+    columns = resolve_columns(column_mapping, df)
+    table = pd.DataFrame({"row": np.arange(len(df))})
+    if "stakeholder" in columns:
+        table["holder"] = df[columns["stakeholder"]].astype("string").to_numpy()
+        table["holder_key"] = normalize_names(table["holder"])
+    else:
+        table["holder"] = table["holder_key"] = pd.Series(pd.NA, index=table.index, dtype="string")
+    if "share_class" in columns:
+        table["class_key"] = normalize_classes(df[columns["share_class"]]).to_numpy()
+    else:
+        table["class_key"] = pd.Series("", index=table.index, dtype="string")
+    table["shares"] = to_number(df[columns["shares"]]).to_numpy() if "shares" in columns else np.nan
+    table["price"] = to_number(df[columns["price"]]).to_numpy() if "price" in columns else np.nan
+    table["date"] = pd.to_datetime(df[columns["date"]], errors="coerce").to_numpy() if "date" in columns else pd.NaT
+    table["class_key"] = table["class_key"].fillna("")
+    return table, columns
+
+def _first_match(record, field):
+    pattern = FACT_KEYS[field]
+    for key, value in record.items():
+        if isinstance(value, (dict, list)):
+            continue
+        if pattern.search(re.sub(r"[^a-z0-9]+", "_", str(key).lower())):
+            return value
+    return None
+
+# Walk extracted info and collect every object that carries a share count,
+# inheriting holder, class, price and date from enclosing objects
+def _collect_facts(value, inherited, doc_id, doc_type, facts):
+    if isinstance(value, list):
+        for item in value:
+            _collect_facts(item, inherited, doc_id, doc_type, facts)
+        return
+    if not isinstance(value, dict):
+        return
+
+    context = dict(inherited)
+    for field in FACT_KEYS:
+        found = _first_match(value, field)
+        if found is not None:
+            context[field] = found
+
+    if _first_match(value, "shares") is not None:
+        facts.append({"doc_id": doc_id, "doc_type": doc_type, **{field: context.get(field) for field in FACT_KEYS}})
+
+    for key, child in value.items():
+        if not str(key).startswith("_"):
+            _collect_facts(child, context, doc_id, doc_type, facts)
+
+# Rows of a document table as records keyed by its header row: the first of the
+# table's first few rows that names both a holder and a share count column. Tables
+# without such a header (signature blocks, layout tables) yield nothing.
+def table_records(table):
+    for index, header in enumerate(table[:TABLE_HEADER_ROWS]):
+        labels = dict.fromkeys(header, "")
+        if _first_match(labels, "holder") is not None and _first_match(labels, "shares") is not None:
+            return [dict(zip(header, row)) for row in table[index + 1:] if any(row)]
+    return []
+
+# Structured facts (holder, class, shares, price, date) from all supporting documents:
+# the extracted info and the rows of their tables. Near-duplicates are skipped, since
+# they repeat their canonical copy's info.
+def document_facts(documents):
+    facts = []
+    for doc_id, doc in documents.items():
+        if doc.get("duplicate_of"):
+            continue
+        info = doc.get("info")
+        if isinstance(info, (dict, list)) and not (isinstance(info, dict) and "error" in info):
+            _collect_facts(info, {}, doc_id, doc.get("type"), facts)
+        for table in doc.get("tables") or []:
+            _collect_facts(table_records(table), {}, doc_id, doc.get("type"), facts)
+
+    frame = pd.DataFrame(facts, columns=["doc_id", "doc_type", *FACT_KEYS])
+    frame["holder_key"] = normalize_names(frame["holder"])
+    frame["class_key"] = normalize_classes(frame["share_class"]).fillna("")
+    frame["shares"] = to_number(frame["shares"].astype("string"))
+    frame["price"] = to_number(frame["price"].astype("string"))
+    frame["date"] = pd.to_datetime(frame["date"].astype("string"), errors="coerce")
+    return frame.dropna(subset=["shares", "holder_key"])
+
+def _discrepancy(kind, description, severity, recommendation, **details):
+    return {"type": kind, "description": description, "severity": severity, "recommendation": recommendation, **details}
+
+# Cap table row numbers for the given (holder_key, class_key) positions
+def _rows_for(cap, positions):
+    if not positions:
+        return {}
+    keys = pd.MultiIndex.from_frame(cap[["holder_key", "class_key"]])
+    subset = cap[keys.isin(positions)]
+    return {key: rows.tolist() for key, rows in subset.groupby(["holder_key", "class_key"], sort=False)["row"]}
+
+def _number(value):
+    return float(value) if value == value else None
+
+# Fuzzy index over the cap table's stakeholder keys and the keys behind each name ID.
+# Built on the first tie-out of a cap table and kept on it, so later verifications
+# reuse it.
+def cap_name_index(cap_table, cap):
+    if cap_table.get("name_index") is None:
+        index = NameIndex()
+        keys_by_id = {}
+        for key in cap["holder_key"].dropna().unique():
+            keys_by_id.setdefault(index.add(key), []).append(key)
+        cap_table["name_index"] = (index, keys_by_id)
+    return cap_table["name_index"]
+
+# Compare each position's cap table and document share counts and prices
+def _compare_positions(joined):
+    in_cap = joined["cap_shares"].notna()
+    in_docs = joined["doc_shares"].notna()
+    share_diff = (joined["cap_shares_compared"] - joined["doc_shares"]).to_numpy()
+    share_ok = np.abs(share_diff) <= SHARE_TOLERANCE * np.maximum(np.abs(joined["doc_shares"].to_numpy()), 1)
+    price_both = joined["cap_price"].notna() & joined["doc_price"].notna()
+    price_ok = ~price_both | ((joined["cap_price"] - joined["doc_price"]).abs() <= PRICE_TOLERANCE * joined["doc_price"].abs())
+
+    joined["status"] = np.select(
+        [in_cap & in_docs & share_ok & price_ok, in_cap & in_docs & ~share_ok, in_cap & in_docs, in_cap],
+        ["matched", "share_mismatch", "price_mismatch", "unsupported"],
+        default="missing_from_cap_table"
+    )
+    joined["share_diff"] = share_diff
+
+# Reconcile every cap table row against document facts. Returns a summary,
+# discrepancies in the Verification tab's format, and the residual cases that
+# need judgment (likely name variants) for the LLM.
+def tie_out(cap_table, documents):
+    cap, columns = normalize_cap_table(cap_table["raw_data"], cap_table.get("column_mapping"))
+    facts = document_facts(documents)
+
+    # The same issuance is often described by documents of several types (SPA, board
+    # consent): dated facts with the same holder, class, shares and date count once,
+    # from the first document type describing them. Equal grants in documents of one
+    # type, or without a date, are separate issuances.
+    issuance = ["holder_key", "class_key", "shares", "date"]
+    doc_types = facts["doc_type"].fillna("")
+    first_type = doc_types.groupby([facts[column] for column in issuance], sort=False, dropna=False).transform("first")
+    unique_facts = facts[facts["date"].isna() | doc_types.eq(first_type)]
+    doc_ids = facts.groupby(["holder_key", "class_key"], sort=False)["doc_id"].agg(lambda ids: sorted(set(ids)))
+
+    cap_positions = cap.dropna(subset=["holder_key"]).groupby(["holder_key", "class_key"], sort=False).agg(
+        holder=("holder", "first"), cap_shares=("shares", "sum"), cap_price=("price", "max"), cap_rows=("row", "size")
+    )
+    doc_positions = unique_facts.groupby(["holder_key", "class_key"], sort=False).agg(
+        doc_holder=("holder", "first"), doc_shares=("shares", "sum"), doc_price=("price", "max")
+    )
+    # Every document describing a position is cited, including repeat descriptions
+    doc_positions["doc_ids"] = doc_ids.reindex(doc_positions.index)
+    joined = cap_positions.join(doc_positions, how="outer").reset_index()
+
+    # Facts without a share class cover the holder's whole position across classes
+    classless = joined[joined["class_key"].eq("") & joined["cap_shares"].isna() & joined["doc_shares"].notna()]
+    joined = joined.drop(classless.index)
+    joined["cap_shares_compared"] = joined["cap_shares"]
+    if len(classless):
+        classless = classless.set_index("holder_key")
+        holder_totals = joined.groupby("holder_key")["cap_shares"].transform("sum")
+        fill = joined["doc_shares"].isna() & joined["holder_key"].isin(classless.index)
+        for column in ["doc_holder", "doc_shares", "doc_price"]:
+            joined.loc[fill, column] = joined.loc[fill, "holder_key"].map(classless[column])
+        joined.loc[fill, "doc_ids"] = pd.Series(joined.loc[fill, "holder_key"].map(classless["doc_ids"]), dtype=object)
+        joined.loc[fill, "cap_shares_compared"] = holder_totals[fill]
+        # Holders that are not on the cap table at all stay as document-only positions
+        missing = classless[~classless.index.isin(joined["holder_key"])].reset_index()
+        joined = pd.concat([joined, missing], ignore_index=True)
+
+    _compare_positions(joined)
+
+    # An unmatched document holder whose name is close to an unmatched cap table
+    # holder's in the same class is probably one stakeholder spelled two ways. Document
+    # holders are looked up in the cap table's name index. A pair whose names are close
+    # enough, with no other close name on either side, is joined and compared like any
+    # other position; the rest are left to the LLM with the close names as candidates.
+    missing = joined[joined["status"] == "missing_from_cap_table"]
+    unsupported = joined[joined["status"].eq("unsupported") & joined["class_key"].isin(set(missing["class_key"]))]
+    unsupported_positions = dict(zip(zip(unsupported["holder_key"], unsupported["class_key"]), unsupported.index))
+    matches_by_position = {}
+    if unsupported_positions:
+        index, keys_by_id = cap_name_index(cap_table, cap)
+        for position, holder_key, class_key in zip(missing.index, missing["holder_key"], missing["class_key"]):
+            matches = [
+                (unsupported_positions[(key, class_key)], score)
+                for name_id, score in index.query(holder_key, limit=None) for key in keys_by_id[name_id]
+                if (key, class_key) in unsupported_positions
+            ]
+            if matches:
+                matches_by_position[position] = matches
+
+    close_by_cap_position = {}
+    for position, matches in matches_by_position.items():
+        numbering = _numbering(joined.at[position, "holder_key"])
+        close = [
+            cap_position for cap_position, score in matches
+            if score >= AUTO_MATCH_THRESHOLD and _numbering(joined.at[cap_position, "holder_key"]) == numbering
+        ]
+        if len(close) == 1:
+            close_by_cap_position.setdefault(close[0], []).append(position)
+    name_joins = {positions[0]: cap_position for cap_position, positions in close_by_cap_position.items() if len(positions) == 1}
+    for position, cap_position in name_joins.items():
+        for column in ["doc_holder", "doc_shares", "doc_price", "doc_ids"]:
+            joined.at[cap_position, column] = joined.at[position, column]
+    if name_joins:
+        joined = joined.drop(list(name_joins))
+        _compare_positions(joined)
+
+    doc_candidates = {}
+    cap_candidates = {}
+    for position, matches in matches_by_position.items():
+        if position in name_joins:
+            continue
+        matches = [(cap_position, score) for cap_position, score in matches if joined.at[cap_position, "status"] == "unsupported"][:MAX_NAME_CANDIDATES]
+        if matches:
+            doc_candidates[position] = [{"holder": joined.at[cap_position, "holder"], "score": round(score, 3)} for cap_position, score in matches]
+            for cap_position, score in matches:
+                cap_candidates.setdefault(cap_position, []).append({"holder": joined.at[position, "doc_holder"], "score": round(score, 3)})
+    joined.loc[list(doc_candidates) + list(cap_candidates), "status"] = "ambiguous"
+
+    problems = joined[joined["status"].isin(["share_mismatch", "price_mismatch", "missing_from_cap_table"])]
+    problems = problems.assign(magnitude=np.abs(problems["share_diff"].fillna(problems["doc_shares"])))
+    problems = problems.sort_values("magnitude", ascending=False, kind="stable").head(MAX_DISCREPANCIES)
+    ambiguous = joined[joined["status"] == "ambiguous"].head(MAX_AMBIGUOUS)
+    rows_by_position = _rows_for(cap, list(zip(problems["holder_key"], problems["class_key"])) + list(zip(ambiguous["holder_key"], ambiguous["class_key"])))
+
+    discrepancies = []
+    for row in problems.itertuples(index=False):
+        holder = row.holder if isinstance(row.holder, str) else row.doc_holder
+        share_class = row.class_key or "unspecified class"
+        rows = rows_by_position.get((row.holder_key, row.class_key), [])
+        if row.status == "share_mismatch":
+            discrepancies.append(_discrepancy(
+                "Share Count Mismatch",
+                f"{holder} ({share_class}): cap table shows {row.cap_shares_compared:,.0f} shares, supporting documents show {row.doc_shares:,.0f}.",
+                "high", "Reconcile the share count against the executed agreements and board approvals.",
+                rows=rows, share_class=row.class_key, documents=row.doc_ids
+            ))
+        elif row.status == "price_mismatch":
+            discrepancies.append(_discrepancy(
+                "Price Mismatch",
+                f"{holder} ({share_class}): cap table price {row.cap_price:,.4f} differs from documented price {row.doc_price:,.4f}.",
+                "medium", "Confirm the issue or exercise price in the governing agreement.",
+                rows=rows, share_class=row.class_key, documents=row.doc_ids
+            ))
+        else:
+            discrepancies.append(_discrepancy(
+                "Missing From Cap Table",
+                f"{holder} ({share_class}): {row.doc_shares:,.0f} shares in supporting documents do not appear on the cap table.",
+                "high", "Add the issuance to the cap table or document why it was cancelled or transferred.",
+                share_class=row.class_key, documents=row.doc_ids
+            ))
+
+    # Positions without support are reported per class rather than per holder
+    unsupported = joined[joined["status"] == "unsupported"].groupby("class_key", sort=True).agg(
+        positions=("holder_key", "size"), shares=("cap_shares", "sum"), rows=("cap_rows", "sum")
+    )
+    for share_class, row in unsupported.iterrows():
+        discrepancies.append(_discrepancy(
+            "Unsupported Issuances",
+            f"{row.positions:,} {share_class or 'unclassified'} positions ({row.shares:,.0f} shares across {row.rows:,} cap table rows) have no supporting document.",
+            "medium", "Locate the purchase agreements, grants or board approvals for these positions.",
+            share_class=share_class
+        ))
+
+    ambiguous_cases = [
+        {
+            "holder": row.holder if isinstance(row.holder, str) else row.doc_holder,
+            "share_class": row.class_key,
+            "source": "cap_table" if row.status == "ambiguous" and row.cap_shares == row.cap_shares else "documents",
+            "shares": _number(row.cap_shares) if row.cap_shares == row.cap_shares else _number(row.doc_shares),
+            "rows": rows_by_position.get((row.holder_key, row.class_key), []),
+            "documents": row.doc_ids if isinstance(row.doc_ids, list) else [],
+            "candidates": doc_candidates.get(row.Index) or cap_candidates.get(row.Index, [])
+        }
+        for row in ambiguous.itertuples()
+    ]
+
+    counts = joined["status"].value_counts()
+    summary = {
+        "cap_table_rows": int(len(cap)),
+        "document_facts": int(len(facts)),
+        "positions_compared": int(len(joined)),
+        "name_matched": len(name_joins),
+        "resolved_columns": columns,
+        **{status: int(counts.get(status, 0)) for status in ["matched", "share_mismatch", "price_mismatch", "unsupported", "missing_from_cap_table", "ambiguous"]}
+    }
+    return {"summary": summary, "discrepancies": discrepancies, "ambiguous": ambiguous_cases}
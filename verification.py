@@ -0,0 +1,159 @@
+import re
+
+# Checklist categories, in the order the Verification tab shows them
+VERIFICATION_CATEGORIES = [
+    "authorized_shares",
+    "share_issuances",
+    "option_grants",
+    "warrants",
+    "convertible_instruments"
+]
+
+SEVERITIES = ["high", "medium", "low"]
+
+VERIFICATION_TOOL_NAME = "record_verification"
+
+# Checklist items per category, as given to Claude
+CHECKLIST = {
+    "authorized_shares": """Authorized Shares Verification:
+           - Verify authorized shares in charter vs. cap table
+           - Check all share classes (common, preferred series)""",
+    "share_issuances": """Share Issuances Verification:
+           - Verify board approval for all issuances
+           - Match issuances to stock purchase agreements
+           - Confirm share counts, names, dates match""",
+    "option_grants": """Option Grants Verification:
+           - Verify option grants match board approvals
+           - Check exercise prices against 409A valuations
+           - Verify vesting schedules are properly reflected""",
+    "warrants": """Warrants Verification:
+           - Verify warrants match agreements
+           - Check exercise prices and expiration dates
+           - Verify board approval for warrants""",
+    "convertible_instruments": """Convertible Instruments Verification:
+           - Verify convertible notes and SAFEs are properly reflected
+           - Check conversion terms and valuation caps
+           - Verify board approval for convertible instruments"""
+}
+
+# Document types each category is verified against. A category is only re-verified
+# when documents of these types, or its cap table rows, change.
+CATEGORY_DOCUMENT_TYPES = {
+    "authorized_shares": ["Certificate of Incorporation", "Charter Amendment", "Board Consent", "Stockholder Consent"],
+    "share_issuances": ["Stock Purchase Agreement", "Transfer Agreement", "Board Consent", "Stockholder Consent"],
+    "option_grants": ["Option Grant", "Equity Incentive Plan", "409A Valuation", "Board Consent"],
+    "warrants": ["Warrant Agreement", "Board Consent"],
+    "convertible_instruments": ["Convertible Note", "SAFE Agreement", "Board Consent", "Stockholder Consent"]
+}
+
+# Normalized share classes that belong to the instrument categories. Share issuances
+# cover every other class; authorized shares depend on all rows.
+CATEGORY_CLASS_PATTERNS = {
+    "option_grants": r"\b(?:options?|rsus?)\b",
+    "warrants": r"\bwarrants?\b",
+    "convertible_instruments": r"\b(?:safes?|notes?|convertible)\b"
+}
+
+# Checklist category that verifies a normalized share class (see tieout.normalize_classes)
+def class_category(share_class):
+    for category, pattern in CATEGORY_CLASS_PATTERNS.items():
+        if re.search(pattern, share_class or ""):
+            return category
+    return "share_issuances"
+
+# Tool definition whose input is the verification result for the given categories
+def verification_tool(categories=VERIFICATION_CATEGORIES):
+    return {
+        "name": VERIFICATION_TOOL_NAME,
+        "description": "Record the cap table verification results for each checklist category, with the discrepancies found and recommendations.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "verification_results": {
+                    "type": "object",
+                    "properties": {
+                        category: {
+                            "type": "object",
+                            "properties": {
+                                "verified": {"type": "boolean"},
+                                "notes": {"type": "string"},
+                                "recommendations": {"type": "array", "items": {"type": "string"}}
+                            },
+                            "required": ["verified", "notes", "recommendations"]
+                        }
+                        for category in categories
+                    },
+                    "required": list(categories)
+                },
+                "discrepancies": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "type": {"type": "string"},
+                            "description": {"type": "string"},
+                            "severity": {"type": "string", "enum": SEVERITIES},
+                            "recommendation": {"type": "string"},
+                            "category": {"type": "string", "enum": list(categories)}
+                        },
+                        "required": ["type", "description", "severity", "recommendation", "category"]
+                    }
+                }
+            },
+            "required": ["verification_results", "discrepancies"]
+        }
+    }
+
+VERIFICATION_TOOL = verification_tool()
+
+# Check a verification result against verification_tool(categories)'s schema. Returns
+# a list of problems; an empty list means the result is valid.
+def validate_verification(result, categories=VERIFICATION_CATEGORIES):
+    if not isinstance(result, dict):
+        return ["result must be a JSON object"]
+
+    errors = []
+    results = result.get("verification_results")
+    if not isinstance(results, dict):
+        errors.append("verification_results must be an object")
+    else:
+        for category in categories:
+            entry = results.get(category)
+            if not isinstance(entry, dict):
+                errors.append(f"verification_results.{category} is missing")
+                continue
+            if not isinstance(entry.get("verified"), bool):
+                errors.append(f"verification_results.{category}.verified must be a boolean")
+            if not isinstance(entry.get("notes"), str):
+                errors.append(f"verification_results.{category}.notes must be a string")
+            recommendations = entry.get("recommendations")
+            if not isinstance(recommendations, list) or not all(isinstance(item, str) for item in recommendations):
+                errors.append(f"verification_results.{category}.recommendations must be an array of strings")
+
+    discrepancies = result.get("discrepancies")
+    if not isinstance(discrepancies, list):
+        errors.append("discrepancies must be an array")
+    else:
+        for i, discrepancy in enumerate(discrepancies):
+            if not isinstance(discrepancy, dict):
+                errors.append(f"discrepancies[{i}] must be an object")
+                continue
+            for field in ["type", "description", "recommendation"]:
+                if not isinstance(discrepancy.get(field), str):
+                    errors.append(f"discrepancies[{i}].{field} must be a string")
+            if discrepancy.get("severity") not in SEVERITIES:
+                errors.append(f"discrepancies[{i}].severity must be one of {', '.join(SEVERITIES)}")
+            if discrepancy.get("category") not in categories:
+                errors.append(f"discrepancies[{i}].category must be one of {', '.join(categories)}")
+
+    return errors
+
+# Categories that have finished streaming in a partial tool input. A category is
+# complete once another key follows it, or once a later top-level key has started.
+def completed_categories(snapshot):
+    if not isinstance(snapshot, dict) or not isinstance(snapshot.get("verification_results"), dict):
+        return []
+    categories = list(snapshot["verification_results"].items())
+    if list(snapshot)[-1] == "verification_results":
+        categories = categories[:-1]
+    return [(category, result) for category, result in categories if isinstance(result, dict)]
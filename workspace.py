@@ -0,0 +1,319 @@
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from doc_cache import json_default
+
+# SQLite database holding every deal workspace. Document contents stay in the
+# document store (keyed by file hash); the database holds everything else.
+DEFAULT_WORKSPACE_DB = os.environ.get(
+    "DILIGIZE_WORKSPACE_DB",
+    os.path.join(os.path.expanduser("~"), ".cache", "diligize-workspaces", "workspaces.db")
+)
+
+# Bumped when the schema changes; older databases are migrated in _migrate
+SCHEMA_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workspaces (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    workspace_id INTEGER NOT NULL REFERENCES workspaces(id) ON DELETE CASCADE,
+    doc_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    type TEXT NOT NULL,
+    document_date TEXT,
+    file_hash TEXT,
+    category_confidence REAL,
+    content_kind TEXT,
+    info TEXT,
+    page_offsets TEXT,
+    tables TEXT,
+    duplicate_of TEXT,
+    features TEXT,
+    PRIMARY KEY (workspace_id, doc_id)
+);
+CREATE INDEX IF NOT EXISTS documents_by_hash ON documents (workspace_id, file_hash);
+CREATE INDEX IF NOT EXISTS documents_by_type_date ON documents (workspace_id, type, document_date);
+CREATE INDEX IF NOT EXISTS documents_by_date ON documents (workspace_id, document_date);
+CREATE TABLE IF NOT EXISTS facts (
+    workspace_id INTEGER NOT NULL,
+    doc_id TEXT NOT NULL,
+    doc_type TEXT,
+    holder TEXT,
+    holder_key TEXT,
+    class_key TEXT,
+    shares REAL,
+    price REAL,
+    date TEXT,
+    FOREIGN KEY (workspace_id, doc_id) REFERENCES documents(workspace_id, doc_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS facts_by_holder ON facts (workspace_id, holder_key);
+CREATE INDEX IF NOT EXISTS facts_by_type_date ON facts (workspace_id, doc_type, date);
+CREATE INDEX IF NOT EXISTS facts_by_document ON facts (workspace_id, doc_id);
+CREATE TABLE IF NOT EXISTS cap_tables (
+    id INTEGER PRIMARY KEY,
+    workspace_id INTEGER NOT NULL REFERENCES workspaces(id) ON DELETE CASCADE,
+    created_at REAL NOT NULL,
+    file_hash TEXT,
+    column_mapping TEXT,
+    summary TEXT,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cap_tables_by_workspace ON cap_tables (workspace_id, created_at);
+CREATE TABLE IF NOT EXISTS verification_runs (
+    id INTEGER PRIMARY KEY,
+    workspace_id INTEGER NOT NULL REFERENCES workspaces(id) ON DELETE CASCADE,
+    cap_table_id INTEGER REFERENCES cap_tables(id) ON DELETE SET NULL,
+    created_at REAL NOT NULL,
+    results TEXT NOT NULL,
+    remediation_plan TEXT
+);
+CREATE INDEX IF NOT EXISTS verification_runs_by_workspace ON verification_runs (workspace_id, created_at);
+"""
+
+DOCUMENT_COLUMNS = "doc_id, filename, type, document_date, file_hash, category_confidence, content_kind, info, page_offsets, tables, duplicate_of, features"
+
+def _dumps(value):
+    return json.dumps(value, default=json_default, separators=(",", ":"))
+
+def _loads(text):
+    return None if text is None else json.loads(text)
+
+# Fact values for storage; missing values (NaN, NA, NaT) become None
+def _float(value):
+    import pandas as pd
+    return None if pd.isna(value) else float(value)
+
+def _date(value):
+    import pandas as pd
+    return None if pd.isna(value) else value.strftime("%Y-%m-%d")
+
+def _iso_date(value):
+    import pandas as pd
+    return _date(pd.to_datetime(value, errors="coerce"))
+
+# The document's own date: the first top-level date field of its extracted info,
+# as YYYY-MM-DD so dates compare as text
+def document_date(doc):
+    from tieout import FACT_KEYS
+    info = doc.get("info")
+    if not isinstance(info, dict):
+        return None
+    for key, value in info.items():
+        if isinstance(value, str) and FACT_KEYS["date"].search(str(key).lower()):
+            date = _iso_date(value)
+            if date:
+                return date
+    return None
+
+def _document(row):
+    doc_id, filename, doc_type, date, file_hash, confidence, content_kind, info, page_offsets, tables, duplicate_of, features = row
+    return doc_id, {
+        "filename": filename,
+        "type": doc_type,
+        "category_confidence": confidence,
+        "content_kind": content_kind,
+        "info": _loads(info),
+        "file_hash": file_hash,
+        "page_offsets": _loads(page_offsets),
+        "tables": _loads(tables),
+        "features": _loads(features),
+        "duplicate_of": duplicate_of
+    }
+
+# Named deal workspaces in a local SQLite database: each workspace's documents (with
+# their extracted info and tables), the facts the tie-out reads from them, cap table
+# snapshots and verification runs. Documents and facts are indexed by hash, type
+# and date, so they can be queried without loading a whole workspace. Safe to share
+# between threads.
+class WorkspaceDB:
+    def __init__(self, path=DEFAULT_WORKSPACE_DB):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._migrate()
+
+    def _migrate(self):
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+            # Version 2 records which document a near-duplicate reuses the info of
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(documents)")}
+            if "duplicate_of" not in columns:
+                self._conn.execute("ALTER TABLE documents ADD COLUMN duplicate_of TEXT")
+            # Version 3 keeps the near-duplicate features later uploads are matched on
+            if "features" not in columns:
+                self._conn.execute("ALTER TABLE documents ADD COLUMN features TEXT")
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _touch(self, workspace_id):
+        self._conn.execute("UPDATE workspaces SET updated_at = ? WHERE id = ?", (time.time(), workspace_id))
+
+    # Workspaces as (id, name, updated_at), most recently used first
+    def workspaces(self):
+        return self._query("SELECT id, name, updated_at FROM workspaces ORDER BY updated_at DESC")
+
+    # ID of the workspace with this name, created if it doesn't exist
+    def open(self, name):
+        name = name.strip()
+        if not name:
+            raise ValueError("Workspace name is empty")
+        with self._lock, self._conn:
+            now = time.time()
+            self._conn.execute("INSERT OR IGNORE INTO workspaces (name, created_at, updated_at) VALUES (?, ?, ?)", (name, now, now))
+            workspace_id = self._conn.execute("SELECT id FROM workspaces WHERE name = ?", (name,)).fetchone()[0]
+            self._touch(workspace_id)
+            return workspace_id
+
+    def delete(self, workspace_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM workspaces WHERE id = ?", (workspace_id,))
+
+    # Add documents (doc_id -> entry, as add_processed_documents builds them) and their
+    # facts. Documents already in the workspace are replaced and keep their position.
+    def save_documents(self, workspace_id, documents):
+        if not documents:
+            return
+        from tieout import FACT_KEYS, document_facts
+
+        facts = document_facts(documents)
+        fact_rows = [
+            (workspace_id, fact.doc_id, fact.doc_type, str(fact.holder), fact.holder_key, fact.class_key,
+             _float(fact.shares), _float(fact.price), _date(fact.date))
+            for fact in facts[["doc_id", "doc_type", *FACT_KEYS, "holder_key", "class_key"]].itertuples(index=False)
+        ]
+        with self._lock, self._conn:
+            position = self._conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM documents WHERE workspace_id = ?", (workspace_id,)).fetchone()[0]
+            for doc_id, doc in documents.items():
+                self._conn.execute("DELETE FROM facts WHERE workspace_id = ? AND doc_id = ?", (workspace_id, doc_id))
+                existing = self._conn.execute("SELECT position FROM documents WHERE workspace_id = ? AND doc_id = ?", (workspace_id, doc_id)).fetchone()
+                if existing is None:
+                    existing = (position,)
+                    position += 1
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO documents (workspace_id, position, {DOCUMENT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (workspace_id, existing[0], doc_id, doc["filename"], doc["type"], document_date(doc), doc.get("file_hash"),
+                     doc.get("category_confidence"), doc.get("content_kind"), _dumps(doc.get("info")),
+                     _dumps(doc.get("page_offsets")), _dumps(doc.get("tables")), doc.get("duplicate_of"), _dumps(doc.get("features")))
+                )
+            self._conn.executemany("INSERT INTO facts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", fact_rows)
+            self._touch(workspace_id)
+
+    # Documents of a workspace, optionally only those of one type and dated within
+    # [after, before] (YYYY-MM-DD, inclusive), in the order they were added
+    def documents(self, workspace_id, doc_type=None, after=None, before=None):
+        sql = f"SELECT {DOCUMENT_COLUMNS} FROM documents WHERE workspace_id = ?"
+        params = [workspace_id]
+        if doc_type is not None:
+            sql += " AND type = ?"
+            params.append(doc_type)
+        if after is not None:
+            sql += " AND document_date >= ?"
+            params.append(after)
+        if before is not None:
+            sql += " AND document_date <= ?"
+            params.append(before)
+        return dict(_document(row) for row in self._query(sql + " ORDER BY position", params))
+
+    # Whether a file was already added to the workspace
+    def has_file(self, workspace_id, file_hash):
+        return bool(self._query("SELECT 1 FROM documents WHERE workspace_id = ? AND file_hash = ? LIMIT 1", (workspace_id, file_hash)))
+
+    # Facts extracted from a workspace's documents as dicts, optionally only for a
+    # normalized holder name, one document type and dates within [after, before]
+    def facts(self, workspace_id, holder_key=None, doc_type=None, after=None, before=None):
+        sql = "SELECT doc_id, doc_type, holder, holder_key, class_key, shares, price, date FROM facts WHERE workspace_id = ?"
+        params = [workspace_id]
+        for column, operator, value in (("holder_key", "=", holder_key), ("doc_type", "=", doc_type), ("date", ">=", after), ("date", "<=", before)):
+            if value is not None:
+                sql += f" AND {column} {operator} ?"
+                params.append(value)
+        columns = ["doc_id", "doc_type", "holder", "holder_key", "class_key", "shares", "price", "date"]
+        return [dict(zip(columns, row)) for row in self._query(sql, params)]
+
+    # Store a cap table as parse_cap_table returns it; the rows are kept as Parquet.
+    # Returns the snapshot's ID.
+    def save_cap_table(self, workspace_id, cap_table):
+        buffer = io.BytesIO()
+        cap_table["raw_data"].to_parquet(buffer, index=False)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO cap_tables (workspace_id, created_at, file_hash, column_mapping, summary, data) VALUES (?, ?, ?, ?, ?, ?)",
+                (workspace_id, time.time(), cap_table.get("file_hash"), _dumps(cap_table["column_mapping"]), _dumps(cap_table["summary"]), buffer.getvalue())
+            )
+            self._touch(workspace_id)
+            return cursor.lastrowid
+
+    # The most recent cap table snapshot, or None
+    def latest_cap_table(self, workspace_id):
+        rows = self._query(
+            "SELECT file_hash, column_mapping, summary, data FROM cap_tables WHERE workspace_id = ? ORDER BY created_at DESC, id DESC LIMIT 1",
+            (workspace_id,)
+        )
+        if not rows:
+            return None
+        import pandas as pd
+        file_hash, column_mapping, summary, data = rows[0]
+        return {"raw_data": pd.read_parquet(io.BytesIO(data)), "file_hash": file_hash, "column_mapping": _loads(column_mapping), "summary": _loads(summary)}
+
+    # Record a verification run against the workspace's latest cap table
+    def save_verification(self, workspace_id, results):
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT MAX(id) FROM cap_tables WHERE workspace_id = ?", (workspace_id,)).fetchone()
+            self._conn.execute(
+                "INSERT INTO verification_runs (workspace_id, cap_table_id, created_at, results) VALUES (?, ?, ?, ?)",
+                (workspace_id, row[0], time.time(), _dumps(results))
+            )
+            self._touch(workspace_id)
+
+    # Attach a remediation plan to the latest verification run
+    def save_remediation(self, workspace_id, plan):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE verification_runs SET remediation_plan = ? WHERE id = (SELECT MAX(id) FROM verification_runs WHERE workspace_id = ?)",
+                (plan, workspace_id)
+            )
+            self._touch(workspace_id)
+
+    # The latest verification run as (results, remediation_plan), or (None, None)
+    def latest_verification(self, workspace_id):
+        rows = self._query("SELECT results, remediation_plan FROM verification_runs WHERE workspace_id = ? ORDER BY id DESC LIMIT 1", (workspace_id,))
+        return (_loads(rows[0][0]), rows[0][1]) if rows else (None, None)
+
+    # Everything needed to restore a session: documents, the latest cap table, and
+    # the latest verification results and remediation plan
+    def load(self, workspace_id):
+        verification_results, remediation_plan = self.latest_verification(workspace_id)
+        return {
+            "documents": self.documents(workspace_id),
+            "cap_table": self.latest_cap_table(workspace_id),
+            "verification_results": verification_results,
+            "remediation_plan": remediation_plan
+        }
+
+_workspace_db = None
+_workspace_db_lock = threading.Lock()
+
+# Shared workspace database, opened on first use
+def get_workspace_db():
+    global _workspace_db
+    with _workspace_db_lock:
+        if _workspace_db is None:
+            _workspace_db = WorkspaceDB()
+        return _workspace_db